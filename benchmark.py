@@ -0,0 +1,623 @@
+#!/usr/bin/python
+"""Benchmarks for the deckbuilder.
+
+Run "python benchmark.py -h" for a list of benchmarks.
+"""
+from __future__ import print_function
+
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+import cards
+
+
+# Synthetic card catalogue pieces.
+_TYPELINES = ['Creature ? Elf Druid', 'Creature ? Human Wizard',
+              'Legendary Creature ? Dragon', 'Instant', 'Sorcery',
+              'Enchantment ? Aura', 'Artifact ? Equipment', 'Basic Land ? Forest',
+              'Land', 'Planeswalker ? Jace', 'Artifact Creature ? Golem']
+_COSTS = ['{G}', '1{G}', '2{R}{R}', '{U}{U}', '3{W}', '5{G}{G}{G}', '4',
+          '{B}', '2{U}{B}', 'None']
+_WORDS = ['target', 'creature', 'gets', '+1/+1', 'until', 'end', 'of', 'turn',
+          'draw', 'a', 'card', 'each', 'opponent', 'loses', 'life', 'flying',
+          'trample', 'sacrifice', 'destroy', 'put', 'token', 'onto', 'the',
+          'battlefield', 'when', 'enters']
+
+
+def _sentence(rand, n):
+    return ' '.join(rand.choice(_WORDS) for i in xrange(n)).capitalize() + '.'
+
+
+class _LegacyCard:
+    """The card layout prior to Card.__slots__, for comparison."""
+    def __init__(self, name):
+        self.name = name
+        self.cost = []
+        self.convertedCost = None
+        self.types = None
+        self.text = None
+        self.flavor = None
+        self.power = None
+        self.toughness = None
+        self.colorIndicator = None
+        self.cardback = None
+        self.loaded = False
+
+
+def _synthetic_fields(rand, i):
+    """Scrape-like field values for card i, as freshly built strings."""
+    typeline = rand.choice(_TYPELINES).split('?')
+    return {
+        'name': 'Card Number %d' % i,
+        'cost': '%s' % rand.choice(_COSTS),
+        'convertedCost': '%d' % rand.randint(0, 8),
+        'types': typeline[0].split(),
+        'subtypes': typeline[1].split() if len(typeline) > 1 else [],
+        'text': '\n'.join(_sentence(rand, rand.randint(6, 20))
+                          for j in xrange(rand.randint(1, 3))),
+        'flavor': _sentence(rand, rand.randint(0, 14)) if i % 2 else None,
+        'power': '%d' % rand.randint(0, 7),
+        'toughness': '%d' % rand.randint(1, 7),
+    }
+
+def _legacy_card(fields):
+    c = _LegacyCard(fields['name'])
+    for k, v in fields.iteritems():
+        setattr(c, k, v)
+    c.loaded = True
+    return c
+
+def _compact_card(fields):
+    c = cards.Card(fields['name'])
+    c.cost = cards._intern_str(fields['cost'])
+    c.convertedCost = cards._intern_str(fields['convertedCost'])
+    c.setTypes(fields['types'], fields['subtypes'])
+    c._prose = cards._pack_prose(fields['text'], fields['flavor'])
+    c.power = cards._intern_str(fields['power'])
+    c.toughness = cards._intern_str(fields['toughness'])
+    c.loaded = True
+    return c
+
+def _slot_names(cls):
+    """The names in the __slots__ of cls and its base classes."""
+    return [k for klass in cls.__mro__
+            for k in klass.__dict__.get('__slots__', ())]
+
+def deep_sizeof(objs):
+    """Total bytes of objs and everything reachable from them, once each."""
+    seen = set()
+    stack = list(objs)
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or o is None or isinstance(o, (bool, type)):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.iterkeys())
+            stack.extend(o.itervalues())
+        elif isinstance(o, (list, tuple, set)):
+            stack.extend(o)
+        if hasattr(o, '__dict__'):
+            d = o.__dict__
+            if d or '__dict__' not in _slot_names(type(o)):
+                stack.append(d)
+            else:
+                # It only existed because it was asked for.
+                del o.__dict__
+        for k in _slot_names(type(o)):
+            if k != '__dict__':
+                stack.append(getattr(o, k, None))
+    return total
+
+def bench_card_memory(n=20000, seed=0):
+    """Bytes per card for n synthetic cards, legacy and compact layouts."""
+    rand = random.Random(seed)
+    fields = [_synthetic_fields(rand, i) for i in xrange(n)]
+    legacy = [_legacy_card(f) for f in fields]
+    legacy_bytes = deep_sizeof(legacy)
+    del legacy
+    compact = [_compact_card(f) for f in fields]
+    compact_bytes = deep_sizeof(compact)
+    return (float(legacy_bytes) / n, float(compact_bytes) / n)
+
+def cmd_memory(args):
+    legacy, compact = bench_card_memory(args.n)
+    print('Card memory, %d synthetic cards:' % args.n)
+    print('  legacy:  %8.1f bytes/card' % legacy)
+    print('  compact: %8.1f bytes/card' % compact)
+    print('  saved:   %7.1f%%' % ((1 - compact / legacy) * 100))
+
+def bench_soup_memory(rows=2000, seed=0):
+    """Bytes of the tree of a synthetic page of rows table rows: in all,
+    per node (tag or string), and per byte of markup. Also returns the
+    page size in bytes."""
+    from bs4 import BeautifulSoup
+    page = _synthetic_page(random.Random(seed), rows)
+    soup = BeautifulSoup(page)
+    nodes = sum(1 for node in soup.descendants)
+    # Leave out the builder, which every soup has one of.
+    builder, soup.builder = soup.builder, None
+    size = deep_sizeof([soup])
+    soup.builder = builder
+    return (size, float(size) / nodes, float(size) / len(page), len(page))
+
+def cmd_soup_memory(args):
+    size, per_node, per_byte, page = bench_soup_memory(args.rows)
+    print('Tree memory, %d KB synthetic page:' % (page // 1024))
+    print('  total:    %8.1f KB' % (size / 1024.0))
+    print('  per node: %8.1f bytes' % per_node)
+    print('  per byte of markup: %.1f' % per_byte)
+
+def bench_frozen(rows=2000, runs=5, seed=0):
+    """Compare the tree of a synthetic page of rows table rows with its
+    frozen copy.
+
+    Returns a list of (description, tree, frozen) for the kilobytes of
+    memory each takes, and the median milliseconds to pickle and unpickle
+    them and to run some searches on them. A time is None if it fails:
+    pickling a tree of any size runs out of stack.
+    """
+    import cPickle
+    from bs4 import BeautifulSoup
+    page = _synthetic_page(random.Random(seed), rows)
+    soup = BeautifulSoup(page)
+    builder, soup.builder = soup.builder, None
+    frozen = soup.freeze()
+    results = [('memory (KB)', deep_sizeof([soup]) / 1024.0,
+                deep_sizeof([v for k, v in frozen.__dict__.items()
+                             if k != '_views']) / 1024.0)]
+    def pickling(tree):
+        return cPickle.loads(cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL))
+    searches = [
+        ('pickle and unpickle', pickling),
+        ("find_all('a')", lambda tree: tree.find_all('a')),
+        ("find_all('td', 'cost')", lambda tree: tree.find_all('td', 'cost')),
+        ("find_all(text=True)", lambda tree: tree.find_all(text=True)),
+        ("select('tr.rare td.cost')",
+         lambda tree: tree.select('tr.rare td.cost')),
+        ('get_text()', lambda tree: tree.get_text()),
+        ]
+    for desc, f in searches:
+        times = []
+        for tree in (soup, frozen):
+            t = []
+            try:
+                for i in xrange(runs):
+                    start = time.time()
+                    f(tree)
+                    t.append((time.time() - start) * 1000)
+            except RuntimeError:
+                times.append(None)
+            else:
+                times.append(_median(t))
+        results.append((desc + ' (ms)', times[0], times[1]))
+    soup.builder = builder
+    return results
+
+def cmd_frozen(args):
+    print('Tree and frozen copy of a %d row synthetic page, median of %d '
+          'runs:' % (args.rows, args.runs))
+    print('  %-32s %10s %10s' % ('', 'tree', 'frozen'))
+    for desc, tree, frozen in bench_frozen(args.rows, args.runs):
+        print('  %-32s %10s %10s' % (
+            desc, 'fails' if tree is None else '%.1f' % tree,
+            'fails' if frozen is None else '%.1f' % frozen))
+
+def bench_completion(n=20000, seed=0):
+    """Seconds to build the name index over n cards, and median seconds
+    to tab complete a card name (all completer states) afterwards."""
+    import deck
+    import deckbuilder
+    rand = random.Random(seed)
+    cd = deck.CardData()
+    for i in xrange(n):
+        c = _compact_card(_synthetic_fields(rand, i))
+        c.name = '%s %s %d' % (rand.choice(_WORDS).capitalize(),
+                               rand.choice(_WORDS), i)
+        cd.data[c.name.lower()] = c
+    deck._card_store = cd
+    t = time.time()
+    cd.namesWithPrefix('')
+    build = time.time() - t
+    times = []
+    for w in _WORDS:
+        text = 'add 4 ' + w[:3]
+        t = time.time()
+        state = 0
+        while deckbuilder.readline_completer(text, state) is not None:
+            state += 1
+        times.append(time.time() - t)
+    return (build, _median(times))
+
+def cmd_complete(args):
+    build, complete = bench_completion(args.n)
+    print('Card name completion, %d synthetic cards:' % args.n)
+    print('  build index: %7.2f ms' % (build * 1000))
+    print('  complete:    %7.2f ms (median)' % (complete * 1000))
+
+def _percentile(l, q):
+    l = sorted(l)
+    return l[min(len(l) - 1, int(len(l) * q))]
+
+def bench_server(clients=8, requests=200, decks=20, seed=0):
+    """Load test an in-process server over local HTTP.
+
+    Each client thread keeps one connection open and sends requests for
+    deck listings, managrams, draw probabilities and costs of random decks.
+    Returns (requests per second, median seconds, 95th percentile seconds).
+    """
+    import httplib
+    import shutil
+    import tempfile
+    import threading
+    import urllib
+    import deck
+    import server
+    rand = random.Random(seed)
+    store = deck.card_store()
+    names = []
+    for i in xrange(300):
+        c = _compact_card(_synthetic_fields(rand, i))
+        store.put(c.name.lower(), c)
+        names.append(c.name)
+        cards._price_cache[c.name.lower()] = (
+            time.time(), c.name, {'L': 0.1, 'M': 0.25, 'H': 1.0})
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    httpd = server.Server(0, 'localhost', quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        port = httpd.server_address[1]
+        contents = {}
+        for i in xrange(decks):
+            d = deck.Deck('Deck %d' % i, store)
+            contents[d.name] = rand.sample(names, 20)
+            for c in contents[d.name]:
+                d.deck.add(c, rand.randint(1, 4))
+            deck.save(d)
+        latencies = []
+        def request_path(r):
+            name = r.choice(sorted(contents))
+            kind = r.choice(['', '/managram', '/cost', '/prob'])
+            path = '/decks/' + urllib.quote(name) + kind
+            if kind == '/prob':
+                path += '?q=' + urllib.quote('1 ' + r.choice(contents[name]))
+            return path
+        def client(seed):
+            r = random.Random(seed)
+            conn = httplib.HTTPConnection('localhost', port)
+            for i in xrange(requests):
+                path = request_path(r)
+                t = time.time()
+                conn.request('GET', path)
+                resp = conn.getresponse()
+                resp.read()
+                latencies.append(time.time() - t)
+                if resp.status != 200:
+                    raise RuntimeError('%s: HTTP %d' % (path, resp.status))
+            conn.close()
+        threads = [threading.Thread(target=client, args=(i,))
+                   for i in xrange(clients)]
+        t = time.time()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.time() - t
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+    return (len(latencies) / elapsed, _median(latencies),
+            _percentile(latencies, 0.95))
+
+def cmd_serve(args):
+    rate, median, p95 = bench_server(args.clients, args.requests)
+    print('Server load, %d clients x %d requests:' %
+          (args.clients, args.requests))
+    print('  throughput: %8.1f requests/s' % rate)
+    print('  latency:    %8.2f ms median, %.2f ms 95th percentile' %
+          (median * 1000, p95 * 1000))
+
+def _synthetic_page(rand, rows):
+    """An attribute-heavy page: a table of card rows with links."""
+    out = ['<html><body><table id="cards">']
+    for i in xrange(rows):
+        rarity = rand.choice(['common', 'uncommon', 'rare', 'mythic'])
+        out.append(
+            '<tr class="row %s %s" id="row%d" data-set="S%02d">'
+            '<td class="name"><a href="/card/%d" title="Card %d">Card %d</a>'
+            '</td><td class="cost" data-cmc="%d">%s</td>'
+            '<td class="type">%s</td></tr>'
+            % (rarity, 'even' if i % 2 == 0 else 'odd', i,
+               rand.randint(1, 40), i, i, i, rand.randint(0, 8),
+               rand.choice(_COSTS), rand.choice(_TYPELINES).split('?')[0]))
+    out.append('</table></body></html>')
+    return ''.join(out)
+
+def _legacy_strainer_class():
+    """SoupStrainer as it was before it compiled its criteria, matching
+    every element with _matches()."""
+    import collections
+    from bs4.element import SoupStrainer, Tag, NavigableString
+
+    class _LegacyStrainer(SoupStrainer):
+        def search_tag(self, markup_name=None, markup_attrs={}):
+            found = None
+            markup = None
+            if isinstance(markup_name, Tag):
+                markup = markup_name
+                markup_attrs = markup
+            call_function_with_tag_data = (
+                isinstance(self.name, collections.Callable)
+                and not isinstance(markup_name, Tag))
+            if ((not self.name)
+                or call_function_with_tag_data
+                or (markup and self._matches(markup, self.name))
+                or (not markup and self._matches(markup_name, self.name))):
+                if call_function_with_tag_data:
+                    match = self.name(markup_name, markup_attrs)
+                else:
+                    match = True
+                    markup_attr_map = None
+                    for attr, match_against in list(self.attrs.items()):
+                        if not markup_attr_map:
+                            if hasattr(markup_attrs, 'get'):
+                                markup_attr_map = markup_attrs
+                            else:
+                                markup_attr_map = {}
+                                for k, v in markup_attrs:
+                                    markup_attr_map[k] = v
+                        attr_value = markup_attr_map.get(attr)
+                        if not self._matches(attr_value, match_against):
+                            match = False
+                            break
+                if match:
+                    found = markup if markup else markup_name
+            if (found and self.text
+                and not self._matches(found.string, self.text)):
+                found = None
+            return found
+
+        def search(self, markup):
+            found = None
+            if (hasattr(markup, '__iter__')
+                and not isinstance(markup, (Tag, basestring))):
+                for element in markup:
+                    if (isinstance(element, NavigableString)
+                        and self.search(element)):
+                        found = element
+                        break
+            elif isinstance(markup, Tag):
+                if not self.text or self.name or self.attrs:
+                    found = self.search_tag(markup)
+            elif isinstance(markup, basestring):
+                if (not self.name and not self.attrs
+                    and self._matches(markup, self.text)):
+                    found = markup
+            return found
+
+    return _LegacyStrainer
+
+# (description, SoupStrainer arguments) for bench_strainer.
+_STRAINER_QUERIES = [
+    ('exact attribute', ((), {'data-set': 'S07'})),
+    ('regex attribute', ((), {'href': re.compile(r'/card/\d*7$')})),
+    ('list of values', (('td',), {'data-cmc': ['0', '1', '2']})),
+    ('callable', ((), {'title': lambda v: v is not None and
+                                         v.endswith('99')})),
+    ('class', (('tr',), {'class_': 'mythic'})),
+    ('several attributes', (('tr',), {'class_': 'rare',
+                                       'data-set': re.compile('^S1')})),
+    ('text', ((), {'text': re.compile('Golem')})),
+]
+
+def bench_strainer(rows=2000, runs=5, seed=0):
+    """Median seconds for find_all with each of _STRAINER_QUERIES over a
+    synthetic page of rows table rows.
+
+    Returns a list of (description, legacy seconds, compiled seconds),
+    where legacy matches with the uncompiled SoupStrainer.
+    """
+    from bs4 import BeautifulSoup
+    from bs4.element import SoupStrainer
+    legacy_class = _legacy_strainer_class()
+    soup = BeautifulSoup(_synthetic_page(random.Random(seed), rows))
+    results = []
+    for desc, (args, kwargs) in _STRAINER_QUERIES:
+        times = {}
+        found = {}
+        for cls in (legacy_class, SoupStrainer):
+            t = []
+            for i in xrange(runs):
+                start = time.time()
+                found[cls] = soup.find_all(cls(*args, **kwargs))
+                t.append(time.time() - start)
+            times[cls] = _median(t)
+        if found[legacy_class] != found[SoupStrainer]:
+            raise RuntimeError('%s: results differ.' % desc)
+        results.append((desc, times[legacy_class], times[SoupStrainer]))
+    return results
+
+def cmd_strainer(args):
+    print('find_all over %d table rows, median of %d runs:' %
+          (args.rows, args.runs))
+    print('  %-20s %9s %9s' % ('query', 'legacy', 'compiled'))
+    for desc, legacy, compiled in bench_strainer(args.rows, args.runs):
+        print('  %-20s %6.1f ms %6.1f ms' %
+              (desc, legacy * 1000, compiled * 1000))
+
+
+def bench_stream(rows=2000, runs=5, seed=0):
+    """Median seconds to get the costs of three rows of a synthetic page
+    of rows table rows, by building a tree and searching it, and with
+    bs4.stream.extract(). Also returns the page size in bytes."""
+    from bs4 import BeautifulSoup, stream
+    page = _synthetic_page(random.Random(seed), rows)
+    keys = [0, rows // 2, rows - 1]
+    def tree():
+        soup = BeautifulSoup(page)
+        return [soup.find('tr', id='row%d' % k).find('td', 'cost').text
+                for k in keys]
+    def extract():
+        found = stream.extract(page, dict((k, '#row%d td.cost' % k)
+                                          for k in keys))
+        return [found[k] for k in keys]
+    times = {}
+    for f in (tree, extract):
+        t = []
+        for i in xrange(runs):
+            start = time.time()
+            result = f()
+            t.append(time.time() - start)
+        times[f] = _median(t)
+    if tree() != extract():
+        raise RuntimeError('Results differ.')
+    return (times[tree], times[extract], len(page))
+
+def cmd_stream(args):
+    tree, extract, size = bench_stream(args.rows, args.runs)
+    print('Scraping a %d KB page, median of %d runs:' %
+          (size // 1024, args.runs))
+    print('  tree and find: %7.1f ms' % (tree * 1000))
+    print('  stream:        %7.1f ms' % (extract * 1000))
+
+def bench_parse(pages=500, rows=3, runs=5, seed=0):
+    """Documents per second parsing small synthetic pages of rows
+    table rows each, with a BeautifulSoup per page. Also returns the
+    mean page size."""
+    from bs4 import BeautifulSoup
+    rand = random.Random(seed)
+    docs = [_synthetic_page(rand, rows) for i in xrange(pages)]
+    t = []
+    for i in xrange(runs):
+        start = time.time()
+        for doc in docs:
+            BeautifulSoup(doc)
+        t.append(time.time() - start)
+    return pages / _median(t), sum(len(doc) for doc in docs) // pages
+
+def cmd_parse(args):
+    rate, size = bench_parse(args.pages, args.rows, args.runs)
+    print('Parsing %d pages of %d bytes, median of %d runs:' %
+          (args.pages, size, args.runs))
+    print('  %7.0f pages/s' % rate)
+
+# Where deckbuilder.py lives; startup benchmarks run from here.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORT_SCRIPT = """
+import sys, time
+t = time.time()
+import deckbuilder
+print('%f %d' % (time.time() - t, 'bs4' in sys.modules))
+"""
+
+def _median(l):
+    l = sorted(l)
+    return l[len(l) // 2]
+
+def bench_import(runs=20):
+    """Median seconds to import deckbuilder in a fresh interpreter.
+
+    Also returns whether the import pulled in bs4.
+    """
+    times = []
+    for i in xrange(runs):
+        out = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT],
+                                      cwd=_HERE)
+        t, bs4_loaded = out.split()
+        times.append(float(t))
+    return (_median(times), bool(int(bs4_loaded)))
+
+def bench_first_prompt(runs=20):
+    """Median seconds from launching deckbuilder.py to its first prompt."""
+    times = []
+    for i in xrange(runs):
+        t = time.time()
+        p = subprocess.Popen([sys.executable, 'deckbuilder.py'], cwd=_HERE,
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        buf = ''
+        while not buf.endswith('> '):
+            c = p.stdout.read(1)
+            if not c:
+                raise RuntimeError('deckbuilder exited before prompting.')
+            buf += c
+        times.append(time.time() - t)
+        p.communicate('exit\n')
+    return _median(times)
+
+def cmd_startup(args):
+    # Warm the .pyc files so the first run does not pay for compiling.
+    bench_import(1)
+    imp, bs4_loaded = bench_import(args.runs)
+    prompt = bench_first_prompt(args.runs)
+    print('Startup, median of %d runs:' % args.runs)
+    print('  import deckbuilder: %7.1f ms%s' %
+          (imp * 1000, ' (loads bs4)' if bs4_loaded else ''))
+    print('  first prompt:       %7.1f ms' % (prompt * 1000))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Deckbuilder benchmarks.')
+    sub = parser.add_subparsers()
+    p = sub.add_parser('memory', help='bytes per card in the card store')
+    p.add_argument('-n', type=int, default=20000, help='number of cards')
+    p.set_defaults(func=cmd_memory)
+    p = sub.add_parser('soup-memory', help='bytes of a parsed page')
+    p.add_argument('-n', '--rows', type=int, default=2000,
+                   help='table rows in the page')
+    p.set_defaults(func=cmd_soup_memory)
+    p = sub.add_parser('frozen', help='a parsed page and its frozen copy')
+    p.add_argument('-n', '--rows', type=int, default=2000,
+                   help='table rows in the page')
+    p.add_argument('-r', '--runs', type=int, default=5, help='repetitions')
+    p.set_defaults(func=cmd_frozen)
+    p = sub.add_parser('complete', help='tab completion of card names')
+    p.add_argument('-n', type=int, default=20000, help='number of cards')
+    p.set_defaults(func=cmd_complete)
+    p = sub.add_parser('startup', help='import time and time to first prompt')
+    p.add_argument('-r', '--runs', type=int, default=20, help='repetitions')
+    p.set_defaults(func=cmd_startup)
+    p = sub.add_parser('serve', help='server throughput and latency')
+    p.add_argument('-c', '--clients', type=int, default=8,
+                   help='concurrent clients')
+    p.add_argument('-r', '--requests', type=int, default=200,
+                   help='requests per client')
+    p.set_defaults(func=cmd_serve)
+    p = sub.add_parser('strainer', help='find_all with attribute queries '
+                       'over a large page')
+    p.add_argument('-n', '--rows', type=int, default=2000,
+                   help='table rows in the page')
+    p.add_argument('-r', '--runs', type=int, default=5, help='repetitions')
+    p.set_defaults(func=cmd_strainer)
+    p = sub.add_parser('stream', help='scraping a large page with and '
+                       'without building its tree')
+    p.add_argument('-n', '--rows', type=int, default=2000,
+                   help='table rows in the page')
+    p.add_argument('-r', '--runs', type=int, default=5, help='repetitions')
+    p.set_defaults(func=cmd_stream)
+    p = sub.add_parser('parse', help='parsing many small pages')
+    p.add_argument('-p', '--pages', type=int, default=500,
+                   help='pages to parse')
+    p.add_argument('-n', '--rows', type=int, default=3,
+                   help='table rows in each page')
+    p.add_argument('-r', '--runs', type=int, default=5, help='repetitions')
+    p.set_defaults(func=cmd_parse)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
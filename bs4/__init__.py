@@ -23,12 +23,14 @@ __license__ = "MIT"
 
 __all__ = ['BeautifulSoup']
 
+import codecs
 import re
 import warnings
 
 from .builder import builder_registry
 from .dammit import UnicodeDammit
 from .element import (
+    _TagIndex,
     CData,
     Comment,
     DEFAULT_OUTPUT_ENCODING,
@@ -80,11 +82,27 @@ class BeautifulSoup(Tag):
     # alone.
     STRIP_ASCII_SPACES = {9: None, 10: None, 12: None, 13: None, 32: None, }
 
+    # A document fed in chunks as bytes has its encoding guessed from at
+    # least this many bytes, unless it is shorter.
+    ENCODING_SNIFF_SIZE = 1024
+
+    # Whether the soup is being built from chunks passed to feed().
+    _feeding = False
+
     def __init__(self, markup="", features=None, builder=None,
-                 parse_only=None, from_encoding=None, **kwargs):
+                 parse_only=None, from_encoding=None, index_tags=False,
+                 **kwargs):
         """The Soup object is initialized as the 'root tag', and the
         provided markup (which can be a string or a file-like object)
-        is fed into the underlying parser."""
+        is fed into the underlying parser.
+
+        If index_tags is true, the document's tags are also indexed by
+        name and CSS class as they are parsed, so find_all() and select()
+        queries for names and classes take time in proportion to the
+        number of tags found rather than the size of the document.
+
+        If markup is None, nothing is parsed yet; see incremental().
+        """
 
         if 'convertEntities' in kwargs:
             warnings.warn(
@@ -159,9 +177,14 @@ class BeautifulSoup(Tag):
         self.builder.soup = self
 
         self.parse_only = parse_only
+        self.index_tags = index_tags
 
         self.reset()
 
+        if markup is None:
+            self._start_feeding(from_encoding)
+            return
+
         if hasattr(markup, 'read'):        # It's a file-type object.
             markup = markup.read()
         (self.markup, self.original_encoding, self.declared_html_encoding,
@@ -183,11 +206,173 @@ class BeautifulSoup(Tag):
         self.builder.reset()
 
         self.builder.feed(self.markup)
+        self._close_tags()
+
+    def _close_tags(self):
         # Close out any unfinished strings and close all the open tags.
         self.endData()
         while self.currentTag.name != self.ROOT_TAG_NAME:
             self.popTag()
 
+    @classmethod
+    def incremental(cls, features=None, builder=None, parse_only=None,
+                    from_encoding=None, index_tags=False, **kwargs):
+        """Make an empty soup, to be built from a document fed in chunks.
+
+        Pass each chunk of the document to feed() as it arrives, and
+        call close() after the last one:
+
+            soup = BeautifulSoup.incremental()
+            for chunk in chunks:
+                soup.feed(chunk)
+            soup.close()
+
+        The tree can be searched between chunks; tags whose end has not
+        been fed yet are incomplete (see is_complete()). With the
+        HTMLParser and lxml tree builders, each chunk is parsed as it is
+        fed. Other builders parse the whole document in close().
+
+        Chunks are either all Unicode or all bytes. Bytes are decoded
+        with from_encoding if it is given, or with an encoding guessed
+        from the first ENCODING_SNIFF_SIZE bytes.
+        """
+        return cls(None, features, builder, parse_only, from_encoding,
+                   index_tags, **kwargs)
+
+    def _start_feeding(self, from_encoding):
+        self.markup = None
+        self.original_encoding = None
+        self.declared_html_encoding = None
+        self.contains_replacement_characters = False
+        # Let the builder see the user's encoding, as it would for
+        # markup passed to the constructor.
+        self.builder.prepare_markup(u'', from_encoding)
+        self.builder.reset()
+        self._feeding = True
+        self._stopped = False
+        self._from_encoding = from_encoding
+        self._undecoded = []
+        self._decoder = None
+        self._fallback_encodings = []
+
+    def feed(self, markup):
+        """Parse the next chunk of a document; see incremental().
+
+        Returns False once parsing has been stopped by StopParsing, after
+        which further chunks are ignored, and True otherwise.
+        """
+        if not self._feeding:
+            raise ValueError(
+                "feed() is only for soups made with incremental(), "
+                "before close() is called.")
+        if self._stopped:
+            return False
+        if isinstance(markup, bytes):
+            markup = self._decode(markup, False)
+        if markup:
+            self._feed_chunk(markup)
+        return not self._stopped
+
+    def close(self):
+        """Finish a document fed with feed(), closing any open tags."""
+        if not self._feeding:
+            raise ValueError(
+                "close() is only for soups made with incremental(), "
+                "and can only be called once.")
+        if not self._stopped:
+            markup = self._decode(b'', True)
+            if markup:
+                self._feed_chunk(markup)
+        if not self._stopped:
+            # html5lib sets original_encoding from the Unicode it parses.
+            encoding = self.original_encoding
+            try:
+                self.builder.close_feed()
+            except StopParsing:
+                pass
+            self.original_encoding = encoding
+        self._feeding = False
+        self._decoder = None
+        self._close_tags()
+        self.builder.soup = None
+
+    def is_complete(self, tag):
+        """Whether the whole of a tag has been parsed, up to its end.
+
+        Only the tags of a soup still being fed chunks can be incomplete.
+        """
+        if tag is self:
+            return not self._feeding
+        return not any(t is tag for t in self.tagStack)
+
+    def _feed_chunk(self, markup):
+        try:
+            self.builder.feed_chunk(markup)
+        except StopParsing:
+            self._stopped = True
+
+    def _decode(self, data, final):
+        """Decode the next bytes of a document fed in chunks."""
+        if self._decoder is None:
+            self._undecoded.append(data)
+            data = b''.join(self._undecoded)
+            if not final and len(data) < self.ENCODING_SNIFF_SIZE:
+                return u''
+            self._undecoded = []
+            if not data:
+                return u''
+            self._start_decoding(data, final)
+            first = True
+        else:
+            first = False
+        while True:
+            try:
+                markup = self._decoder.decode(data, final)
+                break
+            except UnicodeDecodeError:
+                # Decode what the failed decoder had buffered, and the
+                # rest of the document, some other way.
+                data = self._decoder.getstate()[0] + data
+                if self._fallback_encodings:
+                    self.original_encoding = self._fallback_encodings.pop(0)
+                    errors = 'strict'
+                else:
+                    warnings.warn(UnicodeWarning(
+                        "Some characters could not be decoded, and were "
+                        "replaced with REPLACEMENT CHARACTER."))
+                    self.contains_replacement_characters = True
+                    errors = 'replace'
+                self._decoder = codecs.getincrementaldecoder(
+                    self.original_encoding)(errors)
+        if first and markup.startswith(u'\ufeff'):
+            markup = markup[1:]
+        return markup
+
+    def _start_decoding(self, data, final):
+        """Choose an encoding for a document from its first bytes."""
+        if not final:
+            # Leave out a character that may be cut off at the end.
+            if b'\x00' in data[:4] or data[:2] in (b'\xfe\xff', b'\xff\xfe'):
+                # UTF-16 or UTF-32
+                data = data[:len(data) - len(data) % 4]
+            else:
+                data = re.sub(b'[\x80-\xff]+$', b'', data)
+        override_encodings = []
+        if self._from_encoding:
+            override_encodings.append(self._from_encoding)
+        dammit = UnicodeDammit(data, override_encodings, is_html=True)
+        encoding = dammit.original_encoding or 'utf-8'
+        self.declared_html_encoding = dammit.declared_html_encoding
+        if encoding == 'ascii':
+            # The rest of the document may not be ASCII.
+            encoding = 'utf-8'
+        if (encoding == 'utf-8' and not override_encodings
+            and not self.declared_html_encoding):
+            # If it isn't UTF-8 either, try what UnicodeDammit would.
+            self._fallback_encodings = ['windows-1252']
+        self.original_encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)('strict')
+
     def reset(self):
         Tag.__init__(self, self, self.builder, self.ROOT_TAG_NAME)
         self.hidden = 1
@@ -195,12 +380,44 @@ class BeautifulSoup(Tag):
         self.currentData = []
         self.currentTag = None
         self.tagStack = []
+        # How many open tags preserve whitespace, and how many tags
+        # with each name are open.
+        self._preserve_depth = 0
+        self._open_tag_counts = {}
+        self._id_index = {}
+        self._rebuild_id_index()
+        self._tag_index = _TagIndex() if self.index_tags else None
         self.pushTag(self)
 
     def new_tag(self, name, namespace=None, nsprefix=None, **attrs):
         """Create a new tag associated with this soup."""
         return Tag(None, self.builder, name, namespace, nsprefix, attrs)
 
+    def get_element_by_id(self, id):
+        """Return the first tag in the document with the given id, or None.
+
+        Tags are looked up in an index of the document's ids, which is
+        kept up to date as the tree is modified. The document is searched
+        instead when the index can't answer, as when several tags share
+        the id.
+        """
+        if isinstance(id, bytes):
+            id = id.decode("utf8")
+        found = self._find_by_id(id, None)
+        if found is None:
+            return self.find(id=id)
+        return found[0] if found else None
+
+    def freeze(self):
+        """Make a read-only copy of the document, stored in flat arrays.
+
+        See bs4.frozen.FrozenSoup. The copy can be searched like this
+        soup, but not changed, and it takes less memory and pickles
+        faster.
+        """
+        from bs4.frozen import FrozenSoup
+        return FrozenSoup(self)
+
     def new_string(self, s):
         """Create a new NavigableString associated with this soup."""
         navigable = NavigableString(s)
@@ -215,6 +432,9 @@ class BeautifulSoup(Tag):
 
     def popTag(self):
         tag = self.tagStack.pop()
+        self._open_tag_counts[tag.name] -= 1
+        if tag.name in self.builder.preserve_whitespace_tags:
+            self._preserve_depth -= 1
         #print "Pop", tag.name
         if self.tagStack:
             self.currentTag = self.tagStack[-1]
@@ -226,13 +446,16 @@ class BeautifulSoup(Tag):
             self.currentTag.contents.append(tag)
         self.tagStack.append(tag)
         self.currentTag = self.tagStack[-1]
+        self._open_tag_counts[tag.name] = (
+            self._open_tag_counts.get(tag.name, 0) + 1)
+        if tag.name in self.builder.preserve_whitespace_tags:
+            self._preserve_depth += 1
 
     def endData(self, containerClass=NavigableString):
         if self.currentData:
             currentData = u''.join(self.currentData)
-            if (currentData.translate(self.STRIP_ASCII_SPACES) == '' and
-                not set([tag.name for tag in self.tagStack]).intersection(
-                    self.builder.preserve_whitespace_tags)):
+            if (not self._preserve_depth and
+                currentData.translate(self.STRIP_ASCII_SPACES) == ''):
                 if '\n' in currentData:
                     currentData = '\n'
                 else:
@@ -261,13 +484,20 @@ class BeautifulSoup(Tag):
         #print "Popping to %s" % name
         if name == self.ROOT_TAG_NAME:
             return
+        if not self._open_tag_counts.get(name):
+            # No tag with this name is open.
+            return None
+        top = self.tagStack[-1]
+        if inclusivePop and name == top.name and nsprefix == top.prefix:
+            # The usual case: the innermost open tag is the one closed.
+            return self.popTag()
 
         numPops = 0
         mostRecentTag = None
 
         for i in range(len(self.tagStack) - 1, 0, -1):
-            if (name == self.tagStack[i].name
-                and nsprefix == self.tagStack[i].nsprefix == nsprefix):
+            t = self.tagStack[i]
+            if name == t.name and nsprefix == t.prefix:
                 numPops = len(self.tagStack) - i
                 break
         if not inclusivePop:
@@ -302,6 +532,10 @@ class BeautifulSoup(Tag):
             self.previous_element.next_element = tag
         self.previous_element = tag
         self.pushTag(tag)
+        if 'id' in tag.attrs:
+            tag._update_id_index(self._id_index, True)
+        if self._tag_index is not None:
+            self._tag_index.add(tag)
         return tag
 
     def handle_endtag(self, name, nsprefix=None):
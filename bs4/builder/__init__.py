@@ -4,6 +4,7 @@ import sys
 from bs4.element import (
     CharsetMetaAttributeValue,
     ContentMetaAttributeValue,
+    _AttributeValueList,
     whitespace_re
     )
 
@@ -91,6 +92,10 @@ class TreeBuilder(object):
     # comma-separated list of CDATA, rather than a single CDATA.
     cdata_list_attributes = {}
 
+    # Whether the builder builds the tree itself, rather than only
+    # through handle_starttag() and the BeautifulSoup methods like it.
+    builds_own_tree = False
+
 
     def __init__(self):
         self.soup = None
@@ -122,6 +127,26 @@ class TreeBuilder(object):
     def feed(self, markup):
         raise NotImplementedError()
 
+    # Chunks passed to feed_chunk() and not yet parsed.
+    _chunks = None
+
+    def feed_chunk(self, markup):
+        """Parse the next chunk of a document fed in pieces.
+
+        See BeautifulSoup.incremental(). A builder whose parser can't
+        parse a document a piece at a time keeps the chunks, and parses
+        them in close_feed().
+        """
+        if self._chunks is None:
+            self._chunks = []
+        self._chunks.append(markup)
+
+    def close_feed(self):
+        """Finish parsing a document passed to feed_chunk()."""
+        markup = u''.join(self._chunks or [])
+        self._chunks = None
+        self.feed(markup)
+
     def prepare_markup(self, markup, user_specified_encoding=None,
                        document_declared_encoding=None):
         return markup, None, None, False
@@ -152,12 +177,12 @@ class TreeBuilder(object):
             tag_specific = self.cdata_list_attributes.get(
                 tag_name.lower(), [])
             for cdata_list_attr in itertools.chain(universal, tag_specific):
-                if cdata_list_attr in dict(attrs):
+                if cdata_list_attr in attrs:
                     # Basically, we have a "class" attribute whose
                     # value is a whitespace-separated list of CSS
                     # classes. Split it into a list.
                     value = attrs[cdata_list_attr]
-                    values = whitespace_re.split(value)
+                    values = _AttributeValueList(whitespace_re.split(value))
                     attrs[cdata_list_attr] = values
         return attrs
 
@@ -23,6 +23,7 @@ class HTML5TreeBuilder(HTMLTreeBuilder):
     """Use html5lib to build a tree."""
 
     features = ['html5lib', PERMISSIVE, HTML_5, HTML]
+    builds_own_tree = True
 
     def prepare_markup(self, markup, user_specified_encoding):
         # Store the user-specified encoding for use later on.
@@ -139,11 +139,30 @@ class HTMLParserTreeBuilder(HTMLTreeBuilder):
                 dammit.contains_replacement_characters)
 
     def feed(self, markup):
+        self._parse(self._new_parser().feed, markup)
+
+    # The parser for a document passed to feed_chunk().
+    _parser = None
+
+    def feed_chunk(self, markup):
+        if self._parser is None:
+            self._parser = self._new_parser()
+        self._parse(self._parser.feed, markup)
+
+    def close_feed(self):
+        parser, self._parser = self._parser, None
+        if parser is not None:
+            self._parse(parser.close)
+
+    def _new_parser(self):
         args, kwargs = self.parser_args
         parser = BeautifulSoupHTMLParser(*args, **kwargs)
         parser.soup = self.soup
+        return parser
+
+    def _parse(self, method, *args):
         try:
-            parser.feed(markup)
+            method(*args)
         except HTMLParseError, e:
             warnings.warn(RuntimeWarning(
                 "Python's built-in HTMLParser cannot parse the given document. This is not a bug in Beautiful Soup. The best solution is to install an external parser (lxml or html5lib), and use Beautiful Soup with that parser. See http://www.crummy.com/software/BeautifulSoup/bs4/doc/#installing-a-parser for help."))
@@ -84,6 +84,20 @@ class LXMLTreeBuilderForXML(TreeBuilder):
                 self.parser.feed(data)
         self.parser.close()
 
+    # Whether feed_chunk() has fed the parser since it was last closed.
+    _fed_chunk = False
+
+    def feed_chunk(self, markup):
+        self._fed_chunk = True
+        self.parser.feed(markup)
+
+    def close_feed(self):
+        if not self._fed_chunk:
+            # As in feed(), the parser must be fed at least once.
+            self.parser.feed(u'')
+        self._fed_chunk = False
+        self.parser.close()
+
     def close(self):
         self.nsmaps = None
 
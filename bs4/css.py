@@ -0,0 +1,320 @@
+"""CSS selectors for PageElement.select().
+
+A selector is parsed once into compound selectors (like
+div#main.wide[lang|="en"]) joined by the combinators " ", ">", "+" and
+"~", and selector lists are separated by commas. Parsed selectors are
+kept in a small LRU cache keyed by the selector string.
+
+A selector is matched right to left: the tags matching its last compound
+are found with one find_all() over the document, in document order, and
+each is kept if the rest of the selector matches its ancestors and
+earlier siblings.
+"""
+
+import collections
+import re
+import threading
+
+from bs4.element import Tag
+
+__all__ = ['select']
+
+# How many parsed selectors to keep.
+CACHE_SIZE = 256
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+_IDENT = r'[\w-]+'
+_TYPE_RE = re.compile(r'\*|' + _IDENT, re.UNICODE)
+_ID_RE = re.compile(r'#(' + _IDENT + ')', re.UNICODE)
+_CLASS_RE = re.compile(r'\.(' + _IDENT + ')', re.UNICODE)
+_ATTRIBUTE_RE = re.compile(
+    r'\[\s*(?P<attribute>' + _IDENT + r')\s*'
+    r'(?:(?P<operator>[~|^$*]?)=\s*'
+    r'(?:"(?P<dq>[^"]*)"|\'(?P<sq>[^\']*)\'|(?P<bare>[^\s\]"\']+))\s*)?\]',
+    re.UNICODE)
+_COMBINATOR_RE = re.compile(r'\s*([>+~,])\s*|\s+', re.UNICODE)
+
+
+def _attr_value_as_string(tag, attribute, default=None):
+    """An attribute's value, with a multi-valued attribute joined into a
+    space-separated string."""
+    value = tag.get(attribute, default)
+    if isinstance(value, (list, tuple)):
+        value = " ".join(value)
+    return value
+
+def _attribute_checker(operator, attribute, value):
+    """A function returning whether a tag matches the attribute selector
+    [attribute operator= "value"], or [attribute] if operator is None."""
+    if operator is None:
+        return lambda tag: tag.has_attr(attribute)
+    elif operator == '':
+        # string representation of `attribute` is equal to `value`
+        return lambda tag: _attr_value_as_string(tag, attribute) == value
+    elif operator == '~':
+        # space-separated list representation of `attribute`
+        # contains `value`
+        def _includes_value(tag):
+            attribute_value = tag.get(attribute, [])
+            if not isinstance(attribute_value, list):
+                attribute_value = attribute_value.split()
+            return value in attribute_value
+        return _includes_value
+    elif operator == '^':
+        # string representation of `attribute` starts with `value`
+        return lambda tag: _attr_value_as_string(
+            tag, attribute, '').startswith(value)
+    elif operator == '$':
+        # string represenation of `attribute` ends with `value`
+        return lambda tag: _attr_value_as_string(
+            tag, attribute, '').endswith(value)
+    elif operator == '*':
+        # string representation of `attribute` contains `value`
+        return lambda tag: value in _attr_value_as_string(tag, attribute, '')
+    else:
+        # string representation of `attribute` is either exactly
+        # `value` or starts with `value` and then a dash.
+        def _is_or_starts_with_dash(tag):
+            attribute_value = _attr_value_as_string(tag, attribute, '')
+            return (attribute_value == value
+                    or attribute_value.startswith(value + '-'))
+        return _is_or_starts_with_dash
+
+
+class Compound(object):
+    """A compound selector: conditions on a single tag.
+
+    name is the tag name, or None for any tag. ids and classes are lists
+    of the ids and classes the tag must have, and attributes a list of
+    (attribute, operator, value) for its attribute selectors, with
+    operator None for [attribute] and '' for [attribute=value].
+    """
+
+    def __init__(self, name=None, ids=None, classes=None, attributes=None):
+        self.name = name
+        self.ids = ids or []
+        self.classes = classes or []
+        self.attributes = attributes or []
+        self._tests = []
+        if name is not None:
+            self._tests.append(lambda tag: tag.name == name)
+        for id in self.ids:
+            self._tests.append(lambda tag, id=id: tag.get('id') == id)
+        if self.classes:
+            self._tests.append(self._has_classes)
+        for attribute, operator, value in self.attributes:
+            self._tests.append(_attribute_checker(operator, attribute, value))
+
+    def _has_classes(self, tag):
+        value = tag.get('class')
+        if value is None:
+            return False
+        if isinstance(value, basestring):
+            value = value.split()
+        for klass in self.classes:
+            if klass not in value:
+                return False
+        return True
+
+    def match(self, tag):
+        for test in self._tests:
+            if not test(tag):
+                return False
+        return True
+
+    def candidates(self, scope):
+        """The tags beneath scope that might match, in document order.
+
+        These come from find_all(), which can answer a query for an id,
+        a class or a tag name from the document's indexes.
+        """
+        name = self.name or True
+        if self.ids:
+            return scope.find_all(name, id=self.ids[0])
+        if self.classes:
+            return scope.find_all(name, {'class': self.classes[0]})
+        return scope.find_all(name)
+
+    def __repr__(self):
+        return 'Compound(%r, %r, %r, %r)' % (
+            self.name, self.ids, self.classes, self.attributes)
+
+
+class Selector(object):
+    """A complex selector: compound selectors joined by combinators.
+
+    compounds is the list of compound selectors from left to right, and
+    combinators the list of the combinators between them, each one of
+    ' ', '>', '+' or '~'.
+    """
+
+    def __init__(self, compounds, combinators):
+        self.compounds = compounds
+        self.combinators = combinators
+        self.subject = compounds[-1]
+        # (combinator, compound) pairs from right to left, for matching
+        # what comes before the subject.
+        self._steps = list(zip(reversed(combinators),
+                               reversed(compounds[:-1])))
+        # The rightmost compound with an id that the subject must lie
+        # beneath, as in "#main p" or "#main > div p".
+        self._anchor = None
+        if not self.subject.ids:
+            for combinator, compound in self._steps:
+                if combinator not in ' >':
+                    break
+                if compound.ids:
+                    self._anchor = compound
+                    break
+
+    def candidates(self, scope):
+        """The tags beneath scope that might match, in document order."""
+        if self._anchor is not None:
+            anchors = scope.find_all(self._anchor.name or True,
+                                     id=self._anchor.ids[0])
+            if not anchors:
+                return []
+            if len(anchors) == 1:
+                # Every match lies beneath the one tag with the id.
+                return self.subject.candidates(anchors[0])
+        return self.subject.candidates(scope)
+
+    def match(self, tag, scope):
+        """Whether tag matches, with every tag matched by the selector's
+        compounds lying beneath scope."""
+        return self.subject.match(tag) and self._match_steps(tag, 0, scope)
+
+    def _match_steps(self, tag, i, scope):
+        if i == len(self._steps):
+            return True
+        combinator, compound = self._steps[i]
+        if combinator == ' ':
+            parent = tag.parent
+            while parent is not None and parent is not scope:
+                if (compound.match(parent)
+                    and self._match_steps(parent, i + 1, scope)):
+                    return True
+                parent = parent.parent
+            return False
+        if combinator == '>':
+            parent = tag.parent
+            return (parent is not None and parent is not scope
+                    and compound.match(parent)
+                    and self._match_steps(parent, i + 1, scope))
+        sibling = tag.previous_sibling
+        while sibling is not None:
+            if isinstance(sibling, Tag):
+                if (compound.match(sibling)
+                    and self._match_steps(sibling, i + 1, scope)):
+                    return True
+                if combinator == '+':
+                    return False
+            sibling = sibling.previous_sibling
+        return False
+
+    def __repr__(self):
+        return 'Selector(%r, %r)' % (self.compounds, self.combinators)
+
+
+def _parse_compound(selector, pos):
+    """Parse the compound selector starting at pos.
+
+    Returns the Compound and the position after it, or None and pos if
+    there is no compound selector there.
+    """
+    name = None
+    ids = []
+    classes = []
+    attributes = []
+    start = pos
+    m = _TYPE_RE.match(selector, pos)
+    if m is not None:
+        if m.group() != '*':
+            name = m.group()
+        pos = m.end()
+    while True:
+        m = _ID_RE.match(selector, pos)
+        if m is not None:
+            ids.append(m.group(1))
+            pos = m.end()
+            continue
+        m = _CLASS_RE.match(selector, pos)
+        if m is not None:
+            classes.append(m.group(1))
+            pos = m.end()
+            continue
+        m = _ATTRIBUTE_RE.match(selector, pos)
+        if m is not None:
+            operator = m.group('operator')
+            value = m.group('dq')
+            if value is None:
+                value = m.group('sq')
+            if value is None:
+                value = m.group('bare')
+            attributes.append((m.group('attribute'), operator, value))
+            pos = m.end()
+            continue
+        break
+    if pos == start:
+        return None, pos
+    return Compound(name, ids, classes, attributes), pos
+
+def parse(selector):
+    """Parse a selector into a list of Selectors, one per comma-separated
+    selector in it. Returns None if the selector is not valid."""
+    selector = selector.strip()
+    selectors = []
+    compounds = []
+    combinators = []
+    pos = 0
+    while True:
+        compound, pos = _parse_compound(selector, pos)
+        if compound is None:
+            return None
+        compounds.append(compound)
+        if pos == len(selector):
+            break
+        m = _COMBINATOR_RE.match(selector, pos)
+        if m is None:
+            return None
+        pos = m.end()
+        combinator = m.group(1) or ' '
+        if combinator == ',':
+            selectors.append(Selector(compounds, combinators))
+            compounds = []
+            combinators = []
+        else:
+            combinators.append(combinator)
+    selectors.append(Selector(compounds, combinators))
+    return selectors
+
+def parsed(selector):
+    """The parsed form of a selector, as parse() returns it, from the LRU
+    cache if it was parsed recently."""
+    with _cache_lock:
+        try:
+            selectors = _cache.pop(selector)
+        except KeyError:
+            selectors = parse(selector)
+            if len(_cache) >= CACHE_SIZE:
+                _cache.popitem(last=False)
+        _cache[selector] = selectors
+    return selectors
+
+def select(scope, selector):
+    """The tags beneath scope matching a CSS selector, in document order.
+
+    Returns an empty list if the selector is not valid.
+    """
+    selectors = parsed(selector)
+    if not selectors:
+        return []
+    if len(selectors) == 1:
+        s = selectors[0]
+        return [tag for tag in s.candidates(scope) if s.match(tag, scope)]
+    # One pass for the whole selector list, so tags come out once each
+    # and in document order.
+    return [tag for tag in scope.find_all(True)
+            if any(s.match(tag, scope) for s in selectors)]
@@ -1,4 +1,7 @@
+import bisect
 import collections
+import itertools
+import operator
 import re
 import sys
 import warnings
@@ -9,6 +12,65 @@ PY3K = (sys.version_info[0] > 2)
 
 whitespace_re = re.compile("\s+")
 
+def _update_id_index(index, tag, id, add):
+    """Add tag to or remove it from the id index entry for id."""
+    if not isinstance(id, basestring):
+        return
+    tags = index.get(id)
+    if add:
+        if tags is None:
+            index[id] = [tag]
+        elif not any(t is tag for t in tags):
+            tags.append(tag)
+    elif tags is not None:
+        tags[:] = [t for t in tags if t is not tag]
+        if not tags:
+            del index[id]
+
+# Counts the elements taken out of trees. A tag's cached document is
+# only trusted while this is unchanged.
+_extractions = 0
+
+# Counts the changes to tag names and to the attributes the id and tag
+# indexes are kept by. An index is rebuilt before it is used if this has
+# changed since it was built.
+_tag_changes = 0
+
+# The attributes the indexes are kept by.
+_INDEXED_ATTRIBUTES = ('id', 'class')
+
+def _count_tag_change():
+    global _tag_changes
+    _tag_changes += 1
+
+_slot_descriptors_by_class = {}
+
+def _slot_descriptors(cls):
+    """(name, descriptor) for each slot of cls and of its base classes."""
+    try:
+        return _slot_descriptors_by_class[cls]
+    except KeyError:
+        pass
+    descriptors = []
+    for klass in cls.__mro__:
+        for name in klass.__dict__.get('__slots__', ()):
+            if name != '__dict__':
+                descriptors.append((name, klass.__dict__[name]))
+    _slot_descriptors_by_class[cls] = descriptors
+    return descriptors
+
+def _extra_attributes(element):
+    """The __dict__ of attributes set on element outside its slots.
+
+    A tag or string only gets a __dict__ when such an attribute is set,
+    but asking for it makes an empty one, so an empty one is dropped
+    again.
+    """
+    attributes = element.__dict__
+    if not attributes:
+        del element.__dict__
+    return attributes
+
 def _alias(attr):
     """Alias one attribute name to another for backward compatibility"""
     @property
@@ -79,10 +141,89 @@ class ContentMetaAttributeValue(AttributeValueWithCharsetSubstitution):
         return self.CHARSET_RE.sub(rewrite, self.original_value)
 
 
+def _changing(method):
+    """Wrap a method that changes indexed attributes so that it counts
+    the change in _tag_changes."""
+    def change(self, *args, **kwargs):
+        _count_tag_change()
+        return method(self, *args, **kwargs)
+    change.__name__ = method.__name__
+    return change
+
+class _AttributeDict(dict):
+    """The attributes of a tag, counting the changes made to the indexed
+    ones."""
+
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        if key in _INDEXED_ATTRIBUTES:
+            _count_tag_change()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key in _INDEXED_ATTRIBUTES:
+            _count_tag_change()
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in _INDEXED_ATTRIBUTES:
+            _count_tag_change()
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key in _INDEXED_ATTRIBUTES:
+            _count_tag_change()
+        return dict.setdefault(self, key, default)
+
+    clear = _changing(dict.clear)
+    popitem = _changing(dict.popitem)
+    update = _changing(dict.update)
+
+class _AttributeValueList(list):
+    """The values of a multi-valued attribute like class, as split by a
+    tree builder, counting the changes made to them."""
+
+    __slots__ = ()
+
+    __setitem__ = _changing(list.__setitem__)
+    __delitem__ = _changing(list.__delitem__)
+    __setslice__ = _changing(list.__setslice__)
+    __delslice__ = _changing(list.__delslice__)
+    __iadd__ = _changing(list.__iadd__)
+    __imul__ = _changing(list.__imul__)
+    append = _changing(list.append)
+    extend = _changing(list.extend)
+    insert = _changing(list.insert)
+    pop = _changing(list.pop)
+    remove = _changing(list.remove)
+
+def _watched(tag):
+    """Whether changes to the attributes of tag are counted in
+    _tag_changes, which they aren't if tag.attrs was set to a plain
+    dict."""
+    return type(tag.attrs) is _AttributeDict
+
+
 class PageElement(object):
     """Contains the navigational information for some part of the page
     (either a tag or a piece of text)"""
 
+    # Tags and strings keep their attributes in slots, to save memory.
+    # They also have a __dict__ slot, so other attributes can still be
+    # set on them; it stays empty until one is. The slots for the
+    # navigational information are declared by Tag and NavigableString,
+    # since a subclass of unicode can't inherit slots from another base
+    # class.
+    __slots__ = ()
+
+    # The BeautifulSoup object at the root of a document replaces this
+    # with a dict mapping each id attribute value in the document to a
+    # list of the tags that have it.
+    _id_index = None
+    # And, if it was asked to index its tags, this with a _TagIndex.
+    _tag_index = None
+
     # There are five possible values for the "formatter" argument passed in
     # to methods like encode() and prettify():
     #
@@ -130,6 +271,23 @@ class PageElement(object):
     nextSibling = _alias("next_sibling")  # BS3
     previousSibling = _alias("previous_sibling")  # BS3
 
+    def __getstate__(self):
+        state = {}
+        for name, slot in _slot_descriptors(self.__class__):
+            try:
+                state[name] = slot.__get__(self)
+            except AttributeError:
+                # Not set yet.
+                pass
+        state.update(_extra_attributes(self))
+        if '_document_cache' in state:
+            state['_document_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
     def replace_with(self, replace_with):
         if replace_with is self:
             return
@@ -159,7 +317,14 @@ class PageElement(object):
 
     def extract(self):
         """Destructively rips this element out of the tree."""
+        global _extractions
+        _extractions += 1
         if self.parent is not None:
+            document = self._document()
+            if document._id_index:
+                self._update_id_index(document._id_index, False)
+            if document._tag_index is not None:
+                document._tag_index.valid = False
             del self.parent.contents[self.parent.index(self)]
 
         #Find the two elements that would be next to each other if
@@ -183,6 +348,48 @@ class PageElement(object):
         self.previous_sibling = self.next_sibling = None
         return self
 
+    def _document(self):
+        """The root of the tree this element is part of. That is the
+        BeautifulSoup object, unless the element has been extracted.
+
+        Tags cache the root they find. The cache is good until an element
+        is extracted anywhere, or the root is itself inserted into a tree.
+        """
+        tag = self if isinstance(self, Tag) else self.parent
+        if tag is None:
+            return self
+        cached = tag._document_cache
+        if (cached is not None and cached[0] == _extractions
+            and cached[1].parent is None):
+            return cached[1]
+        top = tag
+        while top.parent is not None:
+            top = top.parent
+        tag._document_cache = (_extractions, top)
+        return top
+
+    def _update_id_index(self, index, add):
+        """Add the tags in this element's subtree that have an id to the
+        given id index, or remove them from it."""
+        if not isinstance(self, Tag):
+            return
+        for tag in itertools.chain([self], self.descendants):
+            if isinstance(tag, Tag):
+                _update_id_index(index, tag, tag.get('id'), add)
+                if add and not _watched(tag):
+                    # The index is rebuilt before it is next used, and
+                    # then finds it can't follow this tag's changes.
+                    _count_tag_change()
+
+    def _rebuild_id_index(self):
+        """Rebuild the id index of the document this is the root of."""
+        index = self._id_index
+        index.clear()
+        self._update_id_index(index, True)
+        self._id_index_changes = _tag_changes
+        self._ids_watched = all(
+            _watched(tag) for tag in self.descendants if isinstance(tag, Tag))
+
     def _last_descendant(self):
         "Finds the last element beneath this object to be parsed."
         last_child = self
@@ -256,6 +463,12 @@ class PageElement(object):
             new_childs_last_element.next_element.previous_element = new_childs_last_element
         self.contents.insert(position, new_child)
 
+        document = self._document()
+        if document._id_index is not None:
+            new_child._update_id_index(document._id_index, True)
+        if document._tag_index is not None:
+            document._tag_index.valid = False
+
     def append(self, tag):
         """Appends the given tag to the contents of this tag."""
         self.insert(len(self.contents), tag)
@@ -468,154 +681,14 @@ class PageElement(object):
             yield i
             i = i.parent
 
-    # Methods for supporting CSS selectors.
-
-    tag_name_re = re.compile('^[a-z0-9]+$')
-
-    # /^(\w+)\[(\w+)([=~\|\^\$\*]?)=?"?([^\]"]*)"?\]$/
-    #   \---/  \---/\-------------/    \-------/
-    #     |      |         |               |
-    #     |      |         |           The value
-    #     |      |    ~,|,^,$,* or =
-    #     |   Attribute
-    #    Tag
-    attribselect_re = re.compile(
-        r'^(?P<tag>\w+)?\[(?P<attribute>\w+)(?P<operator>[=~\|\^\$\*]?)' +
-        r'=?"?(?P<value>[^\]"]*)"?\]$'
-        )
-
-    def _attr_value_as_string(self, value, default=None):
-        """Force an attribute value into a string representation.
-
-        A multi-valued attribute will be converted into a
-        space-separated stirng.
-        """
-        value = self.get(value, default)
-        if isinstance(value, list) or isinstance(value, tuple):
-            value =" ".join(value)
-        return value
-
-    def _attribute_checker(self, operator, attribute, value=''):
-        """Create a function that performs a CSS selector operation.
-
-        Takes an operator, attribute and optional value. Returns a
-        function that will return True for elements that match that
-        combination.
-        """
-        if operator == '=':
-            # string representation of `attribute` is equal to `value`
-            return lambda el: el._attr_value_as_string(attribute) == value
-        elif operator == '~':
-            # space-separated list representation of `attribute`
-            # contains `value`
-            def _includes_value(element):
-                attribute_value = element.get(attribute, [])
-                if not isinstance(attribute_value, list):
-                    attribute_value = attribute_value.split()
-                return value in attribute_value
-            return _includes_value
-        elif operator == '^':
-            # string representation of `attribute` starts with `value`
-            return lambda el: el._attr_value_as_string(
-                attribute, '').startswith(value)
-        elif operator == '$':
-            # string represenation of `attribute` ends with `value`
-            return lambda el: el._attr_value_as_string(
-                attribute, '').endswith(value)
-        elif operator == '*':
-            # string representation of `attribute` contains `value`
-            return lambda el: value in el._attr_value_as_string(attribute, '')
-        elif operator == '|':
-            # string representation of `attribute` is either exactly
-            # `value` or starts with `value` and then a dash.
-            def _is_or_starts_with_dash(element):
-                attribute_value = element._attr_value_as_string(attribute, '')
-                return (attribute_value == value or attribute_value.startswith(
-                        value + '-'))
-            return _is_or_starts_with_dash
-        else:
-            return lambda el: el.has_attr(attribute)
-
     def select(self, selector):
-        """Perform a CSS selection operation on the current element."""
-        tokens = selector.split()
-        current_context = [self]
-        for index, token in enumerate(tokens):
-            if tokens[index - 1] == '>':
-                # already found direct descendants in last step. skip this
-                # step.
-                continue
-            m = self.attribselect_re.match(token)
-            if m is not None:
-                # Attribute selector
-                tag, attribute, operator, value = m.groups()
-                if not tag:
-                    tag = True
-                checker = self._attribute_checker(operator, attribute, value)
-                found = []
-                for context in current_context:
-                    found.extend(
-                        [el for el in context.find_all(tag) if checker(el)])
-                current_context = found
-                continue
-
-            if '#' in token:
-                # ID selector
-                tag, id = token.split('#', 1)
-                if tag == "":
-                    tag = True
-                el = current_context[0].find(tag, {'id': id})
-                if el is None:
-                    return [] # No match
-                current_context = [el]
-                continue
-
-            if '.' in token:
-                # Class selector
-                tag_name, klass = token.split('.', 1)
-                if not tag_name:
-                    tag_name = True
-                classes = set(klass.split('.'))
-                found = []
-                def classes_match(tag):
-                    if tag_name is not True and tag.name != tag_name:
-                        return False
-                    if not tag.has_attr('class'):
-                        return False
-                    return classes.issubset(tag['class'])
-                for context in current_context:
-                    found.extend(context.find_all(classes_match))
-                current_context = found
-                continue
-
-            if token == '*':
-                # Star selector
-                found = []
-                for context in current_context:
-                    found.extend(context.findAll(True))
-                current_context = found
-                continue
-
-            if token == '>':
-                # Child selector
-                tag = tokens[index + 1]
-                if not tag:
-                    tag = True
+        """Perform a CSS selection operation on the current element.
 
-                found = []
-                for context in current_context:
-                    found.extend(context.find_all(tag, recursive=False))
-                current_context = found
-                continue
-
-            # Here we should just have a regular tag
-            if not self.tag_name_re.match(token):
-                return []
-            found = []
-            for context in current_context:
-                found.extend(context.findAll(token))
-            current_context = found
-        return current_context
+        Returns the tags beneath this one that match the selector, in
+        document order. See bs4.css for the selectors supported.
+        """
+        from bs4.css import select
+        return select(self, selector)
 
     # Old non-property versions of the generators, for backwards
     # compatibility with BS3.
@@ -637,6 +710,9 @@ class PageElement(object):
 
 class NavigableString(unicode, PageElement):
 
+    __slots__ = ('parent', 'previous_element', 'next_element',
+                 'previous_sibling', 'next_sibling', '__dict__')
+
     PREFIX = ''
     SUFFIX = ''
 
@@ -677,6 +753,7 @@ class PreformattedString(NavigableString):
     The string will be passed into the formatter (to trigger side effects),
     but the return value will be ignored.
     """
+    __slots__ = ()
 
     def output_ready(self, formatter="minimal"):
         """CData strings are passed into the formatter.
@@ -685,27 +762,33 @@ class PreformattedString(NavigableString):
         return self.PREFIX + self + self.SUFFIX
 
 class CData(PreformattedString):
+    __slots__ = ()
 
     PREFIX = u'<![CDATA['
     SUFFIX = u']]>'
 
 class ProcessingInstruction(PreformattedString):
+    __slots__ = ()
 
     PREFIX = u'<?'
     SUFFIX = u'?>'
 
 class Comment(PreformattedString):
+    __slots__ = ()
 
     PREFIX = u'<!--'
     SUFFIX = u'-->'
 
 
 class Declaration(PreformattedString):
+    __slots__ = ()
+
     PREFIX = u'<!'
     SUFFIX = u'!>'
 
 
 class Doctype(PreformattedString):
+    __slots__ = ()
 
     @classmethod
     def for_name_and_ids(cls, name, pub_id, system_id):
@@ -727,6 +810,11 @@ class Tag(PageElement):
 
     """Represents a found HTML tag with its attributes and contents."""
 
+    __slots__ = ('parent', 'previous_element', 'next_element',
+                 'previous_sibling', 'next_sibling', 'parser_class', '_name',
+                 'namespace', 'prefix', '_attributes', 'contents', 'hidden',
+                 'can_be_empty_element', '_document_cache', '__dict__')
+
     def __init__(self, parser=None, builder=None, name=None, namespace=None,
                  prefix=None, attrs=None, parent=None, previous=None):
         "Basic constructor."
@@ -739,18 +827,19 @@ class Tag(PageElement):
             self.parser_class = parser.__class__
         if name is None:
             raise ValueError("No value provided for new tag's name.")
-        self.name = name
+        self._name = name
         self.namespace = namespace
         self.prefix = prefix
         if attrs is None:
-            attrs = {}
+            attrs = _AttributeDict()
         elif builder.cdata_list_attributes:
-            attrs = builder._replace_cdata_list_attribute_values(
-                self.name, attrs)
+            attrs = _AttributeDict(
+                builder._replace_cdata_list_attribute_values(name, attrs))
         else:
-            attrs = dict(attrs)
-        self.attrs = attrs
+            attrs = _AttributeDict(attrs)
+        self._attributes = attrs
         self.contents = []
+        self._document_cache = None
         self.setup(parent, previous)
         self.hidden = False
 
@@ -763,6 +852,21 @@ class Tag(PageElement):
 
     parserClass = _alias("parser_class")  # BS3
 
+    # Renaming a tag or replacing its attributes is counted in
+    # _tag_changes, as are changes to its id and class.
+
+    def _set_name(self, name):
+        _count_tag_change()
+        self._name = name
+
+    name = property(operator.attrgetter('_name'), _set_name)
+
+    def _set_attrs(self, attrs):
+        _count_tag_change()
+        self._attributes = attrs
+
+    attrs = property(operator.attrgetter('_attributes'), _set_attrs)
+
     @property
     def is_empty_element(self):
         """Is this tag an empty-element tag? (aka a self-closing tag)
@@ -834,7 +938,12 @@ class Tag(PageElement):
         i = self
         while i is not None:
             next = i.next_element
-            i.__dict__.clear()
+            for name, slot in _slot_descriptors(i.__class__):
+                try:
+                    slot.__delete__(i)
+                except AttributeError:
+                    pass
+            _extra_attributes(i).clear()
             i = next
 
     def clear(self, decompose=False):
@@ -896,11 +1005,32 @@ class Tag(PageElement):
     def __setitem__(self, key, value):
         """Setting tag[key] sets the value of the 'key' attribute for the
         tag."""
-        self.attrs[key] = value
+        if key in _INDEXED_ATTRIBUTES:
+            # The document's indexes are updated here, so the change
+            # needn't be counted.
+            self._attribute_changing(key, value)
+            dict.__setitem__(self.attrs, key, value)
+        else:
+            self.attrs[key] = value
 
     def __delitem__(self, key):
         "Deleting tag[key] deletes all 'key' attributes for the tag."
-        self.attrs.pop(key, None)
+        if key in _INDEXED_ATTRIBUTES:
+            self._attribute_changing(key, None)
+            dict.pop(self.attrs, key, None)
+        else:
+            self.attrs.pop(key, None)
+
+    def _attribute_changing(self, key, value):
+        """Update the document's indexes before an indexed attribute is
+        set to value, or deleted if value is None."""
+        document = self._document()
+        if key == 'id' and document._id_index is not None:
+            _update_id_index(document._id_index, self, self.attrs.get(key),
+                             False)
+            _update_id_index(document._id_index, self, value, True)
+        if key == 'class' and document._tag_index is not None:
+            document._tag_index.valid = False
 
     def __call__(self, *args, **kwargs):
         """Calling a tag like a function is the same as calling its
@@ -1123,8 +1253,110 @@ class Tag(PageElement):
         generator = self.descendants
         if not recursive:
             generator = self.children
+        else:
+            id = self._id_query(name, attrs, text, kwargs)
+            if id is not None:
+                found = self._find_by_id(id, name)
+                if found is not None:
+                    return found
+            found = self._find_in_tag_index(name, attrs, text, limit, kwargs)
+            if found is not None:
+                return found
         return self._find_all(name, attrs, text, limit, generator, **kwargs)
     findAll = find_all       # BS3
+
+    def _id_query(self, name, attrs, text, kwargs):
+        """If a find_all() query matches tags on their id alone, and
+        optionally their name, return the id. Otherwise return None."""
+        if text is not None or not (
+            name is None or name is True or isinstance(name, basestring)):
+            return None
+        if not isinstance(attrs, dict):
+            return None
+        if attrs and kwargs:
+            return None
+        query = attrs or kwargs
+        if len(query) != 1:
+            return None
+        id = query.get('id')
+        if not isinstance(id, basestring):
+            return None
+        if isinstance(id, bytes):
+            id = id.decode("utf8")
+        return id
+
+    def _find_in_tag_index(self, name, attrs, text, limit, kwargs):
+        """Answer a find_all() query for a tag name, a single CSS class or
+        both from the document's tag index.
+
+        Returns None if the query is of some other kind, or the document
+        doesn't index its tags or its index can't be trusted.
+        """
+        if text is not None or not (
+            name is None or name is True or isinstance(name, basestring)):
+            return None
+        if not isinstance(attrs, dict):
+            # As in SoupStrainer, a non-dict attrs is a CSS class.
+            attrs = {'class': attrs}
+        if attrs and kwargs:
+            return None
+        query = dict(attrs or kwargs)
+        if 'class_' in query:
+            query['class'] = query.pop('class_')
+        klass = query.pop('class', None)
+        if query or (klass is None and not isinstance(name, basestring)):
+            return None
+        if klass is not None and (not isinstance(klass, basestring)
+                                  or whitespace_re.search(klass)):
+            return None
+        index = self._document()._tag_index
+        if index is None:
+            return None
+        if not isinstance(name, basestring):
+            name = None
+        if isinstance(name, bytes):
+            name = name.decode("utf8")
+        if isinstance(klass, bytes):
+            klass = klass.decode("utf8")
+        tags = index.find_all(self, name, klass)
+        if tags is None:
+            return None
+        results = ResultSet(SoupStrainer(name, {'class': klass}
+                                         if klass is not None else {}))
+        results.extend(tags[:limit] if limit else tags)
+        return results
+
+    def _find_by_id(self, id, name):
+        """Look up the tag beneath this one with the given id, and name if
+        it is a string, in the document's id index.
+
+        Returns None if the index can't answer the query: when this tag
+        is not part of a document, no tag or several tags have the id, or
+        the document holds attributes whose changes the index can't
+        follow, such as a dict assigned to tag.attrs.
+        """
+        document = self._document()
+        index = document._id_index
+        if index is None:
+            return None
+        if document._id_index_changes != _tag_changes:
+            document._rebuild_id_index()
+        if not document._ids_watched:
+            return None
+        tags = index.get(id)
+        if not tags or len(tags) > 1:
+            # Only string ids are indexed, and the index doesn't know
+            # which of several tags comes first.
+            return None
+        tag = tags[0]
+        results = ResultSet(SoupStrainer(name, {'id': id}))
+        if isinstance(name, basestring) and tag.name != name:
+            return results
+        if tag is self or (self.parent is not None
+                           and not any(p is self for p in tag.parents)):
+            return results
+        results.append(tag)
+        return results
     findChildren = find_all  # BS2
 
     #Generator methods
@@ -1158,7 +1390,14 @@ class Tag(PageElement):
 # Next, a couple classes to represent queries and their results.
 class SoupStrainer(object):
     """Encapsulates a number of ways of matching a markup element (tag or
-    text)."""
+    text).
+
+    The criteria are compiled into matcher functions the first time the
+    strainer is used. Assigning to name, attrs or text recompiles them;
+    changing the attrs dict in place does not.
+    """
+
+    _compiled = None
 
     def __init__(self, name=None, attrs={}, text=None, **kwargs):
         self.name = self._normalize_search_value(name)
@@ -1168,6 +1407,11 @@ class SoupStrainer(object):
             kwargs['class'] = attrs
             attrs = None
 
+        if 'class_' in kwargs:
+            # 'class' is a reserved word, so it can't be a keyword
+            # argument.
+            kwargs['class'] = kwargs.pop('class_')
+
         if kwargs:
             if attrs:
                 attrs = attrs.copy()
@@ -1181,6 +1425,11 @@ class SoupStrainer(object):
         self.attrs = normalized_attrs
         self.text = self._normalize_search_value(text)
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in ('name', 'attrs', 'text'):
+            object.__setattr__(self, '_compiled', None)
+
     def _normalize_search_value(self, value):
         # Leave it alone if it's a Unicode string, a callable, a
         # regular expression, a boolean, or None.
@@ -1217,72 +1466,158 @@ class SoupStrainer(object):
         else:
             return "%s|%s" % (self.name, self.attrs)
 
+    def _compile(self):
+        """Turn the criteria into matcher functions.
+
+        This decides once, rather than for every element searched, how
+        each criterion is matched. A matcher for a criterion gives the
+        same answer as _matches() does.
+        """
+        self._compiled = (
+            self._matcher(self.name),
+            [(attr, self._matcher(match_against))
+             for attr, match_against in list(self.attrs.items())],
+            self._matcher(self.text),
+            isinstance(self.name, collections.Callable),
+            bool(not self.text or self.name or self.attrs),
+            bool(not self.name and not self.attrs))
+
+    def __getstate__(self):
+        # The compiled matchers are closures; rebuild them after unpickling.
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        return state
+
+    def _matcher(self, match_against):
+        """A function of one markup value that matches it against
+        match_against the way _matches() does."""
+        normalize = self._normalize_search_value
+        # Matching a markup value that is a string, a tag or None.
+        if match_against is True:
+            def match_one(markup):
+                return markup is not None
+        elif isinstance(match_against, collections.Callable):
+            match_one = match_against
+        else:
+            if_none = not match_against
+            if isinstance(match_against, unicode):
+                def match_one(markup):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    if not isinstance(markup, unicode):
+                        markup = normalize(markup)
+                        if markup is None:
+                            return if_none
+                    return markup == match_against
+            elif hasattr(match_against, 'match'):
+                search = match_against.search
+                def match_one(markup):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    if not isinstance(markup, unicode):
+                        markup = normalize(markup)
+                        if markup is None:
+                            return if_none
+                    return search(markup)
+            elif hasattr(match_against, '__iter__'):
+                def match_one(markup):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    if not isinstance(markup, unicode):
+                        markup = normalize(markup)
+                        if markup is None:
+                            return if_none
+                    return markup in match_against
+            else:
+                def match_one(markup):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    if not isinstance(markup, unicode):
+                        markup = normalize(markup)
+                        if markup is None:
+                            return if_none
+                    return None
+
+        # Matching the value of a multi-valued attribute like 'class'.
+        if isinstance(match_against, unicode) and ' ' in match_against:
+            # Only the literal value "foo bar" matches "foo bar".
+            values = whitespace_re.split(match_against)
+            def match_list(markup):
+                return values == markup
+        else:
+            def match_list(markup):
+                for item in markup:
+                    if matcher(item):
+                        return True
+                return False
+
+        def matcher(markup):
+            if isinstance(markup, (list, tuple)):
+                return match_list(markup)
+            return match_one(markup)
+        return matcher
+
     def search_tag(self, markup_name=None, markup_attrs={}):
-        found = None
-        markup = None
+        if self._compiled is None:
+            self._compile()
+        (match_name, match_attrs, match_text, name_is_callable,
+         _, _) = self._compiled
         if isinstance(markup_name, Tag):
             markup = markup_name
-            markup_attrs = markup
-        call_function_with_tag_data = (
-            isinstance(self.name, collections.Callable)
-            and not isinstance(markup_name, Tag))
-
-        if ((not self.name)
-            or call_function_with_tag_data
-            or (markup and self._matches(markup, self.name))
-            or (not markup and self._matches(markup_name, self.name))):
-            if call_function_with_tag_data:
-                match = self.name(markup_name, markup_attrs)
-            else:
-                match = True
-                markup_attr_map = None
-                for attr, match_against in list(self.attrs.items()):
-                    if not markup_attr_map:
-                        if hasattr(markup_attrs, 'get'):
-                            markup_attr_map = markup_attrs
-                        else:
-                            markup_attr_map = {}
-                            for k, v in markup_attrs:
-                                markup_attr_map[k] = v
-                    attr_value = markup_attr_map.get(attr)
-                    if not self._matches(attr_value, match_against):
-                        match = False
-                        break
-            if match:
-                if markup:
-                    found = markup
+            if self.name and not match_name(markup):
+                return None
+            markup_attr_map = markup.attrs
+            for attr, match in match_attrs:
+                if not match(markup_attr_map.get(attr)):
+                    return None
+            found = markup
+        else:
+            # The tag is being parsed, and only its name and attributes
+            # are known so far.
+            if name_is_callable:
+                if not self.name(markup_name, markup_attrs):
+                    return None
+            elif self.name and not match_name(markup_name):
+                return None
+            elif match_attrs:
+                if hasattr(markup_attrs, 'get'):
+                    markup_attr_map = markup_attrs
                 else:
-                    found = markup_name
-        if found and self.text and not self._matches(found.string, self.text):
+                    markup_attr_map = dict(markup_attrs)
+                for attr, match in match_attrs:
+                    if not match(markup_attr_map.get(attr)):
+                        return None
+            found = markup_name
+        if found and self.text and not match_text(found.string):
             found = None
         return found
     searchTag = search_tag
 
     def search(self, markup):
         # print 'looking for %s in %s' % (self, markup)
-        found = None
+        if self._compiled is None:
+            self._compile()
+        # If it's a Tag, make sure its name or attributes match.
+        # Don't bother with Tags if we're searching for text.
+        if isinstance(markup, Tag):
+            if self._compiled[4]:
+                return self.search_tag(markup)
+            return None
+        # If it's text, make sure the text matches.
+        if isinstance(markup, basestring):
+            if self._compiled[5] and self._compiled[2](markup):
+                return markup
+            return None
         # If given a list of items, scan it for a text element that
         # matches.
-        if hasattr(markup, '__iter__') and not isinstance(markup, (Tag, basestring)):
+        if hasattr(markup, '__iter__'):
             for element in markup:
                 if isinstance(element, NavigableString) \
                        and self.search(element):
-                    found = element
-                    break
-        # If it's a Tag, make sure its name or attributes match.
-        # Don't bother with Tags if we're searching for text.
-        elif isinstance(markup, Tag):
-            if not self.text or self.name or self.attrs:
-                found = self.search_tag(markup)
-        # If it's text, make sure the text matches.
-        elif isinstance(markup, NavigableString) or \
-                 isinstance(markup, basestring):
-            if not self.name and not self.attrs and self._matches(markup, self.text):
-                found = markup
-        else:
-            raise Exception(
-                "I don't know how to match against a %s" % markup.__class__)
-        return found
+                    return element
+            return None
+        raise Exception(
+            "I don't know how to match against a %s" % markup.__class__)
 
     def _matches(self, markup, match_against):
         # print u"Matching %s against %s" % (markup, match_against)
@@ -1345,3 +1680,82 @@ class ResultSet(list):
     def __init__(self, source):
         list.__init__([])
         self.source = source
+
+
+class _TagIndex(object):
+    """Document-ordered lists of the tags in a document by tag name and by
+    CSS class, so find_all() can look tags up instead of walking the tree.
+
+    Each tag is numbered in document order, and the tags beneath a tag are
+    the ones numbered after it, up to its last descendant tag. Inserting
+    or extracting an element, or setting tag['class'], clears the valid
+    flag. The index is rebuilt when it is next used after that, or after
+    any change counted in _tag_changes. If a tag holds attributes whose
+    changes aren't counted, such as a dict assigned to tag.attrs, the
+    index can't be trusted and find_all() returns None.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.valid = True
+        self.changes = _tag_changes
+        # Whether every change to the indexed tags is counted.
+        self.watched = True
+        # id(tag) -> position in document order.
+        self.positions = {}
+        # name or class -> ([positions], [tags])
+        self.by_name = {}
+        self.by_class = {}
+
+    def add(self, tag):
+        """Add a tag that comes after all the tags already indexed."""
+        position = len(self.positions)
+        self.positions[id(tag)] = position
+        self._add(self.by_name, tag.name, position, tag)
+        classes = tag.attrs.get('class')
+        if not _watched(tag) or (isinstance(classes, list) and not
+                                 isinstance(classes, _AttributeValueList)):
+            self.watched = False
+        if isinstance(classes, basestring):
+            classes = [classes]
+        for klass in classes or ():
+            self._add(self.by_class, klass, position, tag)
+
+    def _add(self, table, key, position, tag):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = ([], [])
+        entry[0].append(position)
+        entry[1].append(tag)
+
+    def rebuild(self, document):
+        self.clear()
+        for element in document.descendants:
+            if isinstance(element, Tag):
+                self.add(element)
+
+    def find_all(self, tag, name=None, klass=None):
+        """The tags beneath tag with the given name and class, either of
+        which may be None to match any, in document order, or None if
+        the index can't be trusted."""
+        document = tag._document()
+        if not self.valid or self.changes != _tag_changes:
+            self.rebuild(document)
+        if not self.watched:
+            return None
+        if klass is not None:
+            positions, tags = self.by_class.get(klass, ((), ()))
+        else:
+            positions, tags = self.by_name.get(name, ((), ()))
+        if tag is not document:
+            last = tag._last_descendant()
+            while not isinstance(last, Tag):
+                last = last.previous_element
+            lo = bisect.bisect_right(positions, self.positions[id(tag)])
+            hi = bisect.bisect_right(positions, self.positions[id(last)])
+            tags = tags[lo:hi]
+        if klass is not None and name is not None:
+            tags = [t for t in tags if t.name == name]
+        return list(tags)
@@ -0,0 +1,491 @@
+"""A read-only copy of a parsed document, stored in flat arrays.
+
+BeautifulSoup.freeze() turns a tree into a FrozenSoup. The nodes, tags
+and strings alike, are numbered in document order, the soup itself being
+node 0, and the tree is kept as arrays of integers indexed by node
+number:
+
+  kind     0 for a tag, or the string class of a string
+  value    the tag name's number in the name table, or the string's
+           number in the string table
+  parent, previous sibling, next sibling   node numbers, or -1
+  end      the number of the first node after the node's descendants
+
+so a tag's descendants are the nodes between it and its end, and its
+first child, if any, is the node after it. Attribute dicts, tag
+namespaces, ids and each name's tags are kept in tables by node number,
+and tags with the same attributes share an attribute dict.
+
+find(), find_all(), select(), get_text() and descendants work on the
+arrays. The tags and strings they return are views: Tag and
+NavigableString subclasses, which read their navigation from the
+arrays. A node's view is made the first time the node is returned, and
+kept, so the same node always gives the same object. Views can't be
+changed.
+
+A FrozenSoup pickles as its arrays and tables, without a node object in
+sight.
+"""
+
+from array import array
+from bisect import bisect_left
+from bs4.element import (
+    DEFAULT_OUTPUT_ENCODING,
+    ResultSet,
+    SoupStrainer,
+    Tag,
+    )
+
+__all__ = ['FrozenSoup']
+
+
+def _read_only(self, *args, **kwargs):
+    raise ValueError("A frozen tree can't be changed.")
+
+
+class FrozenElement(object):
+    """The navigation of a node in a FrozenSoup, read from its arrays."""
+
+    __slots__ = ()
+
+    @property
+    def parent(self):
+        i = self._soup._parents[self._index]
+        if i == -1:
+            return None
+        return self._soup._view(i)
+
+    @property
+    def next_sibling(self):
+        i = self._soup._next_siblings[self._index]
+        if i == -1:
+            return None
+        return self._soup._view(i)
+
+    @property
+    def previous_sibling(self):
+        i = self._soup._previous_siblings[self._index]
+        if i == -1:
+            return None
+        return self._soup._view(i)
+
+    @property
+    def next_element(self):
+        i = self._index + 1
+        if self._index == 0 or i == len(self._soup._kinds):
+            return None
+        return self._soup._view(i)
+
+    @property
+    def previous_element(self):
+        i = self._index - 1
+        if i <= 0:
+            return None
+        return self._soup._view(i)
+
+    nextSibling = next_sibling  # BS3
+    previousSibling = previous_sibling  # BS3
+
+    def __reduce__(self):
+        return (_view, (self._soup, self._index))
+
+    def _document(self):
+        return self._soup
+
+    # Everything that changes a tree.
+    replace_with = replaceWith = _read_only
+    unwrap = replace_with_children = replaceWithChildren = _read_only
+    wrap = extract = insert = append = _read_only
+    insert_before = insert_after = setup = _read_only
+    decompose = clear = __setitem__ = __delitem__ = _read_only
+
+def _view(soup, index):
+    return soup._view(index)
+
+
+class FrozenTag(FrozenElement, Tag):
+    """A tag in a FrozenSoup."""
+
+    __slots__ = ('_soup', '_index')
+
+    @property
+    def contents(self):
+        return list(self.children)
+
+    @property
+    def children(self):
+        soup = self._soup
+        next_siblings = soup._next_siblings
+        i = self._index + 1
+        if i == soup._ends[self._index]:
+            return
+        while i != -1:
+            yield soup._view(i)
+            i = next_siblings[i]
+
+    @property
+    def descendants(self):
+        view = self._soup._view
+        for i in xrange(self._index + 1, self._soup._ends[self._index]):
+            yield view(i)
+
+    def _all_strings(self, strip=False):
+        """Yield all the strings beneath this tag, possibly stripping them.
+        """
+        soup = self._soup
+        kinds = soup._kinds
+        for i in xrange(self._index + 1, soup._ends[self._index]):
+            if kinds[i]:
+                string = soup._view(i)
+                if strip:
+                    string = string.strip()
+                    if not string:
+                        continue
+                yield string
+    strings = property(_all_strings)
+
+    def get_text(self, separator=u"", strip=False):
+        """
+        Get all child strings, concatenated using the given separator.
+        """
+        soup = self._soup
+        kinds = soup._kinds
+        values = soup._values
+        strings = soup._strings
+        found = []
+        for i in xrange(self._index + 1, soup._ends[self._index]):
+            if kinds[i]:
+                string = strings[values[i]]
+                if strip:
+                    string = string.strip()
+                    if not string:
+                        continue
+                found.append(string)
+        return separator.join(found)
+    getText = get_text
+    text = property(get_text)
+
+    def find_all(self, name=None, attrs={}, recursive=True, text=None,
+                 limit=None, **kwargs):
+        """Extracts a list of Tag objects that match the given
+        criteria, as Tag.find_all() does, from the arrays."""
+        if isinstance(name, SoupStrainer):
+            strainer = name
+        else:
+            strainer = SoupStrainer(name, attrs, text, **kwargs)
+        results = ResultSet(strainer)
+        view = self._soup._view
+        for i in self._soup._search(strainer, self._index, recursive,
+                                    limit):
+            results.append(view(i))
+        return results
+    findAll = find_all  # BS3
+    findChildren = find_all  # BS2
+
+
+_string_view_classes = {}
+
+def _string_view_class(cls):
+    """The class of the views of the strings of class cls."""
+    try:
+        return _string_view_classes[cls]
+    except KeyError:
+        pass
+    view_class = type('Frozen' + cls.__name__, (FrozenElement, cls),
+                      {'__slots__': ('_soup', '_index'),
+                       '__module__': __name__})
+    _string_view_classes[cls] = view_class
+    return view_class
+
+
+class FrozenSoup(FrozenTag):
+    """A read-only copy of a BeautifulSoup document, stored in flat arrays.
+    """
+
+    def __init__(self, soup):
+        self.is_xml = soup.is_xml
+        self.original_encoding = getattr(soup, 'original_encoding', None)
+        self.parser_class = soup.parser_class
+        self._kinds = array('b')
+        self._values = array('i')
+        self._parents = array('i')
+        self._previous_siblings = array('i')
+        self._next_siblings = array('i')
+        self._ends = array('i')
+        # By node number: the attributes of each tag, or None if it has
+        # none, and whether it can be an empty-element tag.
+        self._attrs = []
+        self._empty = array('b')
+        # Node number: (namespace, prefix) for namespaced tags.
+        self._namespaces = {}
+        # The string classes, by kind.
+        self._classes = [Tag]
+        self._names = []
+        self._name_ids = {}
+        self._strings = []
+        # Id: the numbers of the tags with that id.
+        self._ids = {}
+        self._freeze(soup)
+        self._set_up_root()
+
+    def _set_up_root(self):
+        self._soup = self
+        self._index = 0
+        self._views = {}
+        self._name = self._names[self._values[0]]
+        self.namespace = self.prefix = None
+        self._attributes = {}
+        self.hidden = 1
+        self.can_be_empty_element = False
+
+    def _freeze(self, soup):
+        kinds = self._kinds
+        values = self._values
+        parents = self._parents
+        previous_siblings = self._previous_siblings
+        next_siblings = self._next_siblings
+        attrs_table = self._attrs
+        empty = self._empty
+        name_ids = self._name_ids
+        string_ids = {}
+        # Tags with the same attributes share one dict.
+        attrs_ids = {}
+        kind_ids = {Tag: 0}
+        # The last child of each node added so far, or -1.
+        last_children = array('i')
+        tags_by_name = []
+
+        work = [(soup, -1)]
+        while work:
+            node, parent = work.pop()
+            i = len(kinds)
+            parents.append(parent)
+            next_siblings.append(-1)
+            last_children.append(-1)
+            if parent == -1:
+                previous_siblings.append(-1)
+            else:
+                previous = last_children[parent]
+                previous_siblings.append(previous)
+                if previous != -1:
+                    next_siblings[previous] = i
+                last_children[parent] = i
+            if isinstance(node, Tag):
+                kinds.append(0)
+                name_id = name_ids.get(node.name)
+                if name_id is None:
+                    name_id = name_ids[node.name] = len(self._names)
+                    self._names.append(node.name)
+                    tags_by_name.append([])
+                values.append(name_id)
+                tags_by_name[name_id].append(i)
+                attrs = None
+                if node.attrs:
+                    key = tuple(sorted(
+                        (name, tuple(value) if isinstance(value, list)
+                         else value)
+                        for name, value in node.attrs.items()))
+                    try:
+                        attrs = attrs_ids.get(key)
+                    except TypeError:
+                        # An unhashable value; don't share the dict.
+                        key = None
+                    if attrs is None:
+                        attrs = dict(
+                            (name, list(value) if isinstance(value, list)
+                             else value)
+                            for name, value in node.attrs.items())
+                        if key is not None:
+                            attrs_ids[key] = attrs
+                    id = attrs.get('id')
+                    if isinstance(id, basestring):
+                        self._ids.setdefault(id, []).append(i)
+                attrs_table.append(attrs)
+                empty.append(bool(node.can_be_empty_element))
+                if node.namespace is not None or node.prefix is not None:
+                    self._namespaces[i] = (node.namespace, node.prefix)
+                work.extend((child, i) for child in reversed(node.contents))
+            else:
+                kind = kind_ids.get(node.__class__)
+                if kind is None:
+                    kind = kind_ids[node.__class__] = len(self._classes)
+                    self._classes.append(node.__class__)
+                kinds.append(kind)
+                string = unicode(node)
+                string_id = string_ids.get(string)
+                if string_id is None:
+                    string_id = string_ids[string] = len(self._strings)
+                    self._strings.append(string)
+                values.append(string_id)
+                attrs_table.append(None)
+                empty.append(False)
+
+        # A node's descendants end where its last child's do.
+        ends = self._ends
+        ends.extend(last_children)
+        for i in xrange(len(kinds) - 1, -1, -1):
+            last = last_children[i]
+            if last == -1:
+                ends[i] = i + 1
+            else:
+                ends[i] = ends[last]
+        self._tags_by_name = [array('i', tags) for tags in tags_by_name]
+
+    def _view(self, i):
+        """The view of node i."""
+        if i == 0:
+            return self
+        view = self._views.get(i)
+        if view is not None:
+            return view
+        kind = self._kinds[i]
+        if kind == 0:
+            view = FrozenTag.__new__(FrozenTag)
+            view._name = self._names[self._values[i]]
+            view.namespace, view.prefix = self._namespaces.get(
+                i, (None, None))
+            view._attributes = self._attrs[i] or {}
+            view.hidden = False
+            view.can_be_empty_element = bool(self._empty[i])
+            view.parser_class = self.parser_class
+        else:
+            cls = _string_view_class(self._classes[kind])
+            view = cls.__new__(cls, self._strings[self._values[i]])
+        view._soup = self
+        view._index = i
+        self._views[i] = view
+        return view
+
+    def _search(self, strainer, index, recursive, limit):
+        """The numbers of the nodes beneath node index that strainer
+        matches, in document order."""
+        if strainer._compiled is None:
+            strainer._compile()
+        (match_name, match_attrs, match_text, name_is_callable,
+         search_tags, search_strings) = strainer._compiled
+        kinds = self._kinds
+        values = self._values
+        attrs_table = self._attrs
+        end = self._ends[index]
+        text_is_callable = callable(strainer.text)
+
+        if not recursive:
+            candidates = self._children(index)
+        else:
+            candidates = xrange(index + 1, end)
+        name_id = None
+        if isinstance(strainer.name, unicode):
+            # Only the tags with the name can match.
+            name_id = self._name_ids.get(strainer.name)
+            if name_id is None:
+                return []
+            if recursive:
+                tags = self._tags_by_name[name_id]
+                candidates = tags[bisect_left(tags, index + 1):
+                                  bisect_left(tags, end)]
+        id = strainer.attrs.get('id')
+        if recursive and isinstance(id, unicode):
+            tags = self._ids.get(id, ())
+            candidates = tags[bisect_left(tags, index + 1):
+                              bisect_left(tags, end)]
+
+        found = []
+        for i in candidates:
+            if kinds[i] == 0:
+                if not search_tags:
+                    continue
+                if name_id is not None:
+                    if values[i] != name_id:
+                        continue
+                elif name_is_callable:
+                    if not strainer.name(self._view(i)):
+                        continue
+                elif strainer.name and not match_name(
+                    self._names[values[i]]):
+                    continue
+                if match_attrs:
+                    attrs = attrs_table[i] or {}
+                    for attr, match in match_attrs:
+                        if not match(attrs.get(attr)):
+                            break
+                    else:
+                        attrs = None
+                    if attrs is not None:
+                        continue
+                if strainer.text and not match_text(self._view(i).string):
+                    continue
+            else:
+                if not search_strings:
+                    continue
+                string = self._strings[values[i]]
+                if not string:
+                    continue
+                if text_is_callable:
+                    string = self._view(i)
+                if not match_text(string):
+                    continue
+            found.append(i)
+            if limit and len(found) >= limit:
+                break
+        return found
+
+    def _children(self, index):
+        i = index + 1
+        if i == self._ends[index]:
+            return
+        while i != -1:
+            yield i
+            i = self._next_siblings[i]
+
+    def get_element_by_id(self, id):
+        """Return the first tag in the document with the given id, or None.
+        """
+        if isinstance(id, bytes):
+            id = id.decode("utf8")
+        tags = self._ids.get(id)
+        if not tags:
+            return None
+        return self._view(tags[0])
+
+    def decode(self, pretty_print=False,
+               eventual_encoding=DEFAULT_OUTPUT_ENCODING,
+               formatter="minimal"):
+        """Returns a string or Unicode representation of this document.
+        To get Unicode, pass None for encoding."""
+        if self.is_xml:
+            encoding_part = ''
+            if eventual_encoding != None:
+                encoding_part = ' encoding="%s"' % eventual_encoding
+            prefix = u'<?xml version="1.0"%s?>\n' % encoding_part
+        else:
+            prefix = u''
+        if not pretty_print:
+            indent_level = None
+        else:
+            indent_level = 0
+        return prefix + super(FrozenSoup, self).decode(
+            indent_level, eventual_encoding, formatter)
+
+    # Arrays are pickled as bytes, not as lists of numbers.
+    _ARRAYS = ('_kinds', '_values', '_parents', '_previous_siblings',
+               '_next_siblings', '_ends', '_empty')
+
+    __reduce__ = object.__reduce__
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_views']
+        for name in self._ARRAYS:
+            state[name] = (state[name].typecode, state[name].tostring())
+        state['_tags_by_name'] = [
+            tags.tostring() for tags in state['_tags_by_name']]
+        return state
+
+    def __setstate__(self, state):
+        for name in self._ARRAYS:
+            typecode, data = state[name]
+            state[name] = array(typecode, data)
+        state['_tags_by_name'] = [
+            array('i', data) for data in state['_tags_by_name']]
+        self.__dict__.update(state)
+        self._set_up_root()
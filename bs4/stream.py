@@ -0,0 +1,291 @@
+"""Parsing a document without building its tree.
+
+events() runs a tree builder over a document and yields what it parses
+as (event, path, value) tuples:
+
+  ('start', path, attrs)   a tag starts; attrs is its attribute dict
+  ('end', path, None)      a tag ends
+  ('text', path, string)   a string in the tag at path
+
+Comments, CDATA sections, doctypes, declarations and processing
+instructions come as 'comment', 'cdata', 'doctype', 'declaration' and
+'pi' events, shaped like 'text' events. path is the tuple of the names of
+the open tags, outermost first, including the tag itself for 'start' and
+'end'. Tags end and strings are split where they would be in the tree a
+BeautifulSoup builds with the same builder, so the events are a walk of
+that tree.
+
+extract() finds the text of the tags matching CSS selectors as the
+document is parsed, without making events.
+
+No Tag or NavigableString objects are made and only the open tags are
+kept, so memory use doesn't grow with the document. The html5lib builder
+can't parse without building a tree, so with it the tree is built and
+then walked.
+"""
+
+from bs4 import BeautifulSoup, css
+from bs4.element import (
+    CData,
+    Comment,
+    Declaration,
+    Doctype,
+    NavigableString,
+    ProcessingInstruction,
+    Tag,
+    )
+
+__all__ = ['events', 'extract']
+
+# Characters of markup fed to the builder at a time.
+CHUNK_SIZE = 16384
+
+_STRING_EVENTS = {
+    NavigableString: 'text',
+    Comment: 'comment',
+    CData: 'cdata',
+    Doctype: 'doctype',
+    Declaration: 'declaration',
+    ProcessingInstruction: 'pi',
+    }
+
+
+class _EventParser(BeautifulSoup):
+    """A BeautifulSoup that turns what its builder parses into events,
+    rather than into a tree.
+
+    Each tag start, tag end and string is passed to start(), end() or
+    string(), which pile them up as events in the events list until they
+    are taken.
+    """
+
+    def __init__(self, features=None, builder=None, from_encoding=None):
+        BeautifulSoup.__init__(self, None, features, builder,
+                               from_encoding=from_encoding)
+
+    def reset(self):
+        Tag.__init__(self, self, self.builder, self.ROOT_TAG_NAME)
+        self.hidden = 1
+        self.builder.reset()
+        self.events = []
+        self.currentData = []
+        # (name, nsprefix, path) for each open tag.
+        self.tagStack = []
+        # How many open tags preserve whitespace.
+        self._preserving = 0
+
+    def _path(self):
+        if self.tagStack:
+            return self.tagStack[-1][2]
+        return ()
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs):
+        self.endData()
+        if self.builder.cdata_list_attributes:
+            attrs = self.builder._replace_cdata_list_attribute_values(
+                name, attrs)
+        else:
+            attrs = dict(attrs)
+        path = self._path() + (name,)
+        self.tagStack.append((name, nsprefix, path))
+        if name in self.builder.preserve_whitespace_tags:
+            self._preserving += 1
+        self.start(path, attrs)
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+        for i in range(len(self.tagStack) - 1, -1, -1):
+            if (name, nsprefix) == self.tagStack[i][:2]:
+                while len(self.tagStack) > i:
+                    self._pop()
+                break
+
+    def _pop(self):
+        name, nsprefix, path = self.tagStack.pop()
+        if name in self.builder.preserve_whitespace_tags:
+            self._preserving -= 1
+        self.end(path)
+
+    def endData(self, containerClass=NavigableString):
+        if self.currentData:
+            data = u''.join(self.currentData)
+            self.currentData = []
+            if (not self._preserving
+                and data.translate(self.STRIP_ASCII_SPACES) == ''):
+                if '\n' in data:
+                    data = u'\n'
+                else:
+                    data = u' '
+            self.string(_STRING_EVENTS.get(containerClass, 'text'),
+                        self._path(), data)
+
+    def object_was_parsed(self, o):
+        self.string(_STRING_EVENTS.get(o.__class__, 'text'), self._path(),
+                    unicode(o))
+
+    def _close_tags(self):
+        self.endData()
+        while self.tagStack:
+            self._pop()
+
+    def start(self, path, attrs):
+        self.events.append(('start', path, attrs))
+
+    def end(self, path):
+        self.events.append(('end', path, None))
+
+    def string(self, event, path, value):
+        self.events.append((event, path, value))
+
+
+def _walk(tag, path):
+    """The events for the contents of a tag in a tree."""
+    for child in tag.contents:
+        if isinstance(child, Tag):
+            child_path = path + (child.name,)
+            yield ('start', child_path, child.attrs)
+            for event in _walk(child, child_path):
+                yield event
+            yield ('end', child_path, None)
+        else:
+            yield (_STRING_EVENTS.get(child.__class__, 'text'), path,
+                   unicode(child))
+
+def _parse(parser, markup, from_encoding):
+    """Run parser over markup, yielding after each chunk is parsed."""
+    if isinstance(markup, basestring):
+        chunks = (markup[i:i + CHUNK_SIZE]
+                  for i in xrange(0, len(markup), CHUNK_SIZE))
+    else:
+        chunks = iter(lambda: markup.read(CHUNK_SIZE), '')
+    if parser.builder.builds_own_tree:
+        soup = BeautifulSoup(''.join(chunks), builder=parser.builder,
+                             from_encoding=from_encoding)
+        for event, path, value in _walk(soup, ()):
+            if event == 'start':
+                parser.start(path, value)
+            elif event == 'end':
+                parser.end(path)
+            else:
+                parser.string(event, path, value)
+            yield
+        return
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield
+        parser.close()
+        yield
+    finally:
+        parser.builder.soup = None
+
+def events(markup, features=None, builder=None, from_encoding=None):
+    """Parse markup, a string or a file-like object, yielding events.
+
+    The markup is read and parsed CHUNK_SIZE characters at a time, as
+    the events are taken, so a caller that stops early doesn't read the
+    rest of a file. features, builder and from_encoding are as for
+    BeautifulSoup.
+    """
+    parser = _EventParser(features, builder, from_encoding)
+    for _ in _parse(parser, markup, from_encoding):
+        found, parser.events = parser.events, []
+        for event in found:
+            yield event
+
+class _Element(object):
+    """An open tag, as CSS selectors see it."""
+    __slots__ = ('name', 'attrs', 'parent')
+
+    # Sibling combinators are not supported.
+    previous_sibling = None
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def has_attr(self, key):
+        return key in self.attrs
+
+class _Extractor(_EventParser):
+    """An _EventParser that matches CSS selectors against the tags it
+    parses and collects the text of the first match of each, instead of
+    making events."""
+
+    def __init__(self, selectors, features=None, builder=None,
+                 from_encoding=None):
+        # (key, selector) pairs by the name of the tag the selector
+        # matches, with None for those matching any name.
+        self.by_name = {}
+        for key, parsed in selectors.items():
+            for s in parsed:
+                self.by_name.setdefault(s.subject.name, []).append((key, s))
+        self.results = dict.fromkeys(selectors)
+        # The keys whose selectors have not matched yet.
+        self.unmatched = set(selectors)
+        # How many selectors have matches that have not ended yet.
+        self.remaining = len(selectors)
+        # key: (element, strings) for each selector whose match is open.
+        self.matched = {}
+        self.elements = []
+        _EventParser.__init__(self, features, builder, from_encoding)
+
+    def start(self, path, attrs):
+        elements = self.elements
+        element = _Element(path[-1], attrs,
+                           elements[-1] if elements else None)
+        elements.append(element)
+        if not self.unmatched:
+            return
+        for candidates in (self.by_name.get(element.name),
+                           self.by_name.get(None)):
+            if candidates is None:
+                continue
+            for key, s in candidates:
+                if key in self.unmatched and s.match(element, None):
+                    self.unmatched.remove(key)
+                    self.matched[key] = (element, [])
+
+    def end(self, path):
+        element = self.elements.pop()
+        if self.matched:
+            for key, (match, strings) in self.matched.items():
+                if match is element:
+                    self.results[key] = u''.join(strings)
+                    del self.matched[key]
+                    self.remaining -= 1
+
+    def string(self, event, path, value):
+        for match, strings in self.matched.itervalues():
+            strings.append(value)
+
+def extract(markup, rules, features=None, builder=None, from_encoding=None):
+    """Find the text of the first tag matching each of a set of CSS
+    selectors, without building a tree.
+
+    rules maps keys to selectors, which can be anything select() takes
+    except for the sibling combinators "+" and "~". Returns a dict
+    mapping each key to the text of the first tag its selector matches,
+    as get_text() would give it, or to None if no tag matches. Parsing
+    stops once every selector has matched. The other arguments are as
+    for events().
+    """
+    selectors = {}
+    for key, selector in rules.items():
+        parsed = css.parsed(selector)
+        if parsed is None:
+            raise ValueError("Invalid selector: %r" % selector)
+        for s in parsed:
+            if '+' in s.combinators or '~' in s.combinators:
+                raise ValueError(
+                    "Sibling combinators aren't supported: %r" % selector)
+        selectors[key] = parsed
+    parser = _Extractor(selectors, features, builder, from_encoding)
+    for _ in _parse(parser, markup, from_encoding):
+        if not parser.remaining:
+            break
+    return parser.results
@@ -28,6 +28,15 @@ class SoupTest(unittest.TestCase):
         builder = kwargs.pop('builder', self.default_builder)
         return BeautifulSoup(markup, builder=builder, **kwargs)
 
+    def soup_in_chunks(self, markup, size, **kwargs):
+        """Build a Beautiful Soup object by feeding it markup in chunks."""
+        builder = kwargs.pop('builder', self.default_builder)
+        soup = BeautifulSoup.incremental(builder=builder, **kwargs)
+        for i in range(0, len(markup), size):
+            soup.feed(markup[i:i + size])
+        soup.close()
+        return soup
+
     def document_for(self, markup):
         """Turn an HTML fragment into a document.
 
@@ -137,6 +146,10 @@ class HTMLTreeBuilderSmokeTest(object):
 
         self.assertSoupEquals("<br>", "<br/>")
 
+    def test_end_tag_closes_its_tag(self):
+        # A tag named like an attribute of Tag doesn't get in the way.
+        self.assertSoupEquals("<div><nsprefix>x</nsprefix></div><p>y</p>")
+
     def test_br_is_always_empty_element_tag(self):
         """A <br> tag is designated as an empty-element tag.
 
@@ -164,6 +177,14 @@ class HTMLTreeBuilderSmokeTest(object):
         self.assertSoupEquals("<pre>   </pre>")
         self.assertSoupEquals("<textarea> woo  </textarea>")
 
+    def test_whitespace_is_preserved_only_inside_pre(self):
+        self.assertSoupEquals(
+            "<pre><b> \n </b><i>\n\n</i></pre><p><b> \n </b></p>",
+            "<pre><b> \n </b><i>\n\n</i></pre><p><b>\n</b></p>")
+
+    def test_end_tag_for_a_tag_that_is_not_open(self):
+        self.assertSoupEquals("<p><b>1</i>2</b></p>", "<p><b>12</b></p>")
+
     def test_nested_inline_elements(self):
         """Inline elements can be nested indefinitely."""
         b_tag = "<b>Inside a B tag</b>"
@@ -426,6 +447,28 @@ class HTMLTreeBuilderSmokeTest(object):
         data.a['foo'] = 'bar'
         self.assertEqual('<a foo="bar">text</a>', data.a.decode())
 
+    def test_document_fed_in_chunks(self):
+        markup = (u'<!DOCTYPE html>\n<html><head><title>T</title></head>'
+                  u'<body><p class="a b" id="p">Caf\xe9 &amp; <b>bold</b>'
+                  u' &eacute;</p><!-- comment --><br/>'
+                  u'<script>if (a < b) { c(); }</script></body></html>')
+        expected = self.soup(markup).decode()
+        for size in (1, 3, 16, len(markup)):
+            self.assertEqual(expected, self.soup_in_chunks(markup, size).decode())
+            self.assertEqual(
+                expected,
+                self.soup_in_chunks(markup.encode("utf8"), size).decode())
+
+    def test_events_walk_the_tree(self):
+        from bs4 import stream
+        markup = (u'<!DOCTYPE html>\n<html><body><p class="a b">Caf\xe9 '
+                  u'&amp; <b>bold</b></p><!-- comment --> \n <pre>  \n '
+                  u'</pre><i>unclosed</body></html>')
+        soup = self.soup(markup)
+        self.assertEqual(
+            list(stream._walk(soup, ())),
+            list(stream.events(markup, builder=self.default_builder)))
+
 class XMLTreeBuilderSmokeTest(object):
 
     def test_docstring_generated(self):
@@ -465,6 +508,25 @@ class XMLTreeBuilderSmokeTest(object):
         self.assertSoupEquals("<p>", "<p/>")
         self.assertSoupEquals("<p>foo</p>")
 
+    def test_document_fed_in_chunks(self):
+        markup = (b'<?xml version="1.0" encoding="utf-8"?>\n<root>'
+                  b'<a:foo xmlns:a="http://example.com/">foo</a:foo>'
+                  b'<bar>\xc3\xa9</bar></root>')
+        expected = self.soup(markup).encode("utf-8")
+        for size in (1, 7, len(markup)):
+            self.assertEqual(
+                expected, self.soup_in_chunks(markup, size).encode("utf-8"))
+
+    def test_events_walk_the_tree(self):
+        from bs4 import stream
+        markup = (b'<?xml version="1.0" encoding="utf-8"?>\n<root>'
+                  b'<a:foo xmlns:a="http://example.com/">foo</a:foo>'
+                  b'<bar> </bar><!--c--></root>')
+        soup = self.soup(markup)
+        self.assertEqual(
+            list(stream._walk(soup, ())),
+            list(stream.events(markup, builder=self.default_builder)))
+
     def test_namespaces_are_preserved(self):
         markup = '<root xmlns:a="http://example.com/" xmlns:b="http://example.net/"><a:foo>This tag is in the a namespace</a:foo><b:foo>This tag is in the b namespace</b:foo></root>'
         soup = self.soup(markup)
@@ -0,0 +1,166 @@
+"""Tests of frozen, array-backed copies of trees."""
+
+import copy
+import pickle
+import re
+
+from bs4.element import (
+    Comment,
+    NavigableString,
+    SoupStrainer,
+    Tag,
+    )
+from bs4.frozen import FrozenSoup
+from bs4.testing import SoupTest
+
+
+class TestFrozenSoup(SoupTest):
+
+    markup = ('<html><head><title>Title</title></head><body>'
+              '<div id="main" class="wide box"><p>one <b>two</b></p>'
+              '<!--note--><p class="x">three</p>'
+              '<ul><li class="x">a</li><li>b</li></ul></div>'
+              '<p id="last" lang="en-us">four</p></body></html>')
+
+    def setUp(self):
+        super(TestFrozenSoup, self).setUp()
+        self.tree = self.soup(self.markup)
+        self.frozen = self.tree.freeze()
+
+    def assertSameResults(self, method, *args, **kwargs):
+        tree = getattr(self.tree, method)(*args, **kwargs)
+        frozen = getattr(self.frozen, method)(*args, **kwargs)
+        self.assertEqual([unicode(x) for x in tree],
+                         [unicode(x) for x in frozen])
+
+    def test_freeze(self):
+        self.assertTrue(isinstance(self.frozen, FrozenSoup))
+        self.assertEqual(self.tree.decode(), self.frozen.decode())
+        self.assertEqual(self.tree.prettify(), self.frozen.prettify())
+
+    def test_find_all(self):
+        self.assertSameResults('find_all', 'p')
+        self.assertSameResults('find_all', ['b', 'li'])
+        self.assertSameResults('find_all', re.compile('^t'))
+        self.assertSameResults('find_all', True)
+        self.assertSameResults('find_all')
+        self.assertSameResults('find_all', 'p', limit=2)
+        self.assertSameResults('find_all', class_='x')
+        self.assertSameResults('find_all', 'li', class_='x')
+        self.assertSameResults('find_all', id='main')
+        self.assertSameResults('find_all', 'p', id='main')
+        self.assertSameResults('find_all', id=True)
+        self.assertSameResults('find_all', attrs={'lang': 'en-us'})
+        self.assertSameResults('find_all', 'nosuchtag')
+        self.assertSameResults('find_all', 'p', text='three')
+        self.assertSameResults('find_all', SoupStrainer('li'))
+        self.assertSameResults('find_all', lambda tag: len(tag.attrs) == 2)
+
+    def test_find_all_strings(self):
+        self.assertSameResults('find_all', text=True)
+        self.assertSameResults('find_all', text=re.compile('o'))
+        self.assertSameResults('find_all', text=['a', 'four'])
+        self.assertEqual(
+            [u'note'],
+            self.frozen.find_all(text=lambda s: isinstance(s, Comment)))
+
+    def test_find_all_beneath_a_tag(self):
+        self.assertEqual(['li', 'li'],
+                         [t.name for t in self.frozen.ul.find_all('li')])
+        self.assertEqual(['p', 'p', 'ul'],
+                         [t.name for t in self.frozen.div.find_all(
+                             True, recursive=False)])
+        self.assertEqual([], self.frozen.ul.find_all('p'))
+        self.assertEqual([], self.frozen.ul.find_all(id='main'))
+
+    def test_find(self):
+        self.assertEqual(u'three', self.frozen.find('p', 'x').string)
+        self.assertEqual(None, self.frozen.find('table'))
+        self.assertEqual(self.frozen.find('li'), self.frozen.li)
+        self.assertEqual(u'Title', self.frozen.title.string)
+
+    def test_select(self):
+        for selector in ['div > p', 'p.x', '#main li', 'ul li + li',
+                         'p ~ ul', '[lang|="en"]', 'b, li', 'title']:
+            self.assertSameResults('select', selector)
+        self.assertEqual(['li', 'li'],
+                         [t.name for t in self.frozen.div.select('ul li')])
+
+    def test_navigation(self):
+        frozen = self.frozen
+        p = frozen.p
+        self.assertTrue(p.parent is frozen.div)
+        self.assertTrue(frozen.div.parent is frozen.body)
+        self.assertTrue(frozen.html.parent is frozen)
+        self.assertEqual(None, frozen.parent)
+        self.assertEqual(u'note', p.next_sibling)
+        self.assertTrue(p.next_sibling.previous_sibling is p)
+        self.assertEqual(None, p.previous_sibling)
+        self.assertEqual(u'one ', p.next_element)
+        self.assertTrue(p.next_element.previous_element is p)
+        self.assertEqual(['div', 'body', 'html', u'[document]'],
+                         [t.name for t in p.parents])
+        self.assertEqual([u'one ', u'two'], list(p.strings))
+        self.assertEqual(4, len(frozen.div.contents))
+        self.assertEqual([u'one ', u'b', u'two'],
+                         [getattr(d, 'name', d) for d in p.descendants])
+
+    def test_views(self):
+        frozen = self.frozen
+        self.assertTrue(frozen.find('p') is frozen.find_all('p')[0])
+        self.assertTrue(isinstance(frozen.p, Tag))
+        string = frozen.find(text='note')
+        self.assertTrue(isinstance(string, Comment))
+        self.assertTrue(isinstance(frozen.b.string, NavigableString))
+        self.assertEqual(u'<!--note-->', string.output_ready())
+        self.assertEqual({'id': 'main', 'class': ['wide', 'box']},
+                         frozen.div.attrs)
+        self.assertEqual('en-us', frozen.find(id='last')['lang'])
+
+    def test_get_text(self):
+        self.assertEqual(self.tree.get_text(), self.frozen.get_text())
+        self.assertEqual(self.tree.div.get_text('|', strip=True),
+                         self.frozen.div.get_text('|', strip=True))
+        self.assertEqual(u'one two', self.frozen.p.text)
+
+    def test_get_element_by_id(self):
+        self.assertEqual(u'four',
+                         self.frozen.get_element_by_id('last').string)
+        self.assertEqual(None, self.frozen.get_element_by_id('missing'))
+
+    def test_read_only(self):
+        p = self.frozen.p
+        self.assertRaises(ValueError, p.extract)
+        self.assertRaises(ValueError, p.append, 'x')
+        self.assertRaises(ValueError, p.decompose)
+        self.assertRaises(ValueError, p.__setitem__, 'id', 'x')
+        self.assertRaises(ValueError, p.b.string.replace_with, 'x')
+        self.assertRaises(ValueError, setattr, p, 'string', 'x')
+
+    def test_copy_is_independent_of_the_tree(self):
+        self.tree.div['class'].append('changed')
+        self.tree.find('p', 'x').extract()
+        self.assertEqual(['wide', 'box'], self.frozen.div['class'])
+        self.assertEqual(3, len(self.frozen.find_all('p')))
+
+    def test_pickle(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(self.frozen, protocol))
+            self.assertEqual(self.frozen.decode(), loaded.decode())
+            self.assertTrue(loaded.p.parent is loaded.div)
+            self.assertEqual(self.frozen.select('#main li')[0].string,
+                             loaded.select('#main li')[0].string)
+        tags = pickle.loads(pickle.dumps(self.frozen.find_all('li'), 2))
+        self.assertTrue(tags[0].parent is tags[1].parent)
+
+    def test_deepcopy(self):
+        copied = copy.deepcopy(self.frozen)
+        self.assertEqual(self.frozen.decode(), copied.decode())
+
+    def test_large_document(self):
+        # Freezing and pickling don't recurse through the tree.
+        markup = '<div>' * 2000 + '<p>x</p>' * 2000
+        frozen = self.soup(markup).freeze()
+        loaded = pickle.loads(pickle.dumps(frozen, 2))
+        self.assertEqual(2000, len(loaded.find_all('p')))
+        self.assertEqual(2000, len(list(loaded.p.parents)) - 1)
@@ -5,6 +5,7 @@ import unittest
 from bs4 import (
     BeautifulSoup,
     BeautifulStoneSoup,
+    StopParsing,
 )
 from bs4.element import (
     CharsetMetaAttributeValue,
@@ -67,6 +68,81 @@ class TestSelectiveParsing(SoupTest):
         self.assertEqual(soup.encode(), b"<b>Yes</b><b>Yes <c>Yes</c></b>")
 
 
+class TestIncrementalParsing(SoupTest):
+
+    def test_tree_grows_as_chunks_are_fed(self):
+        soup = BeautifulSoup.incremental(builder=self.default_builder)
+        soup.feed(u'<div id="a"><p>one</p><p>tw')
+        self.assertEqual(2, len(soup.find_all('p')))
+        self.assertFalse(soup.is_complete(soup.div))
+        self.assertTrue(soup.is_complete(soup.p))
+        self.assertFalse(soup.is_complete(soup.find_all('p')[1]))
+        soup.feed(u'o</p></div><div>')
+        self.assertTrue(soup.is_complete(soup.div))
+        self.assertFalse(soup.is_complete(soup))
+        soup.close()
+        self.assertTrue(soup.is_complete(soup))
+        self.assertEqual(
+            u'<div id="a"><p>one</p><p>two</p></div><div></div>',
+            soup.decode())
+
+    def test_bytes_wait_for_encoding_to_be_guessed(self):
+        soup = BeautifulSoup.incremental(builder=self.default_builder)
+        soup.feed(b'<p>caf\xc3')
+        self.assertEqual(None, soup.p)
+        soup.feed(b'\xa9</p>')
+        soup.close()
+        self.assertEqual(u'caf\xe9', soup.p.string)
+        self.assertEqual('utf-8', soup.original_encoding)
+
+    def test_declared_encoding(self):
+        markup = (b'<html><head><meta charset="iso-8859-1"></head>'
+                  b'<body>caf\xe9</body></html>')
+        soup = self.soup_in_chunks(markup, 5)
+        self.assertEqual(u'caf\xe9', soup.body.string)
+        self.assertEqual('iso-8859-1', soup.original_encoding)
+        self.assertEqual('iso-8859-1', soup.declared_html_encoding)
+
+    def test_user_specified_encoding(self):
+        markup = u'<p>☃</p>'.encode('utf-16')
+        soup = self.soup_in_chunks(markup, 3, from_encoding='utf-16')
+        self.assertEqual(u'☃', soup.p.string)
+
+    def test_windows_1252_after_ascii(self):
+        # The first bytes are ASCII, so the document is decoded as UTF-8
+        # until that fails.
+        markup = (b'<p>' + b'x' * BeautifulSoup.ENCODING_SNIFF_SIZE
+                  + b'</p><p>\x93caf\xe9\x94</p>')
+        soup = self.soup_in_chunks(markup, 100)
+        self.assertEqual(u'“caf\xe9”', soup.find_all('p')[1].string)
+        self.assertEqual('windows-1252', soup.original_encoding)
+
+    def test_stop_parsing(self):
+        def stop_at_stop(name, attrs):
+            if name == 'stop':
+                raise StopParsing()
+            return True
+        soup = BeautifulSoup.incremental(
+            builder=self.default_builder,
+            parse_only=SoupStrainer(stop_at_stop))
+        self.assertTrue(soup.feed(u'<a>1</a>'))
+        self.assertFalse(soup.feed(u'<stop></stop><b>2</b>'))
+        self.assertFalse(soup.feed(u'<c>3</c>'))
+        soup.close()
+        self.assertEqual(u'<a>1</a>', soup.decode())
+
+    def test_empty_document(self):
+        soup = BeautifulSoup.incremental(builder=self.default_builder)
+        soup.close()
+        self.assertEqual(u'', soup.decode())
+
+    def test_feed_after_close(self):
+        soup = self.soup_in_chunks(u'<a>', 1)
+        self.assertRaises(ValueError, soup.feed, u'<b>')
+        self.assertRaises(ValueError, soup.close)
+        self.assertRaises(ValueError, self.soup(u'<a>').feed, u'<b>')
+
+
 class TestEntitySubstitution(unittest.TestCase):
     """Standalone tests of the EntitySubstitution class."""
     def setUp(self):
@@ -0,0 +1,87 @@
+"""Tests of parsing without building a tree."""
+
+import StringIO
+
+from bs4 import stream
+from bs4.testing import SoupTest
+
+
+class TestEvents(SoupTest):
+
+    def events(self, markup):
+        return list(stream.events(markup, builder=self.default_builder))
+
+    def test_events(self):
+        self.assertEqual(
+            [('start', ('p',), {'class': ['a', 'b']}),
+             ('text', ('p',), u'one '),
+             ('start', ('p', 'b'), {}),
+             ('text', ('p', 'b'), u'two'),
+             ('end', ('p', 'b'), None),
+             ('end', ('p',), None),
+             ('comment', (), u' three ')],
+            self.events('<p class="a b">one <b>two</b></p><!-- three -->'))
+
+    def test_unclosed_tags_end_with_the_document(self):
+        self.assertEqual(
+            [('start', ('a',), {}), ('start', ('a', 'b'), {}),
+             ('end', ('a', 'b'), None), ('end', ('a',), None)],
+            self.events('<a><b>'))
+
+    def test_end_tag_ends_the_tags_inside_it(self):
+        self.assertEqual(
+            [('start', ('a',), {}), ('start', ('a', 'b'), {}),
+             ('end', ('a', 'b'), None), ('end', ('a',), None),
+             ('text', (), u'c')],
+            self.events('<a><b></a>c</b>'))
+
+    def test_whitespace(self):
+        events = self.events('<p>  \n </p><pre>  \n </pre>')
+        self.assertEqual(('text', ('p',), u'\n'), events[1])
+        self.assertEqual(('text', ('pre',), u'  \n '), events[4])
+
+    def test_file_is_read_as_events_are_taken(self):
+        markup = '<p>x</p>' * stream.CHUNK_SIZE
+        f = StringIO.StringIO(markup)
+        events = stream.events(f, builder=self.default_builder)
+        next(events)
+        self.assertTrue(f.tell() < len(markup))
+        self.assertEqual(3 * stream.CHUNK_SIZE - 1, sum(1 for e in events))
+
+
+class TestExtract(SoupTest):
+
+    markup = """<div id="card"><div class="label">Name</div>
+                <div class="value">Llanowar <b>Elves</b></div></div>
+                <div id="cost"><div class="value">{G}</div></div>"""
+
+    def extract(self, rules, markup=None):
+        return stream.extract(markup or self.markup, rules,
+                              builder=self.default_builder)
+
+    def test_extract(self):
+        self.assertEqual(
+            {'name': u'Llanowar Elves', 'cost': u'{G}',
+             'first': u'Name', 'missing': None},
+            self.extract({'name': '#card .value', 'cost': 'div#cost > div',
+                          'first': 'div div', 'missing': 'span'}))
+
+    def test_extract_matches_get_text(self):
+        soup = self.soup(self.markup)
+        self.assertEqual(soup.select('#card')[0].get_text(),
+                         self.extract({'card': '#card'})['card'])
+
+    def test_selector_list(self):
+        self.assertEqual({'value': u'{G}'},
+                         self.extract({'value': '#cost .value, span'}))
+
+    def test_parsing_stops_once_every_selector_matched(self):
+        markup = '<p>x</p>' + '<div></div>' * stream.CHUNK_SIZE
+        f = StringIO.StringIO(markup)
+        self.assertEqual({'p': u'x'}, self.extract({'p': 'p'}, f))
+        self.assertTrue(f.tell() < len(markup))
+
+    def test_bad_selectors(self):
+        self.assertRaises(ValueError, self.extract, {'x': 'p >'})
+        self.assertRaises(ValueError, self.extract, {'x': 'p + p'})
+        self.assertRaises(ValueError, self.extract, {'x': 'p, b ~ i'})
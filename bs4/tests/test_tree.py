@@ -10,6 +10,7 @@ methods tested here.
 """
 
 import copy
+import gc
 import pickle
 import re
 import warnings
@@ -365,6 +366,301 @@ class TestFindAllByAttribute(TreeTest):
         self.assertEqual([], soup.find_all(id=1, text="bar"))
 
 
+class TestSoupStrainer(TreeTest):
+    """The compiled matchers of a SoupStrainer agree with _matches()."""
+
+    def test_matchers_agree_with_matches(self):
+        soup = self.soup('<a class="foo bar" id="1">x</a>')
+        tag = soup.a
+        criteria = [True, False, None, u"", u"a", u"foo", u"foo bar",
+                    re.compile("o+"), [u"a", u"1"], [u"b"], [],
+                    lambda value: value == u"foo"]
+        values = [None, u"", u"a", u"foo", u"1", b"foo", 1, tag,
+                  [u"foo", u"bar"], (u"foo",), [], soup.a.string]
+        strainer = SoupStrainer()
+        for criterion in criteria:
+            matcher = strainer._matcher(criterion)
+            for value in values:
+                self.assertEqual(
+                    bool(strainer._matches(value, criterion)),
+                    bool(matcher(value)), (criterion, value))
+
+    def test_search_tag_during_parsing(self):
+        # While parsing, search_tag gets a name and (key, value) pairs.
+        strainer = SoupStrainer("a", id=re.compile("^f"))
+        self.assertEqual("a", strainer.search_tag("a", [("id", "first")]))
+        self.assertEqual("a", strainer.search_tag("a", {"id": "first"}))
+        self.assertEqual(None, strainer.search_tag("a", [("id", "last")]))
+        self.assertEqual(None, strainer.search_tag("b", [("id", "first")]))
+
+    def test_callable_name_gets_tag_data_during_parsing(self):
+        strainer = SoupStrainer(lambda name, attrs: name == "b")
+        self.assertEqual("b", strainer.search_tag("b", []))
+        self.assertEqual(None, strainer.search_tag("a", []))
+
+    def test_changing_criteria_recompiles(self):
+        tree = self.soup('<a id="1">1</a><b id="2">2</b>')
+        strainer = SoupStrainer("a")
+        self.assertSelects(tree.find_all(strainer), ["1"])
+        strainer.name = u"b"
+        self.assertSelects(tree.find_all(strainer), ["2"])
+        strainer.name = None
+        strainer.attrs = {"id": u"1"}
+        self.assertSelects(tree.find_all(strainer), ["1"])
+
+    def test_pickle_compiled_strainer(self):
+        strainer = SoupStrainer("a", id=re.compile("1"))
+        tree = self.soup('<a id="1">1</a><a id="2">2</a>')
+        tree.find_all(strainer)
+        loaded = pickle.loads(pickle.dumps(strainer, 2))
+        self.assertSelects(tree.find_all(loaded), ["1"])
+
+
+class TestIdIndex(TreeTest):
+    """Test the document's index of id attributes."""
+
+    def setUp(self):
+        super(TestIdIndex, self).setUp()
+        self.tree = self.soup("""<div id="outer">
+                                 <p id="first">First.</p>
+                                 <div id="inner"><b id="deep">Deep.</b></div>
+                                 </div>
+                                 <p id="last">Last.</p>""")
+
+    def test_get_element_by_id(self):
+        self.assertEqual(self.tree.get_element_by_id("deep").string, "Deep.")
+        self.assertEqual(self.tree.get_element_by_id(u"last").name, "p")
+        self.assertEqual(self.tree.get_element_by_id("missing"), None)
+
+    def test_index_built_while_parsing(self):
+        self.assertEqual(
+            set(self.tree._id_index),
+            set(["outer", "first", "inner", "deep", "last"]))
+
+    def test_find_by_id(self):
+        self.assertSelects(self.tree.find_all(id="first"), ["First."])
+        self.assertEqual(self.tree.find("b", id="deep").string, "Deep.")
+        self.assertEqual(self.tree.find("p", id="deep"), None)
+        self.assertEqual(self.tree.find(attrs={"id": "last"}).name, "p")
+
+    def test_find_by_id_only_searches_beneath_tag(self):
+        inner = self.tree.get_element_by_id("inner")
+        self.assertEqual(inner.find(id="deep").string, "Deep.")
+        self.assertEqual(inner.find(id="first"), None)
+        self.assertEqual(inner.find(id="inner"), None)
+
+    def test_duplicate_ids_find_first_in_document(self):
+        soup = self.soup('<p id="x">1</p><p id="x">2</p>')
+        self.assertEqual(soup.get_element_by_id("x").string, "1")
+        self.assertSelects(soup.find_all(id="x"), ["1", "2"])
+        soup.p.insert_before(soup.find_all("p")[1])
+        self.assertEqual(soup.get_element_by_id("x").string, "2")
+        self.assertEqual(soup.find(id="x").string, "2")
+
+    def test_extract_removes_ids(self):
+        inner = self.tree.get_element_by_id("inner").extract()
+        self.assertEqual(self.tree.get_element_by_id("inner"), None)
+        self.assertEqual(self.tree.get_element_by_id("deep"), None)
+        self.assertEqual(self.tree.find(id="deep"), None)
+        self.assertEqual(inner.find(id="deep").string, "Deep.")
+
+    def test_decompose_removes_ids(self):
+        self.tree.get_element_by_id("outer").decompose()
+        self.assertEqual(set(self.tree._id_index), set(["last"]))
+
+    def test_insert_adds_ids(self):
+        soup = self.soup('<div id="a"><p>text</p></div>')
+        new = self.soup('<b id="new"><i id="newer">x</i></b>').b
+        soup.p.append(new)
+        self.assertEqual(soup.get_element_by_id("newer").string, "x")
+        self.assertEqual(soup.find("b", id="new"), new)
+        self.assertEqual(new.find(id="newer").string, "x")
+
+    def test_moving_tag_between_documents(self):
+        soup = self.soup('<div id="a"></div>')
+        soup.div.append(self.tree.get_element_by_id("inner"))
+        self.assertEqual(self.tree.get_element_by_id("deep"), None)
+        self.assertEqual(soup.get_element_by_id("deep").string, "Deep.")
+
+    def test_new_tag_with_id(self):
+        tag = self.tree.new_tag("a", id="link")
+        self.assertEqual(self.tree.get_element_by_id("link"), None)
+        self.tree.get_element_by_id("last").append(tag)
+        self.assertEqual(self.tree.get_element_by_id("link"), tag)
+
+    def test_changing_id(self):
+        tag = self.tree.get_element_by_id("first")
+        tag['id'] = "renamed"
+        self.assertEqual(self.tree.get_element_by_id("first"), None)
+        self.assertEqual(self.tree.get_element_by_id("renamed"), tag)
+        self.assertEqual(self.tree.find(id="renamed"), tag)
+        del tag['id']
+        self.assertEqual(self.tree.get_element_by_id("renamed"), None)
+
+    def test_changing_id_through_attrs(self):
+        tag = self.tree.get_element_by_id("first")
+        tag.attrs['id'] = "renamed"
+        self.assertEqual(self.tree.get_element_by_id("first"), None)
+        self.assertEqual(self.tree.find(id="first"), None)
+        self.assertEqual(self.tree.find_all(id="renamed"), [tag])
+        self.assertEqual(self.tree.get_element_by_id("renamed"), tag)
+        self.tree.p.attrs['id'] = "added"
+        self.assertEqual(self.tree.find(id="added"), self.tree.p)
+
+    def test_id_given_through_attrs_to_earlier_tag(self):
+        soup = self.soup('<p>1</p><p id="a">2</p>')
+        self.assertEqual(soup.get_element_by_id("a").string, "2")
+        soup.find_all("p")[0].attrs['id'] = "a"
+        self.assertEqual(soup.find(id="a").string, "1")
+        self.assertEqual(soup.get_element_by_id("a").string, "1")
+        soup.p.attrs.pop('id')
+        self.assertEqual(soup.get_element_by_id("a").string, "2")
+
+    def test_replacing_attrs(self):
+        tag = self.tree.get_element_by_id("first")
+        attrs = {'id': "replaced"}
+        tag.attrs = attrs
+        self.assertEqual(self.tree.get_element_by_id("first"), None)
+        self.assertEqual(self.tree.get_element_by_id("replaced"), tag)
+        # Changes to a plain dict can't be followed, so the document is
+        # searched.
+        attrs['id'] = "changed"
+        self.assertEqual(self.tree.get_element_by_id("changed"), tag)
+        self.assertEqual(self.tree.find(id="replaced"), None)
+
+    def test_cached_document(self):
+        inner = self.tree.get_element_by_id("inner")
+        deep = self.tree.get_element_by_id("deep")
+        self.assertTrue(deep._document() is self.tree)
+        inner.extract()
+        self.assertTrue(deep._document() is inner)
+        soup = self.soup('<div id="a"></div>')
+        soup.div.append(inner)
+        self.assertTrue(deep._document() is soup)
+        self.assertTrue(deep.string._document() is soup)
+        self.assertEqual(soup.find(id="deep"), deep)
+
+    def test_select_by_id(self):
+        self.assertSelects(self.tree.select("#deep"), ["Deep."])
+        self.assertSelects(self.tree.select("div#inner b"), ["Deep."])
+        self.assertEqual(self.tree.select("p#inner"), [])
+
+
+class TestTagIndex(TreeTest):
+    """Test the optional index of tags by name and class."""
+
+    def setUp(self):
+        super(TestTagIndex, self).setUp()
+        self.tree = self.soup("""<div class="outer">
+                                 <p class="a b">1</p>
+                                 <div class="inner"><p class="b">2</p></div>
+                                 </div>
+                                 <p class="a">3</p><b class="b">4</b>""",
+                              index_tags=True)
+
+    def test_index_is_optional(self):
+        self.assertEqual(self.soup("<p>1</p>")._tag_index, None)
+        self.assertNotEqual(self.tree._tag_index, None)
+
+    def test_find_all_by_name(self):
+        self.assertSelects(self.tree.find_all('p'), ['1', '2', '3'])
+        self.assertSelects(self.tree.find_all('p', limit=2), ['1', '2'])
+        self.assertEqual(self.tree.find_all('table'), [])
+
+    def test_find_all_by_class(self):
+        self.assertSelects(self.tree.find_all(class_='b'), ['1', '2', '4'])
+        self.assertSelects(self.tree.find_all('p', 'b'), ['1', '2'])
+        self.assertSelects(self.tree.find_all(attrs={'class': 'a'}),
+                           ['1', '3'])
+        self.assertSelects(self.tree.find_all('p', 'a b'), ['1'])
+
+    def test_find_all_beneath_tag(self):
+        outer = self.tree.div
+        self.assertSelects(outer.find_all('p'), ['1', '2'])
+        self.assertSelects(outer.div.find_all('p'), ['2'])
+        self.assertSelects(outer.div.find_all(class_='b'), ['2'])
+        self.assertEqual(outer.div.p.find_all('p'), [])
+
+    def test_select(self):
+        self.assertSelects(self.tree.select('p.b'), ['1', '2'])
+        self.assertSelects(self.tree.select('.a.b'), ['1'])
+        self.assertSelects(self.tree.select('div.inner p'), ['2'])
+
+    def test_index_rebuilt_after_modification(self):
+        new = self.tree.new_tag('p')
+        new.string = '0'
+        self.tree.div.insert(0, new)
+        self.assertFalse(self.tree._tag_index.valid)
+        self.assertSelects(self.tree.find_all('p'), ['0', '1', '2', '3'])
+        self.assertTrue(self.tree._tag_index.valid)
+
+        self.tree.div.div.extract()
+        self.assertSelects(self.tree.find_all('p'), ['0', '1', '3'])
+
+    def test_index_rebuilt_after_class_change(self):
+        self.tree.b['class'] = ['a']
+        self.assertSelects(self.tree.find_all(class_='a'), ['1', '3', '4'])
+        del self.tree.b['class']
+        self.assertSelects(self.tree.find_all(class_='a'), ['1', '3'])
+
+    def test_index_rebuilt_after_rename(self):
+        self.assertSelects(self.tree.find_all('b'), ['4'])
+        self.tree.b.name = 'u'
+        self.assertSelects(self.tree.find_all('u'), ['4'])
+        self.assertEqual(self.tree.find_all('b'), [])
+        self.assertSelects(self.tree.find_all('u', 'b'), ['4'])
+
+    def test_index_rebuilt_after_attrs_change(self):
+        self.assertEqual(self.tree.find_all(class_='z'), [])
+        self.tree.b.attrs['class'] = ['z']
+        self.assertSelects(self.tree.find_all(class_='z'), ['4'])
+        self.assertSelects(self.tree.find_all(class_='b'), ['1', '2'])
+        del self.tree.b.attrs['class']
+        self.assertEqual(self.tree.find_all(class_='z'), [])
+
+    def test_index_rebuilt_after_class_list_edit(self):
+        self.assertEqual(self.tree.find_all(class_='z'), [])
+        self.tree.b['class'].append('z')
+        self.assertSelects(self.tree.find_all(class_='z'), ['4'])
+        self.tree.p['class'].remove('b')
+        self.assertSelects(self.tree.find_all(class_='b'), ['2', '4'])
+        self.tree.p['class'][0] = 'z'
+        self.assertSelects(self.tree.find_all(class_='z'), ['1', '4'])
+        self.assertSelects(self.tree.select('p.z'), ['1'])
+
+    def test_changes_the_index_cant_follow(self):
+        # A plain list or dict set as a tag's attributes can be changed
+        # without the index knowing, so the document is searched.
+        classes = ['x']
+        self.tree.b['class'] = classes
+        classes.append('z')
+        self.assertSelects(self.tree.find_all(class_='z'), ['4'])
+        attrs = {}
+        self.tree.p.attrs = attrs
+        attrs['class'] = 'z'
+        self.assertSelects(self.tree.find_all(class_='z'), ['1', '4'])
+        self.assertSelects(self.tree.find_all(class_='b'), ['2'])
+
+
+class TagIndexTest(object):
+    """Run a test case's tests on documents that index their tags."""
+
+    def soup(self, markup, **kwargs):
+        kwargs.setdefault('index_tags', True)
+        return super(TagIndexTest, self).soup(markup, **kwargs)
+
+
+class TestFindAllWithTagIndex(TagIndexTest, TestFindAll):
+    pass
+
+
+class TestFindAllByNameWithTagIndex(TagIndexTest, TestFindAllByName):
+    pass
+
+
+class TestFindAllByAttributeWithTagIndex(
+    TagIndexTest, TestFindAllByAttribute):
+    pass
 
 
 class TestIndex(TreeTest):
@@ -1238,6 +1534,35 @@ class TestPersistence(SoupTest):
         loaded = pickle.loads(dumped)
         self.assertEqual(loaded.decode(), soup.decode())
 
+    def test_pickle_with_every_protocol(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(self.tree, protocol))
+            self.assertEqual(loaded.decode(), self.tree.decode())
+            self.assertEqual(loaded.b.parent, loaded.find_all('a')[1])
+            self.assertEqual(Doctype, loaded.contents[0].__class__)
+
+    def test_other_attributes_can_be_set(self):
+        # Tags and strings keep their own attributes in slots, but other
+        # attributes can still be set on them.
+        elements = (self.tree.a, self.tree.a.string, self.tree.contents[0])
+        for element in elements:
+            self.assertEqual({}, element.__dict__)
+            element.foo = 1
+            self.assertEqual(1, element.foo)
+        loaded = pickle.loads(pickle.dumps(self.tree, 2))
+        self.assertEqual(1, loaded.a.foo)
+        self.assertEqual(1, loaded.a.string.foo)
+        self.assertEqual(None, self.tree.b.foo)
+        del self.tree.a.foo
+        self.assertEqual(None, self.tree.a.foo)
+
+    def test_pickling_gives_strings_no_dict(self):
+        # A string's only dict would be its __dict__.
+        pickle.dumps(self.tree, 2)
+        for string in self.tree.strings:
+            self.assertEqual([], [o for o in gc.get_referents(string)
+                                  if isinstance(o, dict)])
+
 
 class TestSubstitutions(SoupTest):
 
@@ -1693,3 +2018,92 @@ class TestSoupSelector(TreeTest):
         # The <div id="inner"> tag was selected. The <div id="footer">
         # tag was not.
         self.assertSelectsIDs(selected, ['inner'])
+
+
+    def test_no_duplicates(self):
+        # A <p> inside two <div>s is only selected once.
+        self.assertEqual(self.soup.find_all('p'), self.soup.select('div p'))
+
+    def test_document_order(self):
+        ids = [el['id'] for el in self.soup.select('h2, p#p1, h1')]
+        self.assertEqual(['header1', 'p1', 'header2', 'header3'], ids)
+
+    def test_compound_selectors(self):
+        self.assertSelectMultiple(
+            ('p.onep#p1', ['p1']),
+            ('#p1.onep', ['p1']),
+            ('a#bob[rel~="friend"]', ['bob']),
+            ('p.class1[id^="p"].class3', ['pmulti']),
+            ('div#inner.nothere', []),
+            ('#bob#me', []),
+        )
+
+    def test_attribute_value_quoting(self):
+        self.assertSelectMultiple(
+            ("a[rel='me']", ['me']),
+            ('a[rel=me]', ['me']),
+            ('a[ rel = "me" ]', ['me']),
+        )
+
+    def test_adjacent_sibling_selector(self):
+        self.assertSelectMultiple(
+            ('h2 + p', ['pmulti']),
+            ('p + h2', ['header2']),
+            ('#header3 + a', ['me']),
+            ('h1 + h2', []),
+            ('h2+p', ['pmulti']),
+        )
+
+    def test_general_sibling_selector(self):
+        self.assertSelectMultiple(
+            ('h2 ~ a', ['bob', 'me']),
+            ('h1 ~ h2', ['header2', 'header3']),
+            ('#header3 ~ p', []),
+            ('h1~h2', ['header2', 'header3']),
+        )
+
+    def test_mixed_combinators(self):
+        self.assertSelectMultiple(
+            ('#inner > h1 ~ a', ['bob', 'me']),
+            ('.s1>a', ['s1a1', 's1a2']),
+            ('div h2 + a ~ span a', ['s1a1', 's1a2', 's2a1']),
+            ('.s1 > .span2 > a', ['s2a1']),
+            ('span a > span', ['s1a2s1']),
+        )
+
+    def test_id_beneath_any_context(self):
+        self.assertSelects('span #s2a1', ['s2a1'])
+        self.assertSelects('div#inner #s1a2s1', ['s1a2s1'])
+
+    def test_selector_beneath_duplicate_id(self):
+        soup = BeautifulSoup('<div id="a"><p>1</p></div>'
+                             '<div id="a"><p>2</p></div><p>3</p>')
+        self.assertEqual(['1', '2'], [p.string for p in soup.select('#a p')])
+
+    def test_selector_list(self):
+        self.assertSelectMultiple(
+            ('h1, #footer', ['header1', 'footer']),
+            ('h1,h1', ['header1']),
+            ('.s1 > a, a[rel]', ['s1a1', 's1a2', 'bob', 'me']),
+        )
+
+    def test_invalid_selectors(self):
+        for selector in ('div >', ', p', 'p..onep', '> p', 'a[rel', 'p%'):
+            self.assertEqual([], self.soup.select(selector), selector)
+
+    def test_select_is_scoped_to_element(self):
+        main = self.soup.find('div', id='main')
+        self.assertSelectsIDs(main.select('div > h1'), ['header1'])
+        inner = self.soup.find('div', id='inner')
+        self.assertSelectsIDs(inner.select('div > h1'), [])
+        self.assertSelectsIDs(inner.select('h1 ~ a'), ['bob', 'me'])
+
+    def test_parsed_selectors_are_cached(self):
+        from bs4 import css
+        self.assertTrue(css.parsed('div > p') is css.parsed('div > p'))
+        self.assertEqual(None, css.parsed('div >'))
+
+class TestSoupSelectorWithTagIndex(TestSoupSelector):
+
+    def setUp(self):
+        self.soup = BeautifulSoup(self.HTML, index_tags=True)
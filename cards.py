@@ -2,11 +2,15 @@ import re
 import string
 import sys
 import textwrap
+import time
 import unicodedata
-import urllib2
+import zlib
 
+import perf
 import utils
-from bs4 import BeautifulSoup
+
+# urllib2 and bs4 are imported where they are used, as they are slow to
+# import and not every session scrapes.
 
 
 class ScrapeError(Exception):
@@ -145,36 +149,144 @@ scrapeid_flvr =\
 scrapeid_pt = 'ctl00_ctl00_ctl00_MainContent_SubContent_SubContent%s_ptRow'
 
 
-class Card:
-    """A MtG card."""
-    def __init__(self, name):
+# Major card types, each assigned one bit of Card.typemask.
+CARD_TYPES = ('Artifact', 'Creature', 'Enchantment', 'Instant', 'Land',
+              'Planeswalker', 'Sorcery', 'Tribal', 'Basic', 'Legendary',
+              'Snow', 'World', 'Plane', 'Scheme', 'Vanguard', 'Phenomenon',
+              'Conspiracy')
+TYPE_BITS = dict((t, 1 << i) for i, t in enumerate(CARD_TYPES))
+
+# Shared, interned type and subtype tuples.
+_interned_typelists = {}
+
+def intern_types(l):
+    """Return a shared tuple of interned strings equal to l."""
+    t = tuple(intern(str(s)) for s in l)
+    return _interned_typelists.setdefault(t, t)
+
+def _intern_str(s):
+    """Intern a short, frequently repeated value such as a cost."""
+    return intern(s) if type(s) is str else s
+
+def typemask(types):
+    """Bitmask of the major types in types."""
+    m = 0
+    for t in types:
+        m |= TYPE_BITS.get(t, 0)
+    return m
+
+def _pack_prose(text, flavor):
+    """Pack card text and flavor text into a single, compressed string.
+
+    The first character flags whether the rest is zlib data ('z') or raw
+    ('r'), as very short texts do not compress.
+    """
+    if not text and not flavor:
+        return None
+    raw = '\x01'.join((text or '', flavor or ''))
+    packed = zlib.compress(raw, 9)
+    if len(packed) < len(raw):
+        return 'z' + packed
+    return 'r' + raw
+
+def _unpack_prose(prose):
+    """Inverse of _pack_prose, returns (text, flavor)."""
+    if prose is None:
+        return (None, None)
+    raw = zlib.decompress(prose[1:]) if prose[0] == 'z' else prose[1:]
+    text, flavor = raw.split('\x01', 1)
+    return (text or None, flavor or None)
+
+
+class Card(object):
+    """A MtG card.
+
+    Cards are compact: types and subtypes are interned tuples, major types
+    are also kept as a bitmask, and the rules and flavor text are stored
+    compressed and only expanded when read.
+    """
+    __slots__ = ('name', 'cost', 'convertedCost', 'types', 'subtypes',
+                 'typemask', '_prose', 'power', 'toughness',
+                 'colorIndicator', 'cardback', 'loaded')
+
+    def __init__(self, name=None):
         self.name = name
         self.cost = []
         self.convertedCost = None
-        self.types = None
-        self.text = None
-        self.flavor = None
+        self.types = ()
+        self.subtypes = ()
+        self.typemask = 0
+        self._prose = None
         self.power = None
         self.toughness = None
         self.colorIndicator = None
         self.cardback = None
         self.loaded = False
 
+    @property
+    def text(self):
+        return _unpack_prose(self._prose)[0]
+
+    @text.setter
+    def text(self, value):
+        self._prose = _pack_prose(value, self.flavor)
+
+    @property
+    def flavor(self):
+        return _unpack_prose(self._prose)[1]
+
+    @flavor.setter
+    def flavor(self, value):
+        self._prose = _pack_prose(self.text, value)
+
+    def setTypes(self, types, subtypes=()):
+        """Set the major types and subtypes."""
+        self.types = intern_types(types)
+        self.subtypes = intern_types(subtypes)
+        self.typemask = typemask(self.types)
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore a pickled card, including pre-slots (dict) pickles."""
+        self.__init__()
+        text = state.pop('text', None)
+        flavor = state.pop('flavor', None)
+        types = state.pop('types', None) or ()
+        subtypes = state.pop('subtypes', None) or ()
+        for k, v in state.iteritems():
+            if k in self.__slots__:
+                setattr(self, k, v)
+        self.setTypes(types, subtypes)
+        if text is not None or flavor is not None:
+            self._prose = _pack_prose(text, flavor)
+        self.cost = _intern_str(self.cost)
+        self.convertedCost = _intern_str(self.convertedCost)
+
     def load(self, soup=None):
         """Attempts to scrape card data from <gatherer.wizards.com>.
         
         Reuses the given BeautifulSoup if not None. This is so double-sided
         cards do not need to request the same gather page data twice.
         """
+        with perf.timed('extract'):
+            self._load(soup)
+
+    def _load(self, soup):
         self.loaded = False
         if not soup:
+            import urllib2
+            from bs4 import BeautifulSoup
             try:
-                response = urllib2.urlopen(url(self.name))
-                html = response.read()
+                with perf.timed('net'):
+                    response = urllib2.urlopen(url(self.name))
+                    html = response.read()
             except urllib2.URLError:
                 raise ScrapeError('Unable to open url.')
                 return
-            soup = BeautifulSoup(html)
+            with perf.timed('parse'):
+                soup = BeautifulSoup(html)
             if not len(soup):
                 if sys.version_info[:2] < (2, 7):
                     raise ScrapeError(
@@ -196,19 +308,18 @@ class Card:
         # Scrape card data.
         name = _scrape(soup, scrapeid_name % style)
         self.name = name
-        self.cost = _scrape_cost(soup, scrapeid_mana % style)
-        self.convertedCost = _scrape(soup, scrapeid_cmc % style)
+        self.cost = _intern_str(_scrape_cost(soup, scrapeid_mana % style))
+        self.convertedCost = _intern_str(_scrape(soup, scrapeid_cmc % style))
         types = _scrape_replaceunicode(soup, scrapeid_type % style).split('?')
-        self.types = types[0].split()
-        if len(types) > 1:
-            self.subtypes = types[1].split()
-        else:
-            self.subtypes = []
-        self.text = _scrape_text(soup, scrapeid_text % style)
-        self.flavor = _scrape(soup, scrapeid_flvr % style)
+        self.setTypes(types[0].split(),
+                      types[1].split() if len(types) > 1 else ())
+        self._prose = _pack_prose(_scrape_text(soup, scrapeid_text % style),
+                                  _scrape(soup, scrapeid_flvr % style))
         self.colorIndicator = _scrape_cind(soup, scrapeid_cind % style)
         if self.isCreature():
-            self.power, self.toughness = _scrape_pt(soup, scrapeid_pt % style)
+            power, toughness = _scrape_pt(soup, scrapeid_pt % style)
+            self.power = _intern_str(power)
+            self.toughness = _intern_str(toughness)
         self.loaded = True
 
     def _checkCardstyle(self, soup):
@@ -226,12 +337,14 @@ class Card:
 
     def isCreature(self):
         """Return True if card is of type Creature."""
-        return 'Creature' in self.types
+        return bool(self.typemask & TYPE_BITS['Creature'])
 
     def hasType(self, t):
         """Return True if card has Type t as a major or subtype."""
         tc = t.capitalize()
-        return tc in self.types or tc in self.subtypes
+        if tc in TYPE_BITS:
+            return bool(self.typemask & TYPE_BITS[tc])
+        return tc in self.subtypes or tc in self.types
 
     def hasTypes(self, tlist):
         """Return True if card has all Types in tlist as a major or subtype."""
@@ -252,13 +365,14 @@ class Card:
         if self.isCreature():
               ret += '\n' + 'P/T:'.ljust(10) + str(self.power) +\
                      ' / ' + str(self.toughness)
-        if self.text:
+        text, flavor = _unpack_prose(self._prose)
+        if text:
             ret += '\n'
-            for l in string.split(str(self.text), '\n'):
+            for l in string.split(str(text), '\n'):
                 ret += '\n' + textwrap.fill(l, 50)
-        if self.flavor:
+        if flavor:
             ret += '\n'
-            for l in string.split(str(self.flavor), '\n'):
+            for l in string.split(str(flavor), '\n'):
                 ret += '\n"' + textwrap.fill(l, 50) + '"'
         return ret
 
@@ -273,9 +387,10 @@ class Card:
 
     def summary(self, n=70):
         """Return a summary in one line and a max of n characters."""
-        if not self.text:
+        text = self.text
+        if not text:
             return None
-        s = self.text.replace('\n', '   ')
+        s = text.replace('\n', '   ')
         return cutoff_text(s, n)
 
     def color(self):
@@ -289,18 +404,44 @@ class Card:
         return ''.join(sorted(list(set(s))))
 
 
+# Bytes of a price page read at a time.
+PRICE_PAGE_CHUNK = 16384
+
+def _read_price_page(page):
+    """Parse a price page as it downloads, reading only until the parts
+    scrape_card_price uses have been parsed."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup.incremental(index_tags=True)
+    while True:
+        with perf.timed('net'):
+            chunk = page.read(PRICE_PAGE_CHUNK)
+        if not chunk:
+            break
+        with perf.timed('parse'):
+            soup.feed(chunk)
+            name = soup.find('a', {'class': 'card-name'})
+            res = soup.find('div', {'class': 'view-card-left'})
+        if (name and res and soup.is_complete(name)
+            and soup.is_complete(res)):
+            break
+    page.close()
+    with perf.timed('parse'):
+        soup.close()
+    return soup
+
 def scrape_card_price(cname, p=None):
     """Return a tuple containing scraped card name and a dict of prices"""
+    import urllib2
     base = 'http://www.mtgvault.com/cards/search/?searchtype=name&q=' 
     req = urllib2.Request(base + cname.replace(' ','+').lower())
     ERROR = (None, None)
     try:
-        page = urllib2.urlopen(req)
-        html = page.read()
+        with perf.timed('net'):
+            page = urllib2.urlopen(req)
+        soup = _read_price_page(page)
     except urllib2.URLError as e:
         raise ScrapeError('URL Error: %s' % e)
         return ERROR
-    soup = BeautifulSoup(html)
     
     try:
         name = soup.find('a', {'class' : 'card-name'}).text.strip()
@@ -320,3 +461,27 @@ def scrape_card_price(cname, p=None):
         return (name, prices[p])
     else:
         return ERROR
+
+# Prices scraped by card_price(), shared by every deck and session in the
+# process: {lowercase name: (time scraped, name, prices)}. Lookups and
+# updates are single dict operations, so threads can share it unlocked.
+PRICE_TTL = 3600
+_price_cache = {}
+
+def card_price(cname, p=None):
+    """Like scrape_card_price, but reuses prices scraped in the last
+    PRICE_TTL seconds."""
+    key = cname.lower()
+    entry = _price_cache.get(key)
+    if entry is None or time.time() - entry[0] > PRICE_TTL:
+        name, prices = scrape_card_price(cname)
+        if not name:
+            return (None, None)
+        entry = (time.time(), name, prices)
+        _price_cache[key] = entry
+    name, prices = entry[1], entry[2]
+    if not p:
+        return (name, prices)
+    elif p in prices:
+        return (name, prices[p])
+    return (None, None)
@@ -1,11 +1,28 @@
+import bisect
+import cPickle as pickle
 import math
+import os
 import random
 import re
-import urllib2
-
-from bs4 import BeautifulSoup
+import threading
 
 import cards
+import perf
+
+
+# Deck file format.
+FORMAT_MAGIC = 'MTGDECK'
+FORMAT_VERSION = 1
+
+# File holding the shared card store.
+CARDSTORE_FILENAME = 'cards.store'
+
+# File holding the deck library, see library.py.
+LIBRARY_FILENAME = 'library.db'
+
+
+class DeckFormatError(Exception):
+    pass
 
 
 def filename(name):
@@ -22,9 +39,11 @@ class Deck:
     
     Includes a deck, sideboard, and card data.
     """
-    def __init__(self, name):
+    def __init__(self, name, cardData=None):
         self.name = name
-        self.cardData = CardData()
+        # Sequence number of the last journaled change this deck includes.
+        self.seq = 0
+        self.cardData = cardData if cardData is not None else CardData()
         self.deck = CardPile(self.cardData)
         self.sideboard = CardPile(self.cardData)
 
@@ -84,11 +103,11 @@ class Deck:
 
     def refreshData(self):
         """Refresh all data from gatherer."""
-        for k in self.cardData.data.iterkeys():
+        for k in set(self.deck.cards) | set(self.sideboard.cards):
             c = cards.Card(k)
             c.load()
             if c.loaded:
-                self.cardData.data[k] = c
+                self.cardData.put(k, c)
             else:
                 print('Unable to load data for ' + k + '.')
 
@@ -200,6 +219,13 @@ class CardPile:
                             str(self.cardData.data[c].cost)), 
                    self.list()))
 
+    def colors(self):
+        """Return the combined colors of all cards, e.g. 'BG'."""
+        s = set()
+        for c in self.cards:
+            s.update(self.cardData.data[c].color() or '')
+        return ''.join(sorted(s))
+
     def listType(self, type):
         """Count the number of cards of the specified type in the deck."""
         return filter(lambda c: re.search(type, 
@@ -209,38 +235,261 @@ class CardPile:
 
 
 class CardData:
-    """Holds a dictionary of card data."""
+    """Holds a dictionary of card data.
+
+    A sorted index of the card names for prefix lookups is built on first
+    use and kept up to date by put(). dirty is set by put() and cleared
+    once save() has written the data.
+
+    Card data may be added from several threads; changes, the index and
+    iteration over the data are serialized by a lock.
+    """
     def __init__(self):
         self.data = dict()
+        self.dirty = False
+        self._keys = None
+        self._names = None
+        self._lock = threading.RLock()
+
+    def put(self, key, card):
+        """Store card data under a lowercase card name."""
+        with self._lock:
+            if self._keys is not None and key not in self.data:
+                i = bisect.bisect_left(self._keys, key)
+                self._keys.insert(i, key)
+                self._names.insert(i, card.name)
+            self.data[key] = card
+            self.dirty = True
 
     def fetch(self, card):
         """Fetch card data for a card by name."""
         card = card.lower()
         if card in self.data:
             return True
+        # Scrape without the lock; a card scraped twice by racing threads
+        # is only stored once.
         data = cards.Card(card)
         data.load()
         if not data.loaded:
             return False
-        self.data[card] = data
+        with self._lock:
+            if card not in self.data:
+                self.put(card, data)
         return True
 
     def cardNames(self):
         """List of all card names, both lowercase and original versions."""
-        l = [c.name for c in self.data.itervalues()]
-        l.extend(self.data.keys())
+        with self._lock:
+            l = [c.name for c in self.data.itervalues()]
+            l.extend(self.data.keys())
         return list(set(l))
 
+    def namesWithPrefix(self, prefix):
+        """Card names starting with prefix, ignoring case, in sorted order."""
+        with self._lock:
+            if self._keys is None or len(self._keys) != len(self.data):
+                self._keys = sorted(self.data)
+                self._names = [self.data[k].name for k in self._keys]
+            prefix = prefix.lower()
+            i = bisect.bisect_left(self._keys, prefix)
+            j = i
+            while j < len(self._keys) and self._keys[j].startswith(prefix):
+                j += 1
+            return self._names[i:j]
+
+    def merge(self, other):
+        """Add cards from another CardData that are not already present."""
+        n = 0
+        with self._lock:
+            for k, v in other.data.iteritems():
+                if k not in self.data:
+                    self.put(k, v)
+                    n += 1
+        return n
+
+    def save(self, path):
+        """Write the card data to a file."""
+        with self._lock:
+            data = pickle.dumps(self.data, pickle.HIGHEST_PROTOCOL)
+            self.dirty = False
+        try:
+            _atomic_write(path, data)
+        except (IOError, OSError):
+            self.dirty = True
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read card data written by save(), or empty data if missing."""
+        cd = cls()
+        try:
+            with open(path, 'rb') as f:
+                cd.data = pickle.load(f)
+        except IOError:
+            pass
+        return cd
+
+
+# Serializes writing deck files, their journals, the manifest and the card
+# store, between sessions, their jobs and server requests.
+write_lock = threading.RLock()
+
+_card_store = None
+_card_store_lock = threading.Lock()
+
+def card_store():
+    """The card store shared by all decks, loaded from disk on first use."""
+    global _card_store
+    if _card_store is None:
+        with _card_store_lock:
+            if _card_store is None:
+                _card_store = CardData.load(CARDSTORE_FILENAME)
+    return _card_store
+
+def save_card_store():
+    """Write the shared card store to disk if cards have been added or
+    refreshed since it was last written."""
+    with write_lock:
+        if _card_store is not None and _card_store.dirty:
+            _card_store.save(CARDSTORE_FILENAME)
+
+
+def _atomic_write(path, data):
+    """Replace the file at path with data, never leaving a partial file."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, path)
+
+def _pile_records(tag, pile):
+    for card in sorted(pile.cards):
+        star = pile.getStar(card)
+        yield '%s\t%d\t%s\t%s\n' % (tag, pile.cards[card],
+                                      star if star != ' ' else '', card)
+
+def dumps(d):
+    """Serialize a deck to the deck file format.
+
+    A header line "MTGDECK <version>", then "key<TAB>value" header fields,
+    then one "deck|side<TAB>count<TAB>star<TAB>card" record per distinct
+    card. Card data is not included; it is resolved from the card store.
+    """
+    lines = ['%s %d\n' % (FORMAT_MAGIC, FORMAT_VERSION),
+             'name\t%s\n' % d.name]
+    if d.seq:
+        lines.append('seq\t%d\n' % d.seq)
+    lines.extend(_pile_records('deck', d.deck))
+    lines.extend(_pile_records('side', d.sideboard))
+    return ''.join(lines)
+
+def parse(data):
+    """Parse deck file data into (header dict, list of pile records).
+
+    Records are (pile, count, star, card) tuples, pile being 'deck' or
+    'side'. Unknown header fields are kept, so that later versions can add
+    fields without breaking older readers.
+    """
+    lines = data.splitlines()
+    if not lines or not lines[0].startswith(FORMAT_MAGIC + ' '):
+        raise DeckFormatError('Not a deck file.')
+    try:
+        version = int(lines[0][len(FORMAT_MAGIC) + 1:])
+    except ValueError:
+        raise DeckFormatError('Bad deck file header.')
+    if version > FORMAT_VERSION:
+        raise DeckFormatError('Deck file version %d is newer than %d.'
+                              % (version, FORMAT_VERSION))
+    header = {'version': version}
+    records = []
+    for line in lines[1:]:
+        fields = line.split('\t')
+        if fields[0] in ('deck', 'side'):
+            try:
+                count = int(fields[1]) if len(fields) == 4 else 0
+            except ValueError:
+                count = 0
+            if count < 1:
+                raise DeckFormatError('Bad card record: %r' % line)
+            records.append((fields[0], count, fields[2], fields[3]))
+        elif len(fields) == 2:
+            header[fields[0]] = fields[1]
+        elif line:
+            raise DeckFormatError('Bad line: %r' % line)
+    if 'name' not in header:
+        raise DeckFormatError('Deck file has no name.')
+    return (header, records)
+
+def loads(data, cardData):
+    """Build a Deck from deck file data, resolving cards in cardData.
+
+    Cards missing from cardData are fetched, as with CardPile.add.
+    """
+    header, records = parse(data)
+    d = Deck(header['name'], cardData)
+    d.seq = int(header.get('seq', 0))
+    for pile, count, star, card in records:
+        p = d.deck if pile == 'deck' else d.sideboard
+        if not p.add(card, count):
+            raise cards.ScrapeError('Unable to find card data for \'%s\'.'
+                                    % card)
+        if star:
+            p.star(card, star)
+    return d
+
+def save(d, path=None):
+    """Save a deck in the deck file format. Returns the data written."""
+    data = dumps(d)
+    _atomic_write(path or filename(d.name), data)
+    return data
+
+def load(path, cardData):
+    """Load a deck saved by save()."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if is_legacy(data):
+        raise DeckFormatError('%s is an old pickled deck file, run '
+                              '\'migrate\' to convert it.' % path)
+    return loads(data, cardData)
+
+def is_legacy(data):
+    """True if data is a pickled Deck from before the deck file format."""
+    return not data.startswith(FORMAT_MAGIC)
+
+def migrate(path, cardData):
+    """Convert a pickled deck file to the deck file format in place.
+
+    Its card data is merged into cardData. Returns the migrated Deck, or
+    None if the file was already in the deck file format.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not is_legacy(data):
+        return None
+    old = pickle.loads(data)
+    cardData.merge(old.cardData)
+    d = Deck(old.name, cardData)
+    for src, dst in ((old.deck, d.deck), (old.sideboard, d.sideboard)):
+        dst.cards = dict(src.cards)
+        dst._star = dict(src._star)
+    save(d, path)
+    return d
+
 
 def scrapeDeckListing(id):
     """Scrapes a deck-listing from mtgdeckbuilder.net given its ID."""
+    import urllib2
+    from bs4 import BeautifulSoup
     try:
-        page = urllib2.urlopen(
-            'http://www.mtgdeckbuilder.net/Decks/PrintableDeck/' + id)
-        html = page.read()
+        with perf.timed('net'):
+            page = urllib2.urlopen(
+                'http://www.mtgdeckbuilder.net/Decks/PrintableDeck/' + id)
+            html = page.read()
     except urllib2.URLError:
         raise cards.ScrapeError('Unable to read deck data url.')
-    soup = BeautifulSoup(html)
+    with perf.timed('parse'):
+        soup = BeautifulSoup(html)
     err = soup.find('div', {'class':'innerContentFrame'})
     if err is not None:
         raise cards.ScrapeError(err.string.strip())
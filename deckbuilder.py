@@ -6,21 +6,27 @@ import re
 import string
 import sys
 import time
-import cPickle as pickle
-import webbrowser
 import os
 
 import cards
 import deck
+import jobs
+import journal
+import manifest
+import perf
+import report
 import utils
 
-try:
-    import readline
-except ImportError:
-    pass
+# Modules most sessions never need are imported on first use.
+cProfile = utils.LazyModule('cProfile')
+library = utils.LazyModule('library')
+pstats = utils.LazyModule('pstats')
+server = utils.LazyModule('server')
+webbrowser = utils.LazyModule('webbrowser')
 
 # Readline
 _READLINE_REGEX = re.compile('(.+(?:AND|OR|\d+)\s+|\w+\s+)(.+)$')
+_completions = []
 
 # Custom exceptions
 class ImproperArgError(Exception):
@@ -32,48 +38,201 @@ class UsageError(Exception):
 class MissingDeckError(Exception):
     pass
 
+class DeckBusyError(Exception):
+    pass
+
+class Session:
+    """A user's active deck and its journal, jobs and output settings.
+
+    Commands act on the session passed to them, so several sessions can
+    run in one process, each writing to its own output stream.
+    """
+    def __init__(self, out=None):
+        self.deck = None
+        self.journal = None
+        self.library = None
+        self.jobs = jobs.Jobs()
+        self.coloron = True
+        self.output = 'text'
+        self.paging = True
+        self.out = out or sys.stdout
+        # While 'profile' runs a command, the profiles of the jobs it starts.
+        self.job_profiles = None
+
+    def set_deck(self, d, path=None):
+        """Make d the active deck, replaying any changes in its journal.
+
+        The previously active deck's journal is first compacted into its
+        deck file.
+        """
+        if self.journal is not None:
+            self.save_deck()
+            self.journal.close()
+        self.deck = d
+        self.journal = journal.Journal(path or deck.filename(d.name), d.seq)
+        n = self.journal.replay(d)
+        if n:
+            print('Recovered %d unsaved change%s.' %
+                  (n, '' if n == 1 else 's'), file=self.out)
+
+    def record(self, op, *args):
+        """Journal a change to the active deck."""
+        with deck.write_lock:
+            self.journal.append(op, *args)
+        if self.journal.needs_compaction():
+            self.save_deck()
+
+    def save_deck(self, path=None):
+        """Compact the active deck's journal into its deck file.
+
+        With path, the deck is saved to that file instead, which then holds
+        the deck from now on.
+        """
+        if not self.journal.pending and path is None:
+            return
+        with deck.write_lock:
+            old_path = self.journal.deckpath
+            data = self.journal.compact(self.deck, path)
+            deck.save_card_store()
+            m = manifest.Manifest()
+            if path is not None and \
+               os.path.abspath(path) != os.path.abspath(old_path):
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+                m.remove(old_path)
+            m.update(self.journal.deckpath, data, self.deck)
+            m.save()
+            if os.path.exists(deck.LIBRARY_FILENAME):
+                lib = self.get_library()
+                if lib.contains(self.journal.deckpath):
+                    lib.add(self.deck, self.journal.deckpath)
+
+    def get_library(self):
+        """The deck library in the current directory, opened on first use."""
+        if self.library is None:
+            self.library = library.DeckLibrary()
+        return self.library
+
+    def close(self):
+        """Save any unsaved changes before exiting."""
+        if self.journal is not None and self.journal.pending:
+            self.save_deck()
+
 # Main routine
 def main():
-    """Prompt and execute commands."""
-    boldprint('\n*** Magic: The Gathering Deck Builder ***')
+    """Prompt and execute commands, or run a script of commands."""
+    session = Session()
     # Arguments
+    args = None
     try:
         import argparse
     except ImportError:
-        print('Missing module argparse, arguments not supported.')
+        print('Missing module argparse, arguments not supported.',
+              file=session.out)
     else:
         parser = argparse.ArgumentParser()
         parser.add_argument('deck', metavar='DECKFILE', type=str, nargs='?',
                             default=None, help='an optional deckfile to load')
+        parser.add_argument('--script', metavar='FILE', default=None,
+                            help='run the commands in FILE, or stdin if FILE '
+                                 'is -, then exit')
+        parser.add_argument('--json', action='store_true',
+                            help='write reports as JSON Lines')
+        parser.add_argument('--serve', metavar='PORT', type=int, default=None,
+                            help='serve the decks in this directory as JSON '
+                                 'over HTTP on PORT')
         args = parser.parse_args()
-        if args.deck is not None:
-            try:
-                with open(args.deck, "rb") as f:
-                    global active_deck
-                    active_deck = pickle.load(f)
-            except IOError:
-                print('Unable to load deckfile: %s' % args.deck)
+        if args.json:
+            session.output = 'json'
+    if args is not None and args.serve is not None:
+        server.serve(args.serve)
+        sys.exit(0)
+    if args is not None and args.script is not None:
+        run_script(session, args.script, args.deck)
+    boldprint(session, '\n*** Magic: The Gathering Deck Builder ***')
+    if args is not None and args.deck is not None:
+        load_deckfile(session, args.deck)
     # Warning for Python below 2.7
     if sys.version_info[:2] < (2, 7):
-        print('Data scraping may fail with Python prior to version 2.7.')
-        print('You are using Python %d.%d.' % sys.version_info[:2])
+        print('Data scraping may fail with Python prior to version 2.7.',
+              file=session.out)
+        print('You are using Python %d.%d.' % sys.version_info[:2],
+              file=session.out)
     # Init readline, if avaliable
-    if 'readline' in sys.modules:
-        readline_init()
+    try:
+        global readline
+        import readline
+    except ImportError:
+        print('\nThe readline module is not avaliable,', file=session.out)
+        print('line editing and tab completion has been disabled.',
+              file=session.out)
     else:
-        print('\nThe readline module is not avaliable,')
-        print('line editing and tab completion has been disabled.')
+        readline_init(session)
     # Main loop.
-    cont = True
     cmd = ''
     prev = ''
-    while cont:
-        cmd = prompt_cmd()
+    while True:
+        cmd = prompt_cmd(session)
         if cmd == '':
             cmd = prev
-        cont = exec_cmd(cmd)
+        exec_cmd(session, cmd)
+        if cmd:
+            readline_addhistory(cmd)
         prev = cmd
 
+def load_deckfile(session, path):
+    """Load a deck file as the active deck. Returns True on success."""
+    try:
+        session.set_deck(deck.load(path, deck.card_store()), path)
+    except IOError:
+        print('Unable to load deckfile: %s' % path, file=session.out)
+    except deck.DeckFormatError as e:
+        print('Unable to load deckfile: %s' % str(e), file=session.out)
+    else:
+        return True
+    return False
+
+def run_script(session, filename, deckfile=None):
+    """Run the commands in a file, or stdin if filename is '-', and exit.
+
+    Commands run without color, paging, prompts or readline, and output is
+    block buffered. Each command's background jobs finish before the next
+    command runs. Blank lines and lines starting with '#' are skipped.
+    Exits with status 1 at the first command that fails.
+    """
+    session.coloron = False
+    session.paging = False
+    sys.stdout = os.fdopen(os.dup(sys.stdout.fileno()), 'w', 1 << 16)
+    session.out = sys.stdout
+    status = 0
+    try:
+        if deckfile is not None and not load_deckfile(session, deckfile):
+            status = 1
+            return
+        if filename == '-':
+            f = sys.stdin
+        else:
+            try:
+                f = open(filename)
+            except IOError as e:
+                sys.stderr.write('%s: %s\n' % (filename, e.strerror))
+                status = 1
+                return
+        for lineno, line in enumerate(f, 1):
+            cmdline = utils.asciify_decode(line).strip()
+            if not cmdline or cmdline.startswith('#'):
+                continue
+            if not (exec_cmd(session, cmdline) and wait_jobs(session)):
+                sys.stdout.flush()
+                sys.stderr.write('%s:%d: command failed: %s\n' %
+                                 (filename, lineno, cmdline))
+                status = 1
+                return
+    finally:
+        session.close()
+        sys.stdout.flush()
+        sys.exit(status)
+
 def _parse_cmdline(cmdline):
     """Parse a command line string. 
 
@@ -86,32 +245,59 @@ def _parse_cmdline(cmdline):
     return (m.group(1), m.group(2))
 
 # Command interpreter.
-def exec_cmd(cmdline):
-    """Interpret a command."""
+def exec_cmd(session, cmdline):
+    """Interpret a command. Returns True if it ran without error."""
+    ok = False
+    reap_jobs(session)
     cmd, arg = _parse_cmdline(cmdline)
     if not cmd:
-        print('Bad command.')
+        print('Bad command.', file=session.out)
     else:
         cmd_callable = get_cmd(cmd)
         if not cmd:
-            print('Type a command. Try \'help\'.')
+            print('Type a command. Try \'help\'.', file=session.out)
+        elif cmd == 'profile':
+            # Not profiled itself, as only one profiler runs at a time.
+            with perf.command(cmd):
+                ok = call_cmd(session, cmd, cmd_callable, arg)
         elif cmd_callable:
-            try:
-                cmd_callable(arg)
-            except ImproperArgError as e:
-                print(str(e))
-            except UsageError as e:
-                print('usage: ' + cmd + ' ' + str(e))
-            except MissingDeckError:
-                print('No active deck. Create a new deck with the \'deck\' '
-                      'command.')
-            except cards.ScrapeError as e:
-                print('Scrape failed: ' + str(e))
-            if 'readline' in sys.modules:
-                readline.add_history(cmdline)
+            with perf.command(cmd), perf.profiled(cmd) as prof:
+                ok = call_cmd(session, cmd, cmd_callable, arg)
+            if prof.path:
+                print('Slow command profiled to %s.' % prof.path,
+                      file=session.out)
         else:
-            print('%s is not a command. Try \'help\'.' % str(cmd))
-    return True
+            print('%s is not a command. Try \'help\'.' % str(cmd),
+                  file=session.out)
+    return ok
+
+def call_cmd(session, cmd, func, arg):
+    """Call a command function. Returns True if it ran without error."""
+    if cmd in _DECK_COMMANDS:
+        return run_cmd(session, cmd, assert_deckidle, session) and \
+               run_cmd(session, cmd, func, session, arg)
+    return run_cmd(session, cmd, func, session, arg)
+
+def run_cmd(session, cmd, func, *args):
+    """Call func, reporting command errors. Returns True if none occurred."""
+    try:
+        func(*args)
+        return True
+    except ImproperArgError as e:
+        print(str(e), file=session.out)
+    except UsageError as e:
+        print('usage: ' + cmd + ' ' + str(e), file=session.out)
+    except MissingDeckError:
+        print('No active deck. Create a new deck with the \'deck\' '
+              'command.', file=session.out)
+    except DeckBusyError as e:
+        print('The active deck is in use by job %s. Try \'wait\' or '
+              '\'cancel\'.' % str(e), file=session.out)
+    except cards.ScrapeError as e:
+        print('Scrape failed: ' + str(e), file=session.out)
+    except deck.DeckFormatError as e:
+        print('Bad deck file: ' + str(e), file=session.out)
+    return False
 
 def get_cmd(cmd_name):
     """Get the command function for cmd_name."""
@@ -120,21 +306,23 @@ def get_cmd(cmd_name):
             return cmds[cmd_name]
     return None
     
-def get_prompt():
+def get_prompt(session):
     """Get the command prompt text."""
-    if active_deck:
-        return active_deck.name + '> '
+    reap_jobs(session)
+    status = ''.join('[%s] ' % job for job in session.jobs.jobs)
+    if session.deck:
+        return status + session.deck.name + '> '
     else:
-        return 'mtg> '
+        return status + 'mtg> '
 
-def prompt_cmd():
+def prompt_cmd(session):
     """Print command prompt for the current state."""
     try:
-        return utils.asciify_decode(raw_input(get_prompt())).strip()
+        return utils.asciify_decode(raw_input(get_prompt(session))).strip()
     except EOFError:
-        cmd_exit('')
+        cmd_exit(session, '')
     except KeyboardInterrupt:
-        cmd_exit('')
+        cmd_exit(session, '')
     return ''
 
 def parse_numarg(arg, default_num=1):
@@ -147,26 +335,86 @@ def parse_numarg(arg, default_num=1):
         return (m.group(2), num)
     raise ImproperArgError('Argument should be of the form [<NUM>] <ARG>.')
 
-def print_deckcardline(count, card, star=' ', reqType=None):
-    """Print a snippet line for a card in the active deck.
-    
-    If reqType is not none, skips printing the line if card does not have the
-    specified Type.
-    """
-    if reqType and not card.hasTypes(reqType.split()):
-        return False
-    print(str(count).rjust(3), end='')
-    print(' %s ' % star, end='')
+def deckcardline(session, count, card, star=' '):
+    """A snippet line for a card in the active deck."""
+    return str(count).rjust(3) + ' %s ' % star + \
+           mstring(session, card.color(), card.snippet())
 
-    mprint(card.color(),
-           card.snippet())
-    return True
+def page(session, lines):
+    """Write lines in one go, a screenful at a time if they overflow it."""
+    height = terminal_height(session)
+    if height is None or len(lines) < height:
+        session.out.write(''.join(l + '\n' for l in lines))
+        return
+    step = height - 1
+    for i in xrange(0, len(lines), step):
+        session.out.write(''.join(l + '\n' for l in lines[i:i + step]))
+        if i + step < len(lines):
+            more = raw_input('-- More (%d/%d), Enter to continue or q to quit '
+                             '-- ' % (i + step, len(lines)))
+            if more.strip().lower() == 'q':
+                break
+
+def terminal_height(session):
+    """Rows on the terminal for paging, or None when not paging."""
+    if not session.paging:
+        return None
+    return utils.terminal_height(session.out)
 
-def assert_activedeck():
+def assert_activedeck(session):
     """Raise a MissingDeckError if there is not an active deck."""
-    if not active_deck:
+    if not session.deck:
         raise MissingDeckError
 
+def assert_deckidle(session):
+    """Raise a DeckBusyError if a job is using the active deck."""
+    job = session.jobs.holding(session.deck) if session.deck else None
+    if job is not None:
+        raise DeckBusyError('%d (%s)' % (job.id, job.name))
+
+def start_job(session, name, work, finish=None, deck=None):
+    """Start a background job; see jobs.Jobs.start()."""
+    profiles = session.job_profiles
+    def timed_work(job):
+        with perf.command(name + ' job'):
+            if profiles is not None:
+                profile = cProfile.Profile()
+                profiles.append(profile)
+                return profile.runcall(work, job)
+            with perf.profiled(name + ' job'):
+                return work(job)
+    job = session.jobs.start(name, timed_work, finish, deck)
+    print('Started job %d (%s).' % (job.id, name), file=session.out)
+    return job
+
+def reap_jobs(session):
+    """Finish the jobs that are done. Returns False if any failed."""
+    ok = True
+    for job in session.jobs.reap():
+        if job.state == jobs.DONE:
+            print('Job %d (%s) done.' % (job.id, job.name), file=session.out)
+            with perf.command(job.name + ' finish'):
+                ok = run_cmd(session, job.name, job.finish) and ok
+        elif job.state == jobs.CANCELLED:
+            print('Job %d (%s) cancelled.' % (job.id, job.name),
+                  file=session.out)
+        else:
+            if isinstance(job.error, cards.ScrapeError):
+                print('Job %d (%s) failed: scrape failed: %s' %
+                      (job.id, job.name, job.error), file=session.out)
+            else:
+                print('Job %d (%s) failed: %s' % (job.id, job.name, job.error),
+                      file=session.out)
+            ok = False
+    return ok
+
+def wait_jobs(session, job=None):
+    """Wait for a job, or all jobs, and finish them. Returns False if any
+    failed."""
+    for j in [job] if job is not None else list(session.jobs.jobs):
+        j.wait()
+    return reap_jobs(session)
+
 _ansicode = {
     'black': '\x1b[30m',
     'red': '\x1b[31m',
@@ -189,41 +437,66 @@ _cardcolors = {
     'W': 'white',
     'U': 'blue'}
 
-def cprint(color, s, bold=True):
+def cprint(session, color, s, bold=True):
     """Print a string in color."""
-    if global_coloron:
+    print(cstring(session, color, s, bold), file=session.out)
+
+def cstring(session, color, s, bold=True):
+    """Return a string formatted with color ansi codes."""
+    if session.coloron:
         assert color in _ansicode
-        print((_ansicode['bold'] if bold else '') +
-              _ansicode[color] + s + _ansicode['reset'])
+        return ((_ansicode['bold'] if bold else '') +
+                _ansicode[color] + s + _ansicode['reset'])
     else:
-        print(s)
+        return s
 
-def mprint(cardcolor, s, bold=True):
+def mprint(session, cardcolor, s, bold=True):
     """Print a string in the specified Magic card color."""
+    print(mstring(session, cardcolor, s, bold), file=session.out)
+
+def mstring(session, cardcolor, s, bold=True):
+    """Return a string formatted in the specified Magic card color."""
     if cardcolor and cardcolor in _cardcolors:
-        cprint(_cardcolors[cardcolor], s, bold=bold)
+        return cstring(session, _cardcolors[cardcolor], s, bold=bold)
     elif cardcolor and len(cardcolor) > 1:
-        cprint('yellow', s, bold=bold)
+        return cstring(session, 'yellow', s, bold=bold)
     else:
-        print(s)
+        return s
 
-def boldprint(s):
+def boldprint(session, s):
     """Print a string in bold."""
-    print(boldstring(s))
+    print(boldstring(session, s), file=session.out)
 
-def boldstring(s):
+def boldstring(session, s):
     """Return a string formatted with bold ansi codes."""
-    if global_coloron:
+    if session.coloron:
         return _ansicode['bold'] + s + _ansicode['reset']
     else:
         return s
 
+def emit(session, records, render_text):
+    """Output report records as JSON Lines or with a text renderer.
+
+    The renderer is called with the session and the records.
+    """
+    with perf.timed('render'):
+        if session.output == 'json':
+            report.write_jsonl(records, session.out)
+        else:
+            render_text(session, records)
+
 # Executeable commands.
-def cmd_exit(arg):
+
+def cmd_exit(session, arg):
     """Exit the program."""
+    if session.jobs.jobs:
+        n = len(session.jobs.jobs)
+        print('Abandoning %d unfinished job%s.' % (n, '' if n == 1 else 's'),
+              file=session.out)
+    session.close()
     sys.exit(0)
 
-def cmd_help(arg):
+def cmd_help(session, arg):
     """Detailed help for a command; with no arguments lists all cmds.
 
     Optional: Command for which to provide detailed help.
@@ -232,122 +505,161 @@ def cmd_help(arg):
     if arg:
         cmd_callable = get_cmd(arg)
         if cmd_callable:
-            print(cmd_callable.__doc__)
+            print(cmd_callable.__doc__, file=session.out)
             return
     # Comprehensive short help listing.
-    cprint('bold', 'Avaliable commands:\n')
+    cprint(session, 'bold', 'Avaliable commands:\n')
     w = max((len(h) for h in
              itertools.chain.from_iterable(cmd_dict.itervalues()))) + 1
     for title, cmds in sorted(cmd_dict.iteritems(), key=lambda t: t[0]):
-        boldprint(title)
+        boldprint(session, title)
         for name, cmd in sorted(cmds.iteritems(), key=lambda t: t[0]):
-            print(' ' + name.ljust(w) + ' - ' + cmd.__doc__.split('\n')[0])
-        print('')
+            print(' ' + name.ljust(w) + ' - ' + cmd.__doc__.split('\n')[0],
+                  file=session.out)
+        print('', file=session.out)
 
-def _print_slowly(s, end='\n'):
+def _print_slowly(session, s, end='\n'):
     for c in s:
-        print(c, end='')
-        sys.stdout.flush()
+        print(c, end='', file=session.out)
+        session.out.flush()
         time.sleep(0.1)
-    print('', end=end)
+    print('', end=end, file=session.out)
 
-def _run_tutorial_cmd(cmdline):
+def _run_tutorial_cmd(session, cmdline):
     """Runs a command string as if the user had typed it."""
     cmd, arg = _parse_cmdline(cmdline)
     cmd_callable = get_cmd(cmd)
     if cmd_callable is None:
         raise Exception('Bad tutorial command: %s' % cmd)
-    print(get_prompt(), end='')
-    sys.stdout.flush()
-    _print_slowly(cmdline)
-    cmd_callable(arg)
+    print(get_prompt(session), end='', file=session.out)
+    session.out.flush()
+    _print_slowly(session, cmdline)
+    cmd_callable(session, arg)
 
 
-def cmd_tutorial(arg):
+def cmd_tutorial(session, arg):
     """Run an introductory tutorial."""
-    _run_tutorial_cmd('deck tutorial')
+    _run_tutorial_cmd(session, 'deck tutorial')
     time.sleep(0.25)
-    _run_tutorial_cmd('card Verdant Force')
+    _run_tutorial_cmd(session, 'card Verdant Force')
     time.sleep(1)
-    _run_tutorial_cmd('add 4 Verdant Force')
-    _run_tutorial_cmd('add 4 Fireball')
-    _run_tutorial_cmd('add 4 Goblin Sharpshooter')
-    _run_tutorial_cmd('add 4 Llanowar Elves')
-    _run_tutorial_cmd('add 4 Birds of Paradise')
-    _run_tutorial_cmd('add 4 Shivan Dragon')
-    _run_tutorial_cmd('add 4 Biomass Mutation')
-    _run_tutorial_cmd('add 4 Huntmaster of the Fells')
-    _run_tutorial_cmd('add 14 Forest')
-    _run_tutorial_cmd('add 14 Island')
-    _run_tutorial_cmd('prob 2 Island OR Forest')
+    _run_tutorial_cmd(session, 'add 4 Verdant Force')
+    _run_tutorial_cmd(session, 'add 4 Fireball')
+    _run_tutorial_cmd(session, 'add 4 Goblin Sharpshooter')
+    _run_tutorial_cmd(session, 'add 4 Llanowar Elves')
+    _run_tutorial_cmd(session, 'add 4 Birds of Paradise')
+    _run_tutorial_cmd(session, 'add 4 Shivan Dragon')
+    _run_tutorial_cmd(session, 'add 4 Biomass Mutation')
+    _run_tutorial_cmd(session, 'add 4 Huntmaster of the Fells')
+    _run_tutorial_cmd(session, 'add 14 Forest')
+    _run_tutorial_cmd(session, 'add 14 Island')
+    _run_tutorial_cmd(session, 'list')
+    _run_tutorial_cmd(session, 'prob 2 Island OR Forest')
     time.sleep(1)
-    _run_tutorial_cmd('prob 5 Llanowar Elves OR Birds of Paradise '
-                      'OR Forest OR Island AND 2 Fireball')
+    _run_tutorial_cmd(session, 'prob 5 Llanowar Elves OR Birds of Paradise '
+                               'OR Forest OR Island AND 2 Fireball')
     time.sleep(1)
-    _run_tutorial_cmd('card Huntmaster of the Fells')
+    _run_tutorial_cmd(session, 'card Huntmaster of the Fells')
     time.sleep(1)
-    _run_tutorial_cmd('summ Creature')
-    print('')
-    print('Try \'help\' to view the full list of avaliable commands.')
+    _run_tutorial_cmd(session, 'summ Creature')
+    print('', file=session.out)
+    print('Try \'help\' to view the full list of avaliable commands.',
+          file=session.out)
 
-def cmd_deck(arg):
+def cmd_deck(session, arg):
     """Create or load an active deck.
 
     Required: Deck name to load, or to create if it does not exist.
     """
-    global active_deck
     if not arg:
         raise UsageError('NAME')
     try:
-        with open(deck.filename(arg), "rb") as f:
-            active_deck = pickle.load(f)
-            print('Loaded deck \'' + active_deck.name + '\'.')
+        session.set_deck(deck.load(deck.filename(arg), deck.card_store()))
+        print('Loaded deck \'' + session.deck.name + '\'.', file=session.out)
     except IOError:
-        active_deck = deck.Deck(arg)
-        print('Created new deck \'' + active_deck.name + '\'.')
+        session.set_deck(deck.Deck(arg, deck.card_store()))
+        print('Created new deck \'' + session.deck.name + '\'.',
+              file=session.out)
 
-def cmd_decklist(arg):
+def cmd_decklist(session, arg):
     """List the saved decks in the current directory."""
-    print('')
-    for fn in os.listdir('.'):
-        if fn.endswith('.deck'):
-            print(pickle.load(open(fn, "rb")).name)
-
-def cmd_save(arg):
-    """Save the active deck."""
-    assert_activedeck()
-    with open(deck.filename(active_deck.name), "wb") as f:
-        pickle.dump(active_deck, f)
-    print('Saved deck \'' + active_deck.name + '\'.')
-
-def cmd_deckname(arg):
+    print('', file=session.out)
+    with deck.write_lock:
+        m = manifest.current()
+    for fn, e in m.decks():
+        if e['name'] is None:
+            print(fn + ' (old format, run \'migrate\')', file=session.out)
+        else:
+            print(e['name'].ljust(40) + str(e['size']).rjust(4) + '  ' +
+                  e['colors'], file=session.out)
+
+def cmd_save(session, arg):
+    """Save the active deck.
+
+    Changes are saved automatically; this also folds the change journal
+    into the deck file.
+    """
+    assert_activedeck(session)
+    session.save_deck(deck.filename(session.deck.name))
+    print('Saved deck \'' + session.deck.name + '\'.', file=session.out)
+
+def cmd_migrate(session, arg):
+    """Convert old pickled deck files in the current directory.
+
+    Their card data is moved into the shared card store.
+    """
+    n = 0
+    with deck.write_lock:
+        for fn in sorted(os.listdir('.')):
+            if fn.endswith('.deck'):
+                d = deck.migrate(fn, deck.card_store())
+                if d is not None:
+                    print('Migrated deck \'' + d.name + '\'.',
+                          file=session.out)
+                    n += 1
+        deck.save_card_store()
+        manifest.current()
+    print('Migrated %d deck file%s.' % (n, '' if n == 1 else 's'),
+          file=session.out)
+
+def cmd_deckname(session, arg):
     """Change the name of the active deck.
 
     Required: The new deck name.
     """
     if not arg or len(arg) == 0:
         raise UsageError('NAME')
-    assert_activedeck()
-    active_deck.name = arg
-    print('Renamed active deck \'' + active_deck.name + '\'.')
-
-def cmd_side(arg):
+    assert_activedeck(session)
+    path = deck.filename(arg)
+    if os.path.exists(path) and \
+       os.path.abspath(path) != os.path.abspath(session.journal.deckpath):
+        raise ImproperArgError('A deck named \'' + arg + '\' already exists.')
+    session.deck.name = arg
+    # Move the saved deck, if any, along with the deck.
+    if session.journal.pending or os.path.exists(session.journal.deckpath):
+        session.save_deck(path)
+    print('Renamed active deck \'' + session.deck.name + '\'.',
+          file=session.out)
+
+def cmd_side(session, arg):
     """Move a card from the active deck to its sideboard.
 
     Required: The card name.
     """
     if not arg:
         raise UsageError('CARD')
-    assert_activedeck()
+    assert_activedeck(session)
     card = arg.lower()
-    if card not in active_deck.deck.cards:
+    if card not in session.deck.deck.cards:
         raise ImproperArgError('Card is not in active deck.')
-    num = active_deck.deck.cards[card]
-    active_deck.deck.remove(card, num)
-    active_deck.sideboard.add(card, num)
-    cmd_listall('')
-
-def cmd_add(arg):
+    num = session.deck.deck.cards[card]
+    session.deck.deck.remove(card, num)
+    session.record('rm', 'deck', num, card)
+    session.deck.sideboard.add(card, num)
+    session.record('add', 'side', num, card)
+    show_changes(session, ('deck', card), ('side', card))
+
+def cmd_add(session, arg):
     """Add a card to the active deck.
 
     Required: The card name.
@@ -355,13 +667,13 @@ def cmd_add(arg):
     card, num = parse_numarg(arg, 1)
     if not card or not num:
         raise UsageError('[NUM] CARD')
-    assert_activedeck()
-    if active_deck.deck.add(card, num):
-        cmd_listall('')
-    else:
-        print('Unable to find card data.')
+    assert_activedeck(session)
+    if not session.deck.deck.add(card, num):
+        raise ImproperArgError('Unable to find card data.')
+    session.record('add', 'deck', num, card.lower())
+    show_changes(session, ('deck', card))
 
-def cmd_addside(arg):
+def cmd_addside(session, arg):
     """Add a card to the active deck's sideboard.
 
     Required: The card name.
@@ -369,13 +681,13 @@ def cmd_addside(arg):
     card, num = parse_numarg(arg, 1)
     if not card or not num:
         raise UsageError('[NUM] CARD')
-    assert_activedeck()
-    if active_deck.sideboard.add(card, num):
-        cmd_listall('')
-    else:
-        print('Unable to find card data.')
+    assert_activedeck(session)
+    if not session.deck.sideboard.add(card, num):
+        raise ImproperArgError('Unable to find card data.')
+    session.record('add', 'side', num, card.lower())
+    show_changes(session, ('side', card))
 
-def cmd_remove(arg):
+def cmd_remove(session, arg):
     """Remove a card from the active deck.
 
     Required: The card name.
@@ -383,15 +695,16 @@ def cmd_remove(arg):
     card, num = parse_numarg(arg, None)
     if not card:
         raise UsageError('[NUM] CARD')
-    assert_activedeck()
-    if card.lower() not in active_deck.deck.cards:
+    assert_activedeck(session)
+    if card.lower() not in session.deck.deck.cards:
         raise ImproperArgError('Card is not in active deck.')
     if num is None:
-      num = active_deck.deck.cards[card.lower()]
-    active_deck.deck.remove(card, num)
-    cmd_listall('')
+      num = session.deck.deck.cards[card.lower()]
+    session.deck.deck.remove(card, num)
+    session.record('rm', 'deck', num, card.lower())
+    show_changes(session, ('deck', card))
 
-def cmd_removeside(arg):
+def cmd_removeside(session, arg):
     """Remove a card from the active deck's sideboard.
 
     Required: The card name.
@@ -399,106 +712,157 @@ def cmd_removeside(arg):
     card, num = parse_numarg(arg, None)
     if not card:
         raise UsageError('[NUM] CARD')
-    assert_activedeck()
-    if card.lower() not in active_deck.sideboard.cards:
+    assert_activedeck(session)
+    if card.lower() not in session.deck.sideboard.cards:
         raise ImproperArgError('Card is not in active deck\'s sideboard.')
     if num is None:
-      num = active_deck.sideboard.cards[card.lower()]
-    active_deck.sideboard.remove(card, num)
-    cmd_listall('')
+      num = session.deck.sideboard.cards[card.lower()]
+    session.deck.sideboard.remove(card, num)
+    session.record('rm', 'side', num, card.lower())
+    show_changes(session, ('side', card))
 
-def cmd_stats(arg):
+def cmd_stats(session, arg):
     """Print active deck and sideboard size."""
-    assert_activedeck()
-    print('deck size: %d' % active_deck.deck.size())
-    print('sideboard size: %d' % active_deck.sideboard.size())
-    print('total size: %d' %
-          (active_deck.deck.size() + active_deck.sideboard.size()))
-
-def cmd_refreshdata(arg):
-    """Refresh all card data from gatherer."""
-    assert_activedeck()
-    active_deck.refreshData()
-    print('Done.')
-
-def cmd_list(arg, summarize=False):
+    assert_activedeck(session)
+    emit(session, report.sizes(session.deck), print_sizes)
+
+def print_sizes(session, records):
+    """Render the sizes report as text."""
+    r = records[0]
+    print('deck size: %d' % r['deck_size'], file=session.out)
+    print('sideboard size: %d' % r['sideboard_size'], file=session.out)
+    print('total size: %d' % r['total_size'], file=session.out)
+
+def cmd_refreshdata(session, arg):
+    """Refresh all card data from gatherer, as a background job."""
+    assert_activedeck(session)
+    d = session.deck
+    names = sorted(set(d.deck.cards) | set(d.sideboard.cards))
+    def work(job):
+        loaded = []
+        for i, k in enumerate(names):
+            job.step(i, len(names))
+            c = cards.Card(k)
+            c.load()
+            loaded.append((k, c))
+        return loaded
+    def finish(loaded):
+        for k, c in loaded:
+            if c.loaded:
+                d.cardData.put(k, c)
+            else:
+                print('Unable to load data for ' + k + '.', file=session.out)
+        deck.save_card_store()
+    start_job(session, 'refreshdata', work, finish, d)
+
+def cmd_list(session, arg, summarize=False):
     """Print active deck's deck listing, optionally filtered by Type.
 
     Optional: A card Type or Sub-Type by which to filter.
     """
-    assert_activedeck()
+    assert_activedeck(session)
+    emit(session, report.listing(session.deck, 'deck', arg),
+         lambda session, records:
+             page(session, listing_lines(session, records, summarize)))
+
+def listing_lines(session, records, summarize=False):
+    """Render a deck listing as lines of text."""
     sep = '-' * 80
-    print(sep)
-    boldprint(active_deck.name.center(80))
-    print(sep)
-    ip = 0
-    for c in active_deck.deck.manaSorted():
-        card = active_deck.cardData.data[c]
-        if print_deckcardline(active_deck.deck.cards[c], card,
-                              active_deck.deck.getStar(c), reqType=arg):
-            if summarize:
-                if card.summary():
-                    print('       ' + card.summary())
-                print('')
-            ip += active_deck.deck.cards[c]
-    print('Total: ' + str(ip))
-
-def cmd_listside(arg, summarize=False):
+    return ([sep, boldstring(session, session.deck.name.center(80)), sep] +
+            cardlines(session, records, summarize) +
+            ['Total: ' + str(sum(r['count'] for r in records))])
+
+def cmd_listside(session, arg, summarize=False):
     """Print active deck's sideboad listing, optionally filtered by Type.
 
     Optional: A card Type or Sub-Type by which to filter.
     """
-    assert_activedeck()
-    sep = '-' * 80
-    print(string.center(' Sideboard ', 80, '-'))
-    ip = 0
-    for c in active_deck.sideboard.manaSorted():
-        card = active_deck.cardData.data[c]
-        if print_deckcardline(active_deck.sideboard.cards[c], card,
-                              active_deck.sideboard.getStar(c), reqType=arg):
-            if summarize:
-                if card.summary():
-                    print('       ' + card.summary())
-                print('')
-            ip += 1
-    if ip == 0:
-        print('-nothing-'.center(80))
-
-def cmd_listall(arg):
+    assert_activedeck(session)
+    emit(session, report.listing(session.deck, 'side', arg),
+         lambda session, records:
+             page(session, sidelisting_lines(session, records, summarize)))
+
+def sidelisting_lines(session, records, summarize=False):
+    """Render a sideboard listing as lines of text."""
+    lines = [string.center(' Sideboard ', 80, '-')]
+    lines.extend(cardlines(session, records, summarize))
+    if not records:
+        lines.append('-nothing-'.center(80))
+    return lines
+
+def cardlines(session, records, summarize=False):
+    """Lines for listing records, with card summaries if asked."""
+    lines = []
+    for r in records:
+        card = session.deck.cardData.data[r['name'].lower()]
+        lines.append(deckcardline(session, r['count'], card, r['star']))
+        if summarize:
+            if card.summary():
+                lines.append('       ' + card.summary())
+            lines.append('')
+    return lines
+
+def cmd_listall(session, arg):
     """Print active deck listing, optionally filtered by Type.
 
     Optional: A card Type or Sub-Type by which to filter.
     """
-    assert_activedeck()
-    cmd_list(arg)
-    cmd_listside(arg)
+    assert_activedeck(session)
+    emit(session, report.listing(session.deck, 'deck', arg) +
+         report.listing(session.deck, 'side', arg), print_listall)
 
-def cmd_summary(arg):
+def print_listall(session, records):
+    """Render the deck and sideboard listings as text, paged together."""
+    deckrecords = [r for r in records if r['pile'] == 'deck']
+    siderecords = [r for r in records if r['pile'] == 'side']
+    page(session, listing_lines(session, deckrecords) +
+         sidelisting_lines(session, siderecords))
+
+def show_changes(session, *changes):
+    """Show the listing lines of changed cards and the new pile sizes.
+
+    Each change is a (pile, card) pair; see report.PILES.
+    """
+    emit(session, [report.entry(session.deck, pile, card.lower())
+          for pile, card in changes], print_changes)
+
+def print_changes(session, records):
+    """Render changed listing lines as text."""
+    lines = cardlines(session, [r for r in records if r['pile'] == 'deck'])
+    side = [r for r in records if r['pile'] == 'side']
+    if side:
+        lines.append(string.center(' Sideboard ', 80, '-'))
+        lines.extend(cardlines(session, side))
+    lines.append('Deck: %d  Sideboard: %d' % (session.deck.deck.size(),
+                                              session.deck.sideboard.size()))
+    page(session, lines)
+
+def cmd_summary(session, arg):
     """Print a summary of cards in the deck, filtered by Type.
 
     Optional: A card Type or Sub-Type by which to filter.
     """
-    assert_activedeck()
-    cmd_list(arg, summarize=True)
+    assert_activedeck(session)
+    cmd_list(session, arg, summarize=True)
 
-def cmd_sidesummary(arg):
+def cmd_sidesummary(session, arg):
     """Print a summary of sideboarded cards, filtered by Type.
 
     Optional: A card Type or Sub-Type by which to filter.
     """
-    assert_activedeck()
-    cmd_listside(arg, summarize=True)
+    assert_activedeck(session)
+    cmd_listside(session, arg, summarize=True)
 
-def cmd_link(arg):
+def cmd_link(session, arg):
     """Display a Gatherer link for a card.
 
     Required: The card name.
     """
     if not arg:
         raise UsageError('CARD')
-    print(cards.url(arg))
+    print(cards.url(arg), file=session.out)
 
-def cmd_web(arg):
+def cmd_web(session, arg):
     """Open default web browser to a card or mtgdeckbuilder deck.
 
     Required: The card name or mtgdeckbuilder deck ID number.
@@ -511,7 +875,7 @@ def cmd_web(arg):
     else:
         webbrowser.open_new_tab(cards.url(arg))
 
-def cmd_card(arg):
+def cmd_card(session, arg):
     """Display card info from an online database.
 
     Required: The card name.
@@ -519,24 +883,23 @@ def cmd_card(arg):
     if not arg:
         raise UsageError('CARD')
     # Use preloaded data if already in active deck, otherwise fetch.
-    if active_deck and arg.lower() in active_deck.cardData.data:
-        card = active_deck.cardData.data[arg.lower()]
+    if session.deck and arg.lower() in session.deck.cardData.data:
+        card = session.deck.cardData.data[arg.lower()]
     else:
         card = cards.Card(arg)
         card.load()
     if not card.loaded:
-        print('Unable to find card data.')
-        return
+        raise ImproperArgError('Unable to find card data.')
     if card.cardback:
-        print('\n--- FRONT/TOP FACE ---')
-        mprint(card.color(), str(card))
-        print('\n--- BACK/BOTTOM FACE ---')
-        mprint(card.cardback.color(), str(card.cardback))
+        print('\n--- FRONT/TOP FACE ---', file=session.out)
+        mprint(session, card.color(), str(card))
+        print('\n--- BACK/BOTTOM FACE ---', file=session.out)
+        mprint(session, card.cardback.color(), str(card.cardback))
     else:
-        print('')
-        mprint(card.color(), str(card))
+        print('', file=session.out)
+        mprint(session, card.color(), str(card))
 
-def cmd_star(arg):
+def cmd_star(session, arg):
     """Mark a card with the optionally provided symbol.
 
     Required: The card name.
@@ -550,43 +913,49 @@ def cmd_star(arg):
     star = m.group(2) if m.group(2) else '*'
     if len(star) != 1:
         raise ImproperArgError('SYMBOL must be exactly one character.')
-    assert_activedeck()
-    if not card.lower() in active_deck.deck.cards:
+    assert_activedeck(session)
+    if not card.lower() in session.deck.deck.cards:
         raise ImproperArgError('Card doesn\'t exist in deck.')
-    active_deck.deck.star(card, star)
+    session.deck.deck.star(card, star)
+    session.record('star', 'deck', star, card.lower())
 
-def cmd_unstar(arg):
+def cmd_unstar(session, arg):
     """Unmark a card.
 
     Required: The card name.
     """
     if not arg:
         raise UsageError('CARD')
-    assert_activedeck()
-    if not arg.lower() in active_deck.deck.cards:
+    assert_activedeck(session)
+    if not arg.lower() in session.deck.deck.cards:
         raise ImproperArgError('Card doesn\'t exist in deck.')
-    active_deck.deck.unstar(arg)
+    session.deck.deck.unstar(arg)
+    session.record('unstar', 'deck', arg.lower())
 
-def cmd_hand(arg):
+def cmd_hand(session, arg):
     """Generate a random draw hand."""
-    assert_activedeck()
-    print('')
-    for c in active_deck.deck.randCards(7):
-        d = active_deck.cardData.data[c]
-        mprint(d.color(), d.snippet())
-    print('')
-
-def cmd_managram(arg):
+    assert_activedeck(session)
+    print('', file=session.out)
+    for c in session.deck.deck.randCards(7):
+        d = session.deck.cardData.data[c]
+        mprint(session, d.color(), d.snippet())
+    print('', file=session.out)
+
+def cmd_managram(session, arg):
     """Display the managram."""
-    assert_activedeck()
-    m = active_deck.deck.maxConvertedManaCost()
-    cprint('bold', '\n Cost   Cards')
-    print('------|-------')
-    for i in xrange(m + 1):
-        c = active_deck.deck.countConvertedManaFilter(i)
-        print(str(i).rjust(4) + str(c).rjust(8) + '  ' + ('=' * c))
-
-def cmd_uberprob(arg):
+    assert_activedeck(session)
+    emit(session, report.managram(session.deck), print_managram)
+
+def print_managram(session, records):
+    """Render the managram as text."""
+    cprint(session, 'bold', '\n Cost   Cards')
+    print('------|-------', file=session.out)
+    for r in records:
+        c = r['cards']
+        print(str(r['cmc']).rjust(4) + str(c).rjust(8) + '  ' + ('=' * c),
+              file=session.out)
+
+def cmd_uberprob(session, arg):
     """Incomplete, see 'help uberprob'.
     
     Supports expresson-style strings following this format:
@@ -613,7 +982,7 @@ def cmd_uberprob(arg):
     """
     pass
 
-def cmd_prob(arg):
+def cmd_prob(session, arg):
     """Probability of drawing a certain selection of cards.
 
     Required: Expression following this format:
@@ -630,192 +999,450 @@ def cmd_prob(arg):
     """
     if not arg:
         raise UsageError('Invalid expression, see \'help prob\'.')
-    assert_activedeck()
-    nlist = parse_andlist(arg)
-    # Print actual probabilities.
-    cprint('bold', '\n Turn   Cards   Probability')
-    print('------|-------|-------------')
-    for i in xrange(16):
-        print(str(i).rjust(4) + str(7 + i).rjust(8) + '    ' +
-              ('%.2f' % (active_deck.prob_anddraw(nlist, 7 + i)*100)).rjust(8) +
-              '%')
-
-def parse_andlist(arg):
+    assert_activedeck(session)
+    nlist = parse_andlist(session, arg)
+    emit(session, report.draw_probabilities(session.deck, nlist),
+         print_probabilities)
+
+def print_probabilities(session, records):
+    """Render draw probabilities as text."""
+    cprint(session, 'bold', '\n Turn   Cards   Probability')
+    print('------|-------|-------------', file=session.out)
+    for r in records:
+        print(str(r['turn']).rjust(4) + str(r['cards']).rjust(8) + '    ' +
+              ('%.2f' % (r['probability'] * 100)).rjust(8) + '%',
+              file=session.out)
+
+def parse_andlist(session, arg):
     """Parse a list of draw AND requirements."""
-    cl = []
-    l = [parse_orlist(s, cl) for s in re.split('\s+AND\s+', arg)]
-    if len(cl) != len(set(cl)):
-        raise ImproperArgError('Each card may appear only once.')
-    return l
-
-def parse_orlist(arg, cardlist=None):
-    """Parse a list of card OR tuples."""
-    assert_activedeck()
-    d = 1
-    m = re.match('(\d+)\s+(.*$)', arg)
-    if m:
-        d = int(m.group(1))
-        arg = m.group(2)
-    orlist = re.split('\s+OR\s+', arg)
-    orlist = [c.lower() for c in orlist]
-    
-    if any((c not in active_deck.deck.cards for c in orlist)):
-        raise ImproperArgError('Cards are not in active deck.')
-    s = sum((active_deck.deck.cards[c] for c in orlist))
-    if cardlist is not None:
-        cardlist.extend(orlist)
-    return (d, s)
-
-def cmd_togglecolor(arg):
+    assert_activedeck(session)
+    try:
+        return report.parse_draws(session.deck, arg)
+    except ValueError as e:
+        raise ImproperArgError(str(e))
+
+def cmd_togglecolor(session, arg):
     """Toggle use of ANSI color escape sequences."""
-    global global_coloron
-    global_coloron = not global_coloron
+    session.coloron = not session.coloron
+
+def cmd_output(session, arg):
+    """Set the output format for reports, or show it with no argument.
+
+    Optional: 'text', or 'json' to write the list, size, managram, prob,
+      csdist, cdist and cost reports as JSON Lines, one record per line.
+    """
+    if not arg:
+        print('Output format: %s' % session.output, file=session.out)
+        return
+    if arg not in ('text', 'json'):
+        raise UsageError('[text|json]')
+    session.output = arg
+
+def cmd_perf(session, arg):
+    """Time commands, and show their timings with no argument.
+
+    Optional: 'on' or 'off' to start or stop timing, 'clear' to forget the
+      timings so far, or 'save FILE' to write one JSON Lines record per
+      timed command to FILE.
+    Shows the 50th and 90th percentile wall times of each command over
+    its recent runs (and the 99th with 'output json'), and the mean
+    milliseconds spent reading pages (net), parsing them (parse), scraping
+    card data (extract), computing draw probabilities (prob) and writing
+    reports (render). Background jobs are timed as 'NAME job', and handling
+    their results as 'NAME finish'.
+    """
+    m = re.match(r'(on|off|clear|save)(?:\s+(.+))?$', arg or '')
+    if not arg:
+        if not perf.enabled and not perf.records():
+            print('Timing is off. Try \'perf on\'.', file=session.out)
+            return
+        emit(session, perf.summary(), print_perf)
+    elif not m or (m.group(1) == 'save') != bool(m.group(2)):
+        raise UsageError('[on|off|clear|save FILE]')
+    elif m.group(1) == 'save':
+        try:
+            with open(m.group(2), 'w') as f:
+                report.write_jsonl(perf.records(), f)
+        except IOError as e:
+            raise ImproperArgError('Unable to write %s: %s' %
+                                   (m.group(2), e.strerror))
+        print('Saved %d timing%s.' % (len(perf.records()),
+              '' if len(perf.records()) == 1 else 's'), file=session.out)
+    elif m.group(1) == 'clear':
+        perf.clear()
+    else:
+        perf.enable(m.group(1) == 'on')
 
-def cmd_csdist(arg):
+def cmd_profile(session, arg):
+    """Run a command under the profiler and show where it spent its time.
+
+    Required: A command and its arguments, e.g. 'profile prob 1 Forest'.
+      The command's background jobs are profiled too and waited for.
+    Or 'slow MS' to profile every command and save the profiles of those
+      taking over MS milliseconds under profiles/, for viewing with
+      "python -m pstats FILE"; 'slow off' to stop, or 'slow' to list the
+      profiles saved so far.
+    """
+    cmd, cmdarg = _parse_cmdline(arg or '')
+    if cmd == 'slow':
+        profile_slow(session, cmdarg)
+        return
+    func = get_cmd(cmd) if cmd else None
+    if not func or cmd == 'profile':
+        raise UsageError('COMMAND [ARGS] | slow [MS|off]')
+    started = list(session.jobs.jobs)
+    session.job_profiles = []
+    try:
+        profile = cProfile.Profile()
+        profile.runcall(call_cmd, session, cmd, func, cmdarg)
+    finally:
+        job_profiles, session.job_profiles = session.job_profiles, None
+    for job in session.jobs.jobs:
+        if job not in started:
+            job.wait()
+    profile.runcall(reap_jobs, session)
+    stats = pstats.Stats(profile, stream=session.out)
+    for p in job_profiles:
+        stats.add(p)
+    print('', file=session.out)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(20)
+
+def profile_slow(session, arg):
+    """Set, clear or show the slow command profile threshold."""
+    if not arg:
+        if perf.profile_threshold is None:
+            print('Not profiling slow commands.', file=session.out)
+        else:
+            print('Profiling commands over %g ms.' % perf.profile_threshold,
+                  file=session.out)
+        for path in perf.saved_profiles:
+            print(path, file=session.out)
+    elif arg == 'off':
+        perf.profile_threshold = None
+    else:
+        try:
+            perf.profile_threshold = float(arg)
+        except ValueError:
+            raise UsageError('slow [MS|off]')
+
+def print_perf(session, records):
+    """Render the command timings as text, in milliseconds."""
+    percentiles = ('p50', 'p90')
+    categories = perf.CATEGORIES + ('other',)
+    boldprint(session, 'command'.ljust(14) + 'runs'.rjust(4) +
+              ''.join(c.rjust(7) for c in percentiles) +
+              ''.join(c.rjust(8) for c in categories))
+    for r in records:
+        print(cards.cutoff_text(r['command'], 13).ljust(14) +
+              str(r['count']).rjust(4) +
+              ''.join(('%.1f' % (r[c] * 1000)).rjust(7)
+                      for c in percentiles) +
+              ''.join(('%.1f' % (r[c] * 1000)).rjust(8) for c in categories),
+              file=session.out)
+    if not records:
+        print('-nothing-'.center(80), file=session.out)
+
+def cmd_csdist(session, arg):
     """Display color symbol distribution for the active deck."""
-    assert_activedeck()
-    mdict = {}
-    for color in _cardcolors.keys():
-        mdict[color] = active_deck.deck.countColorSymbol(color)
-    tot = sum(mdict.values())
-    cprint('bold','\n' + str.center('Color Symbol Distribution',34))
-    print('-' * 34)
-    for color in mdict.keys():
-        n = mdict[color];
-        mprint(color, ' {' + color + '} x ' + str(n) + 
-                '\t(%.0f' % (float(n) / tot * 100) + 
-                '% of symbols)' ) if n else ''
-
-def cmd_cdist(arg):
+    assert_activedeck(session)
+    emit(session, report.color_symbols(session.deck), print_color_symbols)
+
+def print_color_symbols(session, records):
+    """Render the color symbol distribution as text."""
+    cprint(session, 'bold','\n' + str.center('Color Symbol Distribution',34))
+    print('-' * 34, file=session.out)
+    for r in records:
+        color = r['color']
+        mprint(session, color, ' {' + color + '} x ' + str(r['symbols']) +
+                '\t(%.0f' % (r['share'] * 100) + '% of symbols)')
+
+def cmd_cdist(session, arg):
     """Display card color distribution for the active deck."""
-    assert_activedeck()
-    mdict = {}
-    for color in _cardcolors.keys():
-        mdict[color] = active_deck.deck.countColor(color)
-    tot = sum(mdict.values())
-    cprint('bold','\n' + str.center('Card Color Distribution',47))
-    print('-' * 47)
-    for color in mdict.keys():
-        n = mdict[color];
-        mprint(color, ' {' + color + '} x ' + str(n) + 
-                '\t(%.0f' % (float(n) / tot * 100) + '% of colors, ' +
-                '%.0f' % (float(n) / len(active_deck.deck.list()) * 100) +\
-                '% of cards)') if n else ''
-
-def cmd_import(arg):
-    """Import a deck from mtgdeckbuilder.net by ID number."""
+    assert_activedeck(session)
+    emit(session, report.card_colors(session.deck), print_card_colors)
+
+def print_card_colors(session, records):
+    """Render the card color distribution as text."""
+    cprint(session, 'bold','\n' + str.center('Card Color Distribution',47))
+    print('-' * 47, file=session.out)
+    for r in records:
+        color = r['color']
+        mprint(session, color, ' {' + color + '} x ' + str(r['cards']) +
+                '\t(%.0f' % (r['color_share'] * 100) + '% of colors, ' +
+                '%.0f' % (r['card_share'] * 100) + '% of cards)')
+
+def cmd_import(session, arg):
+    """Import a deck from mtgdeckbuilder.net by ID number, in the background.
+    """
     if not arg:
         raise UsageError('DECK_ID')
-    dl = deck.scrapeDeckListing(arg)
-    if dl is None:
-        return
-    cmd_deck(dl.pop(0))
-    assert_activedeck()
-    pile = active_deck.deck
-    i = 0
-    tot = len(dl)-1
-    for cardset in dl:
-        m = re.match('(\d+)\s+(.*)$', cardset)
-        if m:
-            num = int(m.group(1))
-            cname = m.group(2)
-            sys.stdout.write('  Importing... {0:.0f}% complete\r' 
-                    .format(float(i)/tot*100))
-            sys.stdout.flush()
-            if not pile.add(cname, num):
-                print('Unable to find card data for \'' + cname + '\'.')
-            i += 1
-        elif re.match('Sideboard$', cardset):
-            pile = active_deck.sideboard
+    store = deck.card_store()
+    def work(job):
+        dl = deck.scrapeDeckListing(arg)
+        name = dl.pop(0)
+        # Fetch the data for cards not in the store; the store itself is
+        # only changed by finish(), on the main thread.
+        fetched = {}
+        for i, cardset in enumerate(dl):
+            job.step(i, len(dl))
+            m = re.match('(\d+)\s+(.*)$', cardset)
+            if m:
+                k = m.group(2).lower()
+                if k not in store.data and k not in fetched:
+                    c = cards.Card(k)
+                    c.load()
+                    fetched[k] = c
+        return (name, dl, fetched)
+    def finish(result):
+        name, dl, fetched = result
+        for k, c in fetched.iteritems():
+            if c.loaded:
+                store.put(k, c)
+        cmd_deck(session, name)
+        pile = session.deck.deck
+        pile_name = 'deck'
+        for cardset in dl:
+            m = re.match('(\d+)\s+(.*)$', cardset)
+            if m:
+                num = int(m.group(1))
+                cname = m.group(2)
+                if cname.lower() in store.data and pile.add(cname, num):
+                    session.record('add', pile_name, num, cname.lower())
+                else:
+                    print('Unable to find card data for \'' + cname + '\'.',
+                          file=session.out)
+            elif re.match('Sideboard$', cardset):
+                pile = session.deck.sideboard
+                pile_name = 'side'
+            else:
+                print('Problem parsing \'' + cardset + '\'.', file=session.out)
+        session.save_deck()
+        cmd_listall(session, '')
+    start_job(session, 'import', work, finish)
+
+def print_librarydecks(session, decks):
+    """Print a list of library.LibraryDeck."""
+    print('', file=session.out)
+    if not decks:
+        print('No matching decks.', file=session.out)
+    for d in decks:
+        print(cards.cutoff_text(d.name, 30).ljust(31) +
+              cards.cutoff_text(d.format or '', 12).ljust(13) +
+              d.colors.ljust(6) + str(d.size).rjust(4) + '   ' +
+              time.strftime('%Y-%m-%d', time.localtime(d.modified)),
+              file=session.out)
+
+def cmd_libadd(session, arg):
+    """Add the active deck to the deck library, or update it.
+
+    Optional: The deck's format, e.g. Standard or Modern.
+    """
+    assert_activedeck(session)
+    session.save_deck(session.journal.deckpath)
+    session.get_library().add(session.deck, session.journal.deckpath,
+                              arg or None)
+    print('Added \'' + session.deck.name + '\' to the library.',
+          file=session.out)
+
+def cmd_librm(session, arg):
+    """Remove a deck from the deck library.
+
+    Required: The deck name.
+    """
+    if not arg:
+        raise UsageError('NAME')
+    n = session.get_library().remove(arg)
+    if not n:
+        raise ImproperArgError('Deck is not in the library.')
+    print('Removed \'' + arg + '\' from the library.', file=session.out)
+
+def cmd_libsync(session, arg):
+    """Add or update all saved decks in a directory in the deck library.
+
+    Optional: The directory, by default the current directory.
+    """
+    directory = arg or '.'
+    if not os.path.isdir(directory):
+        raise ImproperArgError('No such directory.')
+    n = session.get_library().sync(directory)
+    print('Updated %d deck%s.' % (n, '' if n == 1 else 's'), file=session.out)
+
+def cmd_libfind(session, arg):
+    """Search the deck library.
+
+    Required: Terms joined by AND, each one of:
+      [NUM] CARD -> At least NUM (default 1) copies of CARD in the deck.
+      color=COLORS -> Has all of the color symbols, e.g. color=GR.
+      format=FORMAT -> Is in the format.
+      days=N -> Deck list changed in the last N days.
+
+    Example:
+      libfind 4 Llanowar Elves AND 20 Forest AND color=G
+    """
+    if not arg:
+        raise UsageError('TERM [AND TERM [AND ...]]')
+    query = {'cards': [], 'colors': ''}
+    for term in re.split('\s+AND\s+', arg.strip()):
+        m = re.match('(color|format|days)=(\S+)$', term)
+        if not m:
+            card, num = parse_numarg(term, 1)
+            query['cards'].append((num, card))
+        elif m.group(1) == 'color':
+            if not re.match('[RGBWU]+$', m.group(2)):
+                raise ImproperArgError('Colors are some of R, G, B, W, U.')
+            query['colors'] += m.group(2)
+        elif m.group(1) == 'format':
+            query['fmt'] = m.group(2)
+        elif not re.match('\d+$', m.group(2)):
+            raise ImproperArgError('days must be a number.')
         else:
-            print('Problem parsing \'' + cardset + '\'.')
-    cmd_listall('')
+            query['since'] = time.time() - int(m.group(2)) * 86400
+    print_librarydecks(session, session.get_library().find(**query))
 
-def cmd_price(arg):
+def cmd_librecent(session, arg):
+    """List library decks whose deck list changed recently.
+
+    Optional: Number of days, by default 7.
+    """
+    if arg and not re.match('\d+$', arg):
+        raise UsageError('[DAYS]')
+    days = int(arg) if arg else 7
+    print_librarydecks(session, session.get_library().find(
+        since=time.time() - days * 86400))
+
+def cmd_jobs(session, arg):
+    """List the background jobs."""
+    reap_jobs(session)
+    if not session.jobs.jobs:
+        print('No jobs.', file=session.out)
+    for job in session.jobs.jobs:
+        print(str(job), file=session.out)
+
+def parse_jobarg(session, arg):
+    """Parse an optional job ID argument. Returns the job or None."""
+    if not arg:
+        return None
+    if not re.match('\d+$', arg):
+        raise UsageError('[JOB_ID]')
+    job = session.jobs.get(int(arg))
+    if job is None:
+        raise ImproperArgError('No job %s.' % arg)
+    return job
+
+def cmd_cancel(session, arg):
+    """Cancel a background job, or all of them.
+
+    Optional: The job ID.
+    """
+    job = parse_jobarg(session, arg)
+    for j in [job] if job is not None else session.jobs.jobs:
+        j.cancel()
+    wait_jobs(session, job)
+
+def cmd_wait(session, arg):
+    """Wait for a background job, or all of them, to finish.
+
+    Optional: The job ID.
+    """
+    job = parse_jobarg(session, arg)
+    try:
+        wait_jobs(session, job)
+    except KeyboardInterrupt:
+        print('', file=session.out)
+
+def cmd_price(session, arg):
     """Display the price for a given card."""
     if not arg:
         raise UsageError('CARD')
-    (name, prices) = cards.scrape_card_price(arg)
+    (name, prices) = cards.card_price(arg)
     if name:
-        print('')
-        print('{0:^25}'.format(cards.cutoff_text(name, 25)))
-        print('-' * 25)
+        print('', file=session.out)
+        print('{0:^25}'.format(cards.cutoff_text(name, 25)), file=session.out)
+        print('-' * 25, file=session.out)
         print('  Low:\t$%.2f\n' % prices['L']
                 + '  Mean:\t$%.2f\n' % prices['M']
-                + '  High:\t$%.2f\n' % prices['H'])
+                + '  High:\t$%.2f\n' % prices['H'], file=session.out)
     else:
-        print('Unable to find card data.')
+        raise ImproperArgError('Unable to find card data.')
 
-def cmd_costall(arg):
-    """Shows the estimated cost of the active deck."""
+def parse_pricearg(arg):
+    """Parse a price point argument, L, M or H, defaulting to M."""
     if not arg:
         arg = 'M'
     if not re.match('L|M|H$', arg):
         raise UsageError('[L|M|H]')
-    assert_activedeck()
-    tot = cmd_cost(arg)
-    print('')
-    tot += cmd_costside(arg)
-    print('\n' + str('Total:').rjust(39) + str('$%.2f' % tot).rjust(9))
-
-def cmd_cost(arg):
+    return arg
+
+def cmd_costall(session, arg):
+    """Shows the estimated cost of the active deck, as a background job."""
+    p = parse_pricearg(arg)
+    assert_activedeck(session)
+    d = session.deck
+    n = len(d.deck.cards) + len(d.sideboard.cards)
+    def work(job):
+        deckrows = report.prices(d, 'deck', p,
+                                 lambda i: job.step(i, n))
+        return deckrows + report.prices(d, 'side', p,
+                                        lambda i: job.step(len(deckrows) + i,
+                                                           n))
+    start_job(session, 'cost', work,
+              lambda records: emit(session, records, print_costall), d)
+
+def print_costall(session, records):
+    """Render the cost of the deck and sideboard as text."""
+    print_cost(session, [r for r in records if r['pile'] == 'deck'])
+    print('', file=session.out)
+    print_costside(session, [r for r in records if r['pile'] == 'side'])
+    print('\n' + str('Total:').rjust(39) +
+          str('$%.2f' % report.total(records)).rjust(9), file=session.out)
+
+def cmd_cost(session, arg):
     """Shows the estimated cost of the active main deck."""
-    if not arg:
-        arg = 'M'
-    if not re.match('L|M|H$',arg):
-        raise UsageError('[L|M|H]')
-    assert_activedeck()
+    p = parse_pricearg(arg)
+    assert_activedeck(session)
+    emit(session, report.prices(session.deck, 'deck', p), print_cost)
+
+def print_cost(session, records):
+    """Render the cost of the main deck as text."""
     sep = '-' * 80
-    print(sep)
-    boldprint(active_deck.name.center(80))
-    print(sep)
-    tot = 0
-    # print(str('Per Card').rjust(38) + str('Card Set').rjust(11))
-    for c in active_deck.deck.manaSorted():
-        card = active_deck.cardData.data[c]
-        cost = print_deckcardprice(active_deck.deck.cards[c], card, arg)
-        tot += cost if cost else 0
-    print('\n' + str('Deck Subtotal:').rjust(39) + str('$%.2f' % tot).rjust(9))
-    return tot
-
-def cmd_costside(arg):
+    print(sep, file=session.out)
+    boldprint(session, session.deck.name.center(80))
+    print(sep, file=session.out)
+    for r in records:
+        print_deckcardprice(session, r)
+    print('\n' + str('Deck Subtotal:').rjust(39) +
+          str('$%.2f' % report.total(records)).rjust(9), file=session.out)
+
+def cmd_costside(session, arg):
     """Shows the estimated cost of the active sideboard."""
-    if not arg:
-        arg = 'M'
-    if not re.match('L|M|H$',arg):
-        raise UsageError('[L|M|H]')
-    assert_activedeck()
-    sep = '-' * 80
-    print(string.center(' Sideboard ', 80, '-'))
-    tot = 0
-    # print(str('Per Card').rjust(38) + str('Card Set').rjust(11))
-    for c in active_deck.sideboard.manaSorted():
-        card = active_deck.cardData.data[c]
-        cost = print_deckcardprice(active_deck.sideboard.cards[c], card, arg)
-        tot += cost if cost else 0
+    p = parse_pricearg(arg)
+    assert_activedeck(session)
+    emit(session, report.prices(session.deck, 'side', p), print_costside)
+
+def print_costside(session, records):
+    """Render the cost of the sideboard as text."""
+    print(string.center(' Sideboard ', 80, '-'), file=session.out)
+    for r in records:
+        print_deckcardprice(session, r)
+    tot = report.total(records)
     if tot == 0:
-        print('-nothing-'.center(80))
-    print('\n' + str('Sideboard Subtotal:').rjust(39) + str('$%.2f' % tot).rjust(9))
-    return tot
-    
-def print_deckcardprice(count, card, p='M'):
-    """Print the price for a cardset."""
-    if p is None:
-        return None
-    price = cards.scrape_card_price(card.name, p)[1]
-    if price is None:
-        print('Unable to get price for %s' % card.name)
-        return None
-    tot = price * count
-    mprint(card.color(), ' ' +\
-           cards.cutoff_text(card.name, 24).ljust(25) +\
-           str('$%.2f x' % price).rjust(8) + str(count).rjust(3) + ' = ' +\
-           str('$%.2f' % tot).rjust(8))
-    return tot
-
-# Global state.
-global_coloron = True
-active_deck = None
+        print('-nothing-'.center(80), file=session.out)
+    print('\n' + str('Sideboard Subtotal:').rjust(39) +
+          str('$%.2f' % tot).rjust(9), file=session.out)
+
+def print_deckcardprice(session, r):
+    """Print the price line for a price record."""
+    if r['price'] is None:
+        print('Unable to get price for %s' % r['name'], file=session.out)
+        return
+    mprint(session, r['color'], ' ' +\
+           cards.cutoff_text(r['name'], 24).ljust(25) +\
+           str('$%.2f x' % r['price']).rjust(8) + str(r['count']).rjust(3) +\
+           ' = ' + str('$%.2f' % r['total']).rjust(8))
+
+# Commands that change the active deck, refused while a job is using it.
+_DECK_COMMANDS = frozenset(['add', 'rm', 'star', 'unstar', 'sideadd',
+                            'siderm', 'side', 'deckname', 'refreshdata'])
 cmd_dict = {
     'Save, Load, or Import Deck': {
         'deck': cmd_deck,
@@ -823,6 +1450,14 @@ cmd_dict = {
         'save': cmd_save,
         'import': cmd_import,
         'decklist': cmd_decklist,
+        'migrate': cmd_migrate,
+    },
+    'Deck Library': {
+        'libadd': cmd_libadd,
+        'librm': cmd_librm,
+        'libsync': cmd_libsync,
+        'libfind': cmd_libfind,
+        'librecent': cmd_librecent,
     },
     'Modify Deck': {
         'add': cmd_add,
@@ -856,9 +1491,17 @@ cmd_dict = {
         'link': cmd_link,
         'web': cmd_web,
     },
+    'Background Jobs': {
+        'jobs': cmd_jobs,
+        'cancel': cmd_cancel,
+        'wait': cmd_wait,
+    },
     'System Commands': {
         'refreshdata': cmd_refreshdata,
         'togglecolor': cmd_togglecolor,
+        'output': cmd_output,
+        'perf': cmd_perf,
+        'profile': cmd_profile,
         'help': cmd_help,
         'tutorial': cmd_tutorial,
         'exit': cmd_exit,
@@ -872,22 +1515,24 @@ def iter_commands():
 
 def readline_completer(text, state):
     """The GNU readline completer function."""
-    l = []
-    if not re.search('\s', text):
-        l = filter(lambda k: re.match(text, k), iter_commands())
-    elif active_deck:
-        m = _READLINE_REGEX.match(text)
-        if m:
-            cards = active_deck.cardData.cardNames()
-            l = [m.group(1) + c for c in
-                 filter(lambda k: re.match(m.group(2), k), cards)]
-    if state < len(l):
-        return l[state]
+    global _completions
+    if state == 0:
+        _completions = []
+        if not re.search('\s', text):
+            _completions = [c for c in iter_commands() if c.startswith(text)]
+        else:
+            m = _READLINE_REGEX.match(text)
+            if m:
+                _completions = [m.group(1) + c for c in
+                                deck.card_store().namesWithPrefix(m.group(2))]
+    if state < len(_completions):
+        return _completions[state]
     return  None
 
-def readline_printmatches(substitution, matches, longest_match_length):
+def readline_printmatches(session, substitution, matches,
+                          longest_match_length):
     """Print multiple readline matches."""
-    print('')
+    print('', file=session.out)
     m = _READLINE_REGEX.match(substitution)
     printmatches = []
     for mtext in matches:
@@ -899,15 +1544,22 @@ def readline_printmatches(substitution, matches, longest_match_length):
     # Print matches.
     spacing = max((len(s) for s in printmatches))
     for s in printmatches:
-        print(s.ljust(spacing), end='   ')
-    print('\n' + get_prompt() + substitution, end='')
+        print(s.ljust(spacing), end='   ', file=session.out)
+    print('\n' + get_prompt(session) + substitution, end='', file=session.out)
 
-def readline_init():
+def readline_init(session):
     """Initialize readline."""
     readline.set_completer_delims('')
     readline.parse_and_bind('tab: complete')
     readline.set_completer(readline_completer)
-    readline.set_completion_display_matches_hook(readline_printmatches)
+    readline.set_completion_display_matches_hook(
+        lambda sub, matches, longest:
+            readline_printmatches(session, sub, matches, longest))
+
+def readline_addhistory(cmdline):
+    """Add a command line to the readline history, if readline is in use."""
+    if 'readline' in globals():
+        readline.add_history(cmdline)
 
 
 if __name__ == "__main__":
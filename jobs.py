@@ -0,0 +1,131 @@
+"""Background jobs.
+
+A job runs a work function on a worker thread, so slow network loops do not
+block the prompt. Work functions only fetch data; they report progress with
+Job.step(), which also stops the job once it has been cancelled. The result
+is handed to the job's finish function on the main thread when the job is
+reaped, so the active deck is only ever changed from the main thread.
+
+A job may hold a deck while it runs, and commands that would change that
+deck are refused until the job finishes.
+"""
+
+import threading
+
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """A unit of work running on a worker thread."""
+    def __init__(self, id, name, work, finish=None, deck=None):
+        self.id = id
+        self.name = name
+        self.deck = deck
+        self.state = RUNNING
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self._work = work
+        self._finish = finish
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='job-%d' % id)
+        self._thread.daemon = True
+
+    def _run(self):
+        try:
+            self.result = self._work(self)
+        except JobCancelled:
+            self.state = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.state = FAILED
+        else:
+            self.state = DONE
+
+    def step(self, done, total):
+        """Report progress; raises JobCancelled if the job was cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        """Ask the job to stop at its next step."""
+        self._cancel.set()
+
+    def running(self):
+        return self._thread.is_alive()
+
+    def wait(self):
+        """Wait for the job's thread to finish."""
+        # Join in short slices so KeyboardInterrupt still reaches the caller.
+        while self._thread.is_alive():
+            self._thread.join(0.1)
+
+    def finish(self):
+        """Call the finish function with the result of a successful job."""
+        if self.state == DONE and self._finish is not None:
+            self._finish(self.result)
+
+    def progress(self):
+        """Percent complete, or None if the job has not reported progress."""
+        if not self.total:
+            return None
+        return 100.0 * self.done / self.total
+
+    def __str__(self):
+        p = self.progress()
+        status = self.state
+        if self.state == RUNNING and p is not None:
+            status = '%.0f%%' % p
+        return '%d: %s %s' % (self.id, self.name, status)
+
+
+class Jobs:
+    """The jobs of a session."""
+    def __init__(self):
+        self.jobs = []
+        self._next_id = 1
+
+    def start(self, name, work, finish=None, deck=None):
+        """Start a job running work(job).
+
+        When the job has succeeded, its finish() method calls finish(result).
+        """
+        job = Job(self._next_id, name, work, finish, deck)
+        self._next_id += 1
+        self.jobs.append(job)
+        job._thread.start()
+        return job
+
+    def get(self, id):
+        for job in self.jobs:
+            if job.id == id:
+                return job
+        return None
+
+    def holding(self, deck):
+        """The unreaped job holding deck, if any."""
+        for job in self.jobs:
+            if job.deck is not None and job.deck is deck:
+                return job
+        return None
+
+    def reap(self):
+        """Remove and return the jobs whose threads have finished.
+
+        The caller then calls each job's finish() from the main thread.
+        """
+        finished = [job for job in self.jobs if not job.running()]
+        for job in finished:
+            self.jobs.remove(job)
+        return finished
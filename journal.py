@@ -0,0 +1,137 @@
+"""Append-only journal of changes to a deck.
+
+Each change to a deck is appended to a journal file next to its deck file
+and fsync'd, so an autosave costs one small append rather than rewriting
+the deck. Compaction folds the journal into a new deck file snapshot and
+empties the journal. Journal entries are numbered, and a snapshot records
+the number of the last entry it includes, so a crash between writing the
+snapshot and emptying the journal never applies an entry twice.
+
+Entries are lines of tab separated fields: "seq op arg...", where op is
+one of:
+  add PILE NUM CARD
+  rm PILE NUM CARD
+  star PILE SYMBOL CARD
+  unstar PILE CARD
+PILE is 'deck' or 'side'. Renaming a deck moves its file, so it compacts
+the journal into a snapshot under the new name instead.
+"""
+
+import os
+
+import deck
+
+JOURNAL_SUFFIX = '.journal'
+
+# Compact after this many journaled changes.
+COMPACT_EVERY = 64
+
+
+class JournalError(Exception):
+    pass
+
+
+def _pile(d, name):
+    if name == 'deck':
+        return d.deck
+    elif name == 'side':
+        return d.sideboard
+    raise JournalError('Unknown pile \'%s\'.' % name)
+
+def apply(d, op, args):
+    """Apply one journaled change to a deck."""
+    if op == 'add':
+        if not _pile(d, args[0]).add(args[2], int(args[1])):
+            raise JournalError('Unable to find card data for \'%s\'.'
+                               % args[2])
+    elif op == 'rm':
+        _pile(d, args[0]).remove(args[2], int(args[1]))
+    elif op == 'star':
+        _pile(d, args[0]).star(args[2], args[1])
+    elif op == 'unstar':
+        _pile(d, args[0]).unstar(args[1])
+    else:
+        raise JournalError('Unknown journal operation \'%s\'.' % op)
+
+
+class Journal:
+    """The journal for the deck file at path."""
+    def __init__(self, path, seq=0):
+        self.deckpath = path
+        self.path = path + JOURNAL_SUFFIX
+        self.seq = seq
+        self.pending = 0
+        self._f = None
+
+    def entries(self):
+        """Yield (seq, op, args) for each complete entry in the journal."""
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return
+        with f:
+            for line in f:
+                # A torn final line is what a crash mid-append leaves.
+                if not line.endswith('\n'):
+                    break
+                fields = line[:-1].split('\t')
+                try:
+                    seq = int(fields[0])
+                except ValueError:
+                    break
+                yield (seq, fields[1], fields[2:])
+
+    def replay(self, d):
+        """Apply entries newer than the deck's snapshot. Returns the count."""
+        n = 0
+        self.seq = d.seq
+        for seq, op, args in self.entries():
+            if seq <= self.seq:
+                continue
+            apply(d, op, args)
+            self.seq = seq
+            n += 1
+        self.pending = n
+        return n
+
+    def append(self, op, *args):
+        """Durably record one change."""
+        if self._f is None:
+            self._f = open(self.path, 'ab')
+        self.seq += 1
+        self._f.write('\t'.join([str(self.seq), op] +
+                                [str(a) for a in args]) + '\n')
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.pending += 1
+
+    def needs_compaction(self):
+        return self.pending >= COMPACT_EVERY
+
+    def compact(self, d, path=None):
+        """Write a snapshot of d and empty the journal.
+
+        Returns the snapshot data. With path, the snapshot is written there
+        instead, and the journal follows the deck to its new file. Any
+        journal left there by another deck is discarded first, so that it
+        is never replayed into this one.
+        """
+        if path is not None and \
+           os.path.abspath(path) != os.path.abspath(self.deckpath) and \
+           os.path.exists(path + JOURNAL_SUFFIX):
+            os.remove(path + JOURNAL_SUFFIX)
+        d.seq = self.seq
+        data = deck.save(d, path or self.deckpath)
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        if path is not None:
+            self.deckpath = path
+            self.path = path + JOURNAL_SUFFIX
+        self.pending = 0
+        return data
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
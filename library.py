@@ -0,0 +1,162 @@
+"""Searchable deck library backed by SQLite.
+
+The library indexes decks from any number of directories by card, color,
+format and the time their deck list last changed, so searches such as
+"decks with 4 Llanowar Elves and at least 20 Forest" are indexed lookups
+rather than reads of every deck file.
+"""
+
+import os
+import sqlite3
+import time
+
+import deck
+import manifest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    format TEXT,
+    colors TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    modified REAL NOT NULL,
+    hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS cards (
+    deck INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE,
+    pile TEXT NOT NULL,
+    card TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (deck, pile, card));
+CREATE TABLE IF NOT EXISTS colors (
+    deck INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE,
+    color TEXT NOT NULL,
+    PRIMARY KEY (color, deck));
+CREATE INDEX IF NOT EXISTS cards_by_card ON cards (card, pile, count);
+CREATE INDEX IF NOT EXISTS decks_by_name ON decks (name);
+CREATE INDEX IF NOT EXISTS decks_by_format ON decks (format);
+CREATE INDEX IF NOT EXISTS decks_by_modified ON decks (modified);
+"""
+
+
+class LibraryDeck:
+    """A deck's library entry."""
+    def __init__(self, row):
+        (self.path, self.name, self.format, self.colors, self.size,
+         self.modified) = row
+
+
+class DeckLibrary:
+    """A deck library stored in an SQLite database."""
+    def __init__(self, path=deck.LIBRARY_FILENAME):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _put(self, path, name, fmt, colors, size, records, records_hash,
+             now=None):
+        """Insert or update the entry for the deck file at path."""
+        path = os.path.abspath(path)
+        row = self.db.execute(
+            'SELECT id, hash, modified, format FROM decks WHERE path = ?',
+            (path,)).fetchone()
+        if row is None:
+            cur = self.db.execute(
+                'INSERT INTO decks (path, name, format, colors, size, '
+                'modified, hash) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, name, fmt, colors, size, now or time.time(),
+                 records_hash))
+            deck_id = cur.lastrowid
+        else:
+            deck_id, old_hash, modified, old_fmt = row
+            if old_hash != records_hash:
+                modified = now or time.time()
+            self.db.execute(
+                'UPDATE decks SET name = ?, format = ?, colors = ?, size = ?, '
+                'modified = ?, hash = ? WHERE id = ?',
+                (name, fmt if fmt is not None else old_fmt, colors, size,
+                 modified, records_hash, deck_id))
+            if old_hash == records_hash:
+                return
+            self.db.execute('DELETE FROM cards WHERE deck = ?', (deck_id,))
+            self.db.execute('DELETE FROM colors WHERE deck = ?', (deck_id,))
+        self.db.executemany(
+            'INSERT INTO cards (deck, pile, card, count) VALUES (?, ?, ?, ?)',
+            ((deck_id, p, c, n) for p, c, n in records))
+        self.db.executemany(
+            'INSERT INTO colors (deck, color) VALUES (?, ?)',
+            ((deck_id, c) for c in colors))
+
+    def add(self, d, path, fmt=None):
+        """Add or update a Deck saved at path, optionally setting its format.
+        """
+        records = manifest.deck_records(d)
+        with self.db:
+            self._put(path, d.name, fmt, d.deck.colors(), d.deck.size(),
+                      records, manifest.list_hash(records))
+
+    def contains(self, path):
+        return self.db.execute('SELECT 1 FROM decks WHERE path = ?',
+                               (os.path.abspath(path),)).fetchone() is not None
+
+    def remove(self, name):
+        """Remove all decks with the given name. Returns the number removed.
+        """
+        with self.db:
+            return self.db.execute('DELETE FROM decks WHERE name = ?',
+                                   (name,)).rowcount
+
+    def sync(self, directory='.'):
+        """Add or update every deck file in a directory.
+
+        Only deck files whose name or deck list differ from the library's
+        are read. Returns the number of decks added or updated.
+        """
+        known = dict((path, (name, h)) for path, name, h in
+                     self.db.execute('SELECT path, name, hash FROM decks'))
+        n = 0
+        with self.db:
+            for fn, e in manifest.current(directory).decks():
+                path = os.path.abspath(os.path.join(directory, fn))
+                if e['name'] is None or \
+                   known.get(path) == (e['name'], e['list_hash']):
+                    continue
+                with open(path, 'rb') as f:
+                    header, records = deck.parse(f.read())
+                self._put(path, e['name'], None, e['colors'], e['size'],
+                          [(p, c, num) for p, num, star, c in records],
+                          e['list_hash'], e['mtime'])
+                n += 1
+        return n
+
+    def find(self, cards=(), colors='', fmt=None, since=None):
+        """Find decks matching all of the given criteria.
+
+        cards is a list of (num, card) requiring at least num copies of card
+        in the main deck, colors a string of color symbols the deck must
+        all have, fmt a format name and since a time after which the deck
+        list must have changed. Returns a list of LibraryDeck sorted by name.
+        """
+        where = []
+        params = []
+        for num, card in cards:
+            where.append('id IN (SELECT deck FROM cards WHERE card = ? AND '
+                         'pile = \'deck\' AND count >= ?)')
+            params.extend((card.lower(), num))
+        for c in colors:
+            where.append('id IN (SELECT deck FROM colors WHERE color = ?)')
+            params.append(c)
+        if fmt is not None:
+            where.append('format = ?')
+            params.append(fmt)
+        if since is not None:
+            where.append('modified >= ?')
+            params.append(since)
+        sql = ('SELECT path, name, format, colors, size, modified FROM decks' +
+               (' WHERE ' + ' AND '.join(where) if where else '') +
+               ' ORDER BY name')
+        return [LibraryDeck(r) for r in self.db.execute(sql, params)]
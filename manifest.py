@@ -0,0 +1,167 @@
+"""Manifest of the saved decks in a directory.
+
+The manifest caches each deck's name, size, colors, modification time,
+content hash and deck list hash, so the decks can be listed without
+reading every deck file. Entries are checked against the files on disk
+and rebuilt when a file's modification time or size has changed. Files
+are only added to or removed from the directory when its modification
+time changes, so the directory is only listed then; otherwise just the
+known deck files are checked.
+"""
+
+import cPickle as pickle
+import hashlib
+import os
+
+import deck
+
+MANIFEST_FILENAME = '.decks.manifest'
+MANIFEST_VERSION = 2
+
+
+def content_hash(data):
+    """Hash of a deck file's contents."""
+    return hashlib.sha1(data).hexdigest()
+
+def deck_records(d):
+    """(pile, card, count) records for a Deck."""
+    r = [('deck', c, n) for c, n in d.deck.cards.iteritems()]
+    r.extend(('side', c, n) for c, n in d.sideboard.cards.iteritems())
+    return r
+
+def list_hash(records):
+    """Hash of a deck list given as (pile, card, count) records.
+
+    Unlike content_hash, it ignores the deck's name, stars and journal
+    sequence number, so it only changes when the deck list does.
+    """
+    return hashlib.sha1(''.join('%s\t%d\t%s\n' % (pile, count, card)
+                                for pile, card, count in sorted(records))
+                        ).hexdigest()
+
+
+class Manifest:
+    """The manifest for the deck files in a directory."""
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILENAME)
+        self.entries = {}
+        self.dir_mtime = None
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                m = pickle.load(f)
+        except Exception:
+            # A missing or damaged manifest is simply rebuilt.
+            self.dirty = True
+            return
+        if m.get('version') == MANIFEST_VERSION:
+            self.entries = m['decks']
+            self.dir_mtime = m['dir_mtime']
+        else:
+            self.dirty = True
+
+    def save(self):
+        """Write the manifest if it has changed."""
+        if not self.dirty:
+            return
+        # The manifest is rewritten in place rather than replaced, so that
+        # writing it does not itself change the directory's mtime. A torn
+        # write only costs a rebuild.
+        with open(self.path, 'wb') as f:
+            pickle.dump({'version': MANIFEST_VERSION, 'decks': self.entries,
+                         'dir_mtime': self.dir_mtime},
+                        f, pickle.HIGHEST_PROTOCOL)
+        self.dirty = False
+
+    def _entry(self, fn, data, st, d=None):
+        """Build the entry for deck file fn with contents data."""
+        e = {'mtime': st.st_mtime, 'bytes': st.st_size,
+             'hash': content_hash(data)}
+        if deck.is_legacy(data):
+            e.update(name=None, size=None, colors=None, list_hash=None)
+        elif d is not None:
+            e.update(name=d.name, size=d.deck.size(),
+                     colors=d.deck.colors(),
+                     list_hash=list_hash(deck_records(d)))
+        else:
+            header, records = deck.parse(data)
+            store = deck.card_store()
+            colors = set()
+            for pile, count, star, card in records:
+                if pile == 'deck' and card in store.data:
+                    colors.update(store.data[card].color() or '')
+            e.update(name=header['name'],
+                     size=sum(r[1] for r in records if r[0] == 'deck'),
+                     colors=''.join(sorted(colors)),
+                     list_hash=list_hash([(p, c, n)
+                                          for p, n, star, c in records]))
+        return e
+
+    def update(self, fn, data, d=None):
+        """Record that deck file fn was just written with data.
+
+        d is the saved Deck, if available, to avoid re-parsing data.
+        """
+        st = os.stat(os.path.join(self.directory, fn))
+        self.entries[fn] = self._entry(fn, data, st, d)
+        self.dirty = True
+
+    def remove(self, fn):
+        """Forget deck file fn."""
+        if self.entries.pop(fn, None) is not None:
+            self.dirty = True
+
+    def refresh(self):
+        """Bring the manifest up to date with the deck files on disk.
+
+        Only files whose modification time or size differ from their entry
+        are read.
+        """
+        dir_mtime = os.stat(self.directory).st_mtime
+        if dir_mtime == self.dir_mtime:
+            # No deck file has been added or removed, but one may have
+            # been changed in place.
+            present = set(self.entries)
+        else:
+            if os.path.exists(self.path):
+                self.dir_mtime = dir_mtime
+            self.dirty = True
+            present = set(fn for fn in os.listdir(self.directory)
+                          if fn.endswith('.deck'))
+        for fn in present:
+            path = os.path.join(self.directory, fn)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            e = self.entries.get(fn)
+            if e is not None and e['mtime'] == st.st_mtime and \
+               e['bytes'] == st.st_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                self.entries[fn] = self._entry(fn, data, st)
+            except deck.DeckFormatError:
+                self.entries.pop(fn, None)
+            self.dirty = True
+        for fn in set(self.entries) - present:
+            del self.entries[fn]
+            self.dirty = True
+
+    def decks(self):
+        """List of (filename, entry) sorted by deck name."""
+        return sorted(self.entries.iteritems(),
+                      key=lambda t: (t[1]['name'] or t[0]).lower())
+
+
+def current(directory='.'):
+    """Load the manifest for directory and refresh it from disk."""
+    m = Manifest(directory)
+    m.refresh()
+    m.save()
+    return m
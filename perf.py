@@ -0,0 +1,201 @@
+"""Opt-in timing of commands and of the work done inside them.
+
+While enabled, each command run with command() gets a record of its wall
+time, split into the time spent in sections marked with timed():
+
+  net      reading pages with urllib2
+  parse    building BeautifulSoup trees
+  extract  scraping card data out of a parsed page (Card.load)
+  prob     draw probability math
+  render   writing reports
+
+Sections nest, and each one is charged only the time not spent in the
+sections inside it, so a Card.load that fetches and parses its own page
+counts as net, parse and extract separately. Time in no section is the
+record's 'other'. Sections on a thread with no command, such as a
+background job's, go to that thread's own command() if it has one.
+
+The last WINDOW records are kept, for summary() and for writing out as
+JSON Lines. When disabled, command() and timed() do no timing at all.
+
+Separately, with a profile threshold set, profiled() runs each command
+under cProfile and saves the profiles of those slower than the threshold
+for "python -m pstats FILE".
+"""
+
+import collections
+import os
+import re
+import threading
+import time
+
+import utils
+
+cProfile = utils.LazyModule('cProfile')
+
+CATEGORIES = ('net', 'parse', 'extract', 'prob', 'render')
+WINDOW = 500
+
+enabled = False
+
+# Milliseconds, or None to not profile commands.
+profile_threshold = None
+profile_dir = 'profiles'
+# Paths of the profiles saved for slow commands, oldest first.
+saved_profiles = []
+
+_records = collections.deque(maxlen=WINDOW)
+_local = threading.local()
+
+
+class _Untimed:
+    """Stands in for a section, command or profile that is not taken."""
+    path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_UNTIMED = _Untimed()
+
+
+class _Section:
+    """A timed section, charged to the current command of its thread."""
+    def __init__(self, category):
+        self.category = category
+        self.inner = 0.0
+
+    def __enter__(self):
+        self.stack = getattr(_local, 'stack', None)
+        if self.stack is not None:
+            self.start = time.time()
+            self.stack.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        if self.stack is None:
+            return False
+        elapsed = time.time() - self.start
+        self.stack.pop()
+        _local.record[self.category] += elapsed - self.inner
+        if self.stack:
+            self.stack[-1].inner += elapsed
+        return False
+
+
+class _Command:
+    """Records the wall time of a command and of the sections inside it."""
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.outer = (getattr(_local, 'stack', None),
+                      getattr(_local, 'record', None))
+        self.record = dict.fromkeys(CATEGORIES, 0.0)
+        self.record.update(command=self.name, start=time.time())
+        _local.stack = []
+        _local.record = self.record
+        return self
+
+    def __exit__(self, *exc):
+        r = self.record
+        r['wall'] = time.time() - r['start']
+        r['other'] = max(0.0, r['wall'] - sum(r[c] for c in CATEGORIES))
+        _local.stack, _local.record = self.outer
+        _records.append(r)
+        return False
+
+
+def timed(category):
+    """A context manager charging its time to category, one of CATEGORIES.
+    """
+    if not enabled:
+        return _UNTIMED
+    return _Section(category)
+
+def command(name):
+    """A context manager recording the time of a command named name."""
+    if not enabled:
+        return _UNTIMED
+    return _Command(name)
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def clear():
+    _records.clear()
+
+def records():
+    """The kept command records, oldest first.
+
+    Each is a dict with the command name, its start time, its wall time
+    and the seconds charged to each of CATEGORIES and to 'other'.
+    """
+    return list(_records)
+
+def percentile(values, q):
+    """The q'th quantile, 0 <= q <= 1, of a non-empty list of values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def summary():
+    """One record per command name, with the count, wall time percentiles
+    and mean seconds per category of its kept records."""
+    by_name = collections.defaultdict(list)
+    for r in records():
+        by_name[r['command']].append(r)
+    result = []
+    for name in sorted(by_name):
+        rs = by_name[name]
+        walls = [r['wall'] for r in rs]
+        s = {'command': name, 'count': len(rs),
+             'p50': percentile(walls, 0.5), 'p90': percentile(walls, 0.9),
+             'p99': percentile(walls, 0.99)}
+        for c in CATEGORIES + ('other',):
+            s[c] = sum(r[c] for r in rs) / len(rs)
+        result.append(s)
+    return result
+
+
+class _Profile:
+    """Runs its block under cProfile, saving the profile if it is slow."""
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.start = time.time()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        ms = (time.time() - self.start) * 1000
+        if ms > profile_threshold:
+            self.path = _save_profile(self.profile, self.name, self.start)
+        return False
+
+def _save_profile(profile, name, start):
+    if not os.path.isdir(profile_dir):
+        os.makedirs(profile_dir)
+    path = os.path.join(profile_dir, '%s-%s-%03d.prof' % (
+        re.sub(r'\W+', '-', name),
+        time.strftime('%Y%m%d-%H%M%S', time.localtime(start)),
+        int(start * 1000) % 1000))
+    profile.dump_stats(path)
+    saved_profiles.append(path)
+    return path
+
+def profiled(name):
+    """A context manager profiling its block while profile_threshold is set.
+
+    If the block takes longer than profile_threshold, the profile is saved
+    in profile_dir and the manager's path attribute holds its file.
+    """
+    if profile_threshold is None:
+        return _UNTIMED
+    return _Profile(name)
@@ -0,0 +1,153 @@
+"""Structured results for the deck reports.
+
+Each report function returns a list of records, plain dicts holding only
+strings, numbers, lists and None, so a report can be rendered as text for
+the prompt or written as JSON Lines, one record per line, for other tools.
+"""
+
+import re
+import sys
+
+import cards
+import perf
+import utils
+
+json = utils.LazyModule('json')
+
+PILES = ('deck', 'side')
+COLORS = ('W', 'U', 'B', 'R', 'G')
+
+
+def get_pile(d, pile):
+    """The CardPile of deck d named by pile, one of PILES."""
+    if pile not in PILES:
+        raise ValueError('Unknown pile: %r' % pile)
+    return d.deck if pile == 'deck' else d.sideboard
+
+def card_record(card):
+    """The record for a card's data."""
+    return {
+        'name': card.name,
+        'cost': card.cost,
+        'cmc': card.convertedCost,
+        'types': list(card.types),
+        'subtypes': list(card.subtypes),
+        'color': card.color(),
+        'power': card.power if card.isCreature() else None,
+        'toughness': card.toughness if card.isCreature() else None}
+
+def listing(d, pile='deck', reqType=None):
+    """One record per card in a pile, in mana order.
+
+    If reqType is not None, only cards with all of its space separated
+    Types are included.
+    """
+    p = get_pile(d, pile)
+    records = []
+    for c in p.manaSorted():
+        card = d.cardData.data[c]
+        if reqType and not card.hasTypes(reqType.split()):
+            continue
+        records.append(entry(d, pile, c))
+    return records
+
+def entry(d, pile, key):
+    """The listing record for one card, with a count of 0 if not in the pile.
+    """
+    p = get_pile(d, pile)
+    r = card_record(d.cardData.data[key])
+    r.update(deck=d.name, pile=pile, count=p.cards.get(key, 0),
+             star=p.getStar(key))
+    return r
+
+def sizes(d):
+    """The deck, sideboard and total sizes."""
+    return [{
+        'deck': d.name,
+        'deck_size': d.deck.size(),
+        'sideboard_size': d.sideboard.size(),
+        'total_size': d.deck.size() + d.sideboard.size()}]
+
+def managram(d):
+    """The number of cards at each converted mana cost."""
+    return [{'deck': d.name, 'cmc': i,
+             'cards': d.deck.countConvertedManaFilter(i)}
+            for i in xrange(d.deck.maxConvertedManaCost() + 1)]
+
+def parse_draws(d, expr):
+    """Parse a draw expression for Deck.prob_anddraw (see 'help prob').
+
+    Raises ValueError if the expression is not valid for deck d.
+    """
+    nlist = []
+    seen = []
+    for term in re.split(r'\s+AND\s+', expr):
+        num = 1
+        m = re.match(r'(\d+)\s+(.*$)', term)
+        if m:
+            num = int(m.group(1))
+            term = m.group(2)
+        orlist = [c.lower() for c in re.split(r'\s+OR\s+', term)]
+        if any(c not in d.deck.cards for c in orlist):
+            raise ValueError('Cards are not in active deck.')
+        seen.extend(orlist)
+        nlist.append((num, sum(d.deck.cards[c] for c in orlist)))
+    if len(seen) != len(set(seen)):
+        raise ValueError('Each card may appear only once.')
+    return nlist
+
+def draw_probabilities(d, nlist, turns=16):
+    """Probability of having drawn nlist by each turn (see Deck.prob_anddraw).
+    """
+    with perf.timed('prob'):
+        return [{'deck': d.name, 'turn': i, 'cards': 7 + i,
+                 'probability': d.prob_anddraw(nlist, 7 + i)}
+                for i in xrange(turns)]
+
+def color_symbols(d):
+    """Count of each color's mana symbols, for colors that appear."""
+    counts = [(color, d.deck.countColorSymbol(color)) for color in COLORS]
+    tot = sum(n for _, n in counts)
+    return [{'deck': d.name, 'color': color, 'symbols': n,
+             'share': float(n) / tot}
+            for color, n in counts if n]
+
+def card_colors(d):
+    """Count of cards of each color, for colors that appear."""
+    counts = [(color, d.deck.countColor(color)) for color in COLORS]
+    tot = sum(n for _, n in counts)
+    ncards = len(d.deck.list())
+    return [{'deck': d.name, 'color': color, 'cards': n,
+             'color_share': float(n) / tot,
+             'card_share': float(n) / ncards}
+            for color, n in counts if n]
+
+def prices(d, pile='deck', p='M', progress=None):
+    """Price of each card in a pile, at price point p (L, M or H).
+
+    A card's price and total are None when its price is unavailable. If
+    given, progress(i) is called before scraping the i'th card's price.
+    """
+    cp = get_pile(d, pile)
+    records = []
+    for i, c in enumerate(cp.manaSorted()):
+        if progress is not None:
+            progress(i)
+        card = d.cardData.data[c]
+        count = cp.cards[c]
+        price = cards.card_price(card.name, p)[1]
+        records.append({
+            'deck': d.name, 'pile': pile, 'name': card.name,
+            'color': card.color(), 'count': count, 'price': price,
+            'total': price * count if price is not None else None})
+    return records
+
+def total(records, key='total'):
+    """Sum of a field over records, skipping None."""
+    return sum(r[key] for r in records if r[key] is not None)
+
+def write_jsonl(records, out=None):
+    """Write records as JSON Lines."""
+    out = out or sys.stdout
+    for r in records:
+        out.write(json.dumps(r, sort_keys=True) + '\n')
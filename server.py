@@ -0,0 +1,308 @@
+"""JSON over HTTP server for the decks in a directory.
+
+Started with "deckbuilder.py --serve PORT", it listens on 127.0.0.1 only,
+as requests are not authenticated. Requests are handled on their own
+threads, and all of them share the card store and the price cache, so
+each card page and price is scraped once for every client.
+
+Endpoints, with NAME a deck name and CARD a card name:
+  GET    /cards/CARD                 card data
+  GET    /decks                      the saved decks
+  GET    /decks/NAME                 deck and sideboard listing
+  PUT    /decks/NAME                 create or replace a deck from
+                                     {"deck": {CARD: NUM}, "side": {...}}
+  DELETE /decks/NAME                 delete a deck
+  POST   /decks/NAME/cards           add {"card": CARD, "count": NUM,
+                                     "pile": "deck" or "side"}
+  DELETE /decks/NAME/cards/CARD      remove a card; optional query
+                                     parameters count=NUM and pile=side
+  GET    /decks/NAME/prob?q=EXPR     draw probabilities, see 'help prob'
+  GET    /decks/NAME/managram        the managram
+  GET    /decks/NAME/cost?p=L|M|H    card prices
+
+Responses are JSON objects, {"records": [...]} holding report records (see
+report.py) on success, or {"error": MESSAGE}.
+"""
+
+import BaseHTTPServer
+import json
+import os
+import re
+import SocketServer
+import traceback
+import urllib
+import urlparse
+
+import cards
+import deck
+import journal
+import manifest
+import report
+
+
+class RequestError(Exception):
+    """An error reported to the client with an HTTP status."""
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def fetch_card(name):
+    """Make sure the card store has data for a card. Returns its key."""
+    if not deck.card_store().fetch(name):
+        raise RequestError(404, 'Unable to find card data for \'%s\'.'
+                                % name)
+    return name.lower()
+
+def deck_path(name):
+    """The deck file for a deck name from a request.
+
+    Names that could reach a file outside the current directory are
+    refused.
+    """
+    if '/' in name or '\\' in name or '\0' in name or name.startswith('.'):
+        raise RequestError(400, 'Bad deck name \'%s\'.' % name)
+    return deck.filename(name)
+
+def load_deck(name):
+    """Load a saved deck along with any unsaved changes in its journal."""
+    path = deck_path(name)
+    try:
+        d = deck.load(path, deck.card_store())
+    except IOError:
+        raise RequestError(404, 'No deck \'%s\'.' % name)
+    journal.Journal(path, d.seq).replay(d)
+    return d
+
+def save_deck(d):
+    """Save a deck, folding in its journal.
+
+    Call with deck.write_lock held.
+    """
+    path = deck_path(d.name)
+    data = journal.Journal(path, d.seq).compact(d)
+    m = manifest.Manifest()
+    m.update(path, data, d)
+    m.save()
+    deck.save_card_store()
+
+def _pile(name):
+    if name not in report.PILES:
+        raise RequestError(400, 'pile must be one of: %s.' %
+                                ', '.join(report.PILES))
+    return name
+
+def _count(value):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        n = 0
+    if n < 1:
+        raise RequestError(400, 'count must be a positive integer.')
+    return n
+
+
+def get_card(query, body, name):
+    key = fetch_card(name)
+    r = report.card_record(deck.card_store().data[key])
+    r['text'] = deck.card_store().data[key].text
+    return [r]
+
+def get_decks(query, body):
+    with deck.write_lock:
+        m = manifest.current()
+    return [{'name': e['name'], 'file': fn, 'size': e['size'],
+             'colors': e['colors']}
+            for fn, e in m.decks()]
+
+def get_deck(query, body, name):
+    d = load_deck(name)
+    return report.listing(d, 'deck') + report.listing(d, 'side')
+
+def put_deck(query, body, name):
+    deck_path(name)
+    if not isinstance(body, dict):
+        raise RequestError(400, 'Expected a JSON object.')
+    piles = []
+    for pile in report.PILES:
+        entries = body.get(pile, {})
+        if not isinstance(entries, dict):
+            raise RequestError(400, '%s must map card names to counts.' %
+                                    pile)
+        piles.append([(fetch_card(c), _count(n))
+                      for c, n in entries.iteritems()])
+    d = deck.Deck(name, deck.card_store())
+    for p, entries in zip((d.deck, d.sideboard), piles):
+        for key, n in entries:
+            p.add(key, n)
+    with deck.write_lock:
+        save_deck(d)
+    return report.listing(d, 'deck') + report.listing(d, 'side')
+
+def delete_deck(query, body, name):
+    path = deck_path(name)
+    with deck.write_lock:
+        if not os.path.exists(path):
+            raise RequestError(404, 'No deck \'%s\'.' % name)
+        os.remove(path)
+        if os.path.exists(path + journal.JOURNAL_SUFFIX):
+            os.remove(path + journal.JOURNAL_SUFFIX)
+        m = manifest.Manifest()
+        m.remove(path)
+        m.save()
+    return []
+
+def post_card(query, body, name):
+    if not isinstance(body, dict) or 'card' not in body:
+        raise RequestError(400, 'Expected {"card": CARD, "count": NUM, '
+                                '"pile": "deck" or "side"}.')
+    pile = _pile(body.get('pile', 'deck'))
+    n = _count(body.get('count', 1))
+    key = fetch_card(body['card'])
+    with deck.write_lock:
+        d = load_deck(name)
+        report.get_pile(d, pile).add(key, n)
+        save_deck(d)
+    return [report.entry(d, pile, key)]
+
+def delete_card(query, body, name, card):
+    pile = _pile(query.get('pile', 'deck'))
+    key = card.lower()
+    with deck.write_lock:
+        d = load_deck(name)
+        p = report.get_pile(d, pile)
+        if key not in p.cards:
+            raise RequestError(404, 'Card is not in the %s.' % pile)
+        p.remove(key, _count(query['count']) if 'count' in query
+                      else p.cards[key])
+        save_deck(d)
+    return [report.entry(d, pile, key)]
+
+def get_prob(query, body, name):
+    d = load_deck(name)
+    try:
+        nlist = report.parse_draws(d, query.get('q', ''))
+    except ValueError as e:
+        raise RequestError(400, str(e))
+    return report.draw_probabilities(d, nlist)
+
+def get_managram(query, body, name):
+    return report.managram(load_deck(name))
+
+def get_cost(query, body, name):
+    p = query.get('p', 'M')
+    if p not in ('L', 'M', 'H'):
+        raise RequestError(400, 'p must be one of: L, M, H.')
+    d = load_deck(name)
+    return report.prices(d, 'deck', p) + report.prices(d, 'side', p)
+
+
+# (method, path regex, handler); handlers are called with the query
+# parameters, the decoded JSON body and the unquoted path groups.
+ROUTES = [
+    ('GET', r'/cards/([^/]+)$', get_card),
+    ('GET', r'/decks/?$', get_decks),
+    ('GET', r'/decks/([^/]+)$', get_deck),
+    ('PUT', r'/decks/([^/]+)$', put_deck),
+    ('DELETE', r'/decks/([^/]+)$', delete_deck),
+    ('POST', r'/decks/([^/]+)/cards$', post_card),
+    ('DELETE', r'/decks/([^/]+)/cards/([^/]+)$', delete_card),
+    ('GET', r'/decks/([^/]+)/prob$', get_prob),
+    ('GET', r'/decks/([^/]+)/managram$', get_managram),
+    ('GET', r'/decks/([^/]+)/cost$', get_cost),
+]
+ROUTES = [(method, re.compile(path), handler)
+          for method, path, handler in ROUTES]
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Dispatches requests to the handlers in ROUTES."""
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response so it goes out in one send, rather than
+    # header by header into the client's delayed ACKs.
+    wbufsize = -1
+
+    def _dispatch(self, method):
+        url = urlparse.urlsplit(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        try:
+            body = None
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    raise RequestError(400, 'Malformed JSON body.')
+            allowed = False
+            for m, path, handler in ROUTES:
+                match = path.match(url.path)
+                if not match:
+                    continue
+                allowed = True
+                if m == method:
+                    args = [urllib.unquote(g) for g in match.groups()]
+                    self._reply(200, {'records': handler(query, body, *args)})
+                    return
+            if allowed:
+                raise RequestError(405, 'Method not allowed.')
+            raise RequestError(404, 'Not found.')
+        except RequestError as e:
+            self._reply(e.status, {'error': str(e)})
+        except cards.ScrapeError as e:
+            self._reply(502, {'error': 'Scrape failed: ' + str(e)})
+        except deck.DeckFormatError as e:
+            self._reply(500, {'error': 'Bad deck file: ' + str(e)})
+        except journal.JournalError as e:
+            self._reply(500, {'error': 'Bad journal: ' + str(e)})
+        except Exception as e:
+            self.log_error('%s', traceback.format_exc())
+            self._reply(500, {'error': 'Internal error: ' + str(e)})
+
+    def _reply(self, status, obj):
+        data = json.dumps(obj, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """An HTTP server handling each request on its own thread."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, host='127.0.0.1', quiet=False):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), RequestHandler)
+        self.quiet = quiet
+
+
+def serve(port, host='127.0.0.1'):
+    """Serve the decks in the current directory until interrupted."""
+    httpd = Server(port, host)
+    print('Serving decks in %s on %s port %d.' %
+          ((os.getcwd(),) + httpd.server_address))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        deck.save_card_store()
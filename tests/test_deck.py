@@ -0,0 +1,102 @@
+"""Tests of decks, the deck file format and the shared card store."""
+
+import os
+import threading
+import time
+
+import deck
+from tests.testing import DirTest, make_card
+
+
+class TestCardStore(DirTest):
+
+    def test_save_only_when_changed(self):
+        deck.save_card_store()
+        self.assertFalse(os.path.exists(deck.CARDSTORE_FILENAME))
+        self.store.put('island', make_card('Island', types=('Land',)))
+        deck.save_card_store()
+        self.assertTrue(os.path.exists(deck.CARDSTORE_FILENAME))
+        self.assertFalse(self.store.dirty)
+
+    def test_refreshed_card_is_saved(self):
+        self.store.put('island', make_card('Island', types=('Land',)))
+        deck.save_card_store()
+        # Replacing a card leaves the number of cards unchanged.
+        self.store.put('island', make_card('Island', 'U', types=('Land',)))
+        self.assertTrue(self.store.dirty)
+        deck.save_card_store()
+        deck._card_store = None
+        self.assertEqual('U', deck.card_store().data['island'].cost)
+
+    def test_failed_save_stays_dirty(self):
+        self.store.put('island', make_card('Island', types=('Land',)))
+        self.assertRaises(IOError, self.store.save,
+                          os.path.join('missing', deck.CARDSTORE_FILENAME))
+        self.assertTrue(self.store.dirty)
+
+
+class TestDeckFormat(DirTest):
+
+    def test_round_trip(self):
+        d = self.make_deck(cards=[(20, 'Forest'), (4, 'Llanowar Elves')],
+                           side=[(3, 'Lightning Bolt')])
+        d.deck.star('llanowar elves', '+')
+        d.seq = 7
+        loaded = deck.loads(deck.dumps(d), self.store)
+        self.assertEqual('Test Deck', loaded.name)
+        self.assertEqual(7, loaded.seq)
+        self.assertEqual(d.deck.cards, loaded.deck.cards)
+        self.assertEqual(d.sideboard.cards, loaded.sideboard.cards)
+        self.assertEqual('+', loaded.deck.getStar('llanowar elves'))
+        self.assertEqual(deck.dumps(d), deck.dumps(loaded))
+
+    def test_save_and_load(self):
+        d = self.make_deck(cards=[(2, 'Counterspell')])
+        deck.save(d)
+        loaded = deck.load(deck.filename(d.name), self.store)
+        self.assertEqual({'counterspell': 2}, loaded.deck.cards)
+
+    def test_unknown_header_fields_are_kept(self):
+        header, records = deck.parse('MTGDECK 1\nname\tX\nformat\tlegacy\n'
+                                     'deck\t1\t\tforest\n')
+        self.assertEqual('legacy', header['format'])
+        self.assertEqual([('deck', 1, '', 'forest')], records)
+
+    def test_reject_bad_counts(self):
+        for count in ('0', '-2', 'x', ''):
+            self.assertRaises(deck.DeckFormatError, deck.parse,
+                              'MTGDECK 1\nname\tX\ndeck\t%s\t\tforest\n'
+                              % count)
+
+    def test_reject_bad_files(self):
+        for data in ('', 'MTGDECK x\nname\tX\n', 'MTGDECK 2\nname\tX\n',
+                     'MTGDECK 1\ndeck\t1\t\tforest\n',
+                     'MTGDECK 1\nname\tX\ndeck\t1\tforest\n'):
+            self.assertRaises(deck.DeckFormatError, deck.parse, data)
+        self.assertTrue(deck.is_legacy('(ideck\nDeck\n'))
+
+
+class TestSharedCardStore(DirTest):
+
+    def test_loaded_once(self):
+        deck._card_store = None
+        loads = []
+        load = deck.CardData.load
+        def slow_load(path):
+            loads.append(path)
+            time.sleep(0.01)
+            return load(path)
+        deck.CardData.load = staticmethod(slow_load)
+        try:
+            stores = []
+            threads = [threading.Thread(
+                           target=lambda: stores.append(deck.card_store()))
+                       for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            deck.CardData.load = classmethod(load.im_func)
+        self.assertEqual(1, len(loads))
+        self.assertEqual(1, len(set(id(s) for s in stores)))
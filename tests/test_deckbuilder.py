@@ -0,0 +1,75 @@
+"""Tests of deck builder commands."""
+
+import os
+import subprocess
+import sys
+from StringIO import StringIO
+
+import deck
+import deckbuilder
+import journal
+from tests.testing import DirTest
+
+
+class TestDeckname(DirTest):
+
+    def setUp(self):
+        super(TestDeckname, self).setUp()
+        self.session = deckbuilder.Session(StringIO())
+        deckbuilder.cmd_deck(self.session, 'Elves')
+        deckbuilder.cmd_add(self.session, '4 Llanowar Elves')
+        deckbuilder.cmd_save(self.session, '')
+
+    def load(self, name):
+        return deck.load(deck.filename(name), self.store)
+
+    def test_rename(self):
+        deckbuilder.cmd_deckname(self.session, 'Green')
+        self.assertFalse(os.path.exists('elves.deck'))
+        self.assertEqual('Green', self.load('Green').name)
+        self.assertEqual('green.deck', self.session.journal.deckpath)
+
+    def test_rename_over_another_deck(self):
+        deck.save(self.make_deck('Burn', [(4, 'Lightning Bolt')]))
+        self.assertRaises(deckbuilder.ImproperArgError,
+                          deckbuilder.cmd_deckname, self.session, 'Burn')
+        self.assertEqual('Elves', self.session.deck.name)
+        self.assertEqual({'lightning bolt': 4}, self.load('Burn').deck.cards)
+        self.assertEqual({'llanowar elves': 4},
+                         self.load('Elves').deck.cards)
+
+    def test_rename_keeping_the_file(self):
+        deckbuilder.cmd_deckname(self.session, 'ELVES')
+        self.assertEqual('ELVES', self.load('Elves').name)
+
+    def test_stale_journal_is_not_replayed(self):
+        j = journal.Journal('green.deck')
+        j.append('add', 'deck', 20, 'forest')
+        j.close()
+        deckbuilder.cmd_deckname(self.session, 'Green')
+        self.assertFalse(os.path.exists('green.deck' + journal.JOURNAL_SUFFIX))
+        deckbuilder.cmd_deck(self.session, 'Burn')
+        deckbuilder.cmd_deck(self.session, 'Green')
+        self.assertEqual({'llanowar elves': 4},
+                         self.session.deck.deck.cards)
+
+
+class TestLazyImports(DirTest):
+
+    def test_save_does_not_import_library(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = (
+            'import sys\n'
+            'from StringIO import StringIO\n'
+            'import deck, deckbuilder\n'
+            'from tests.testing import make_card\n'
+            'deck.card_store().put("forest", make_card("Forest"))\n'
+            'session = deckbuilder.Session(StringIO())\n'
+            'deckbuilder.cmd_deck(session, "Lands")\n'
+            'deckbuilder.cmd_add(session, "20 Forest")\n'
+            'deckbuilder.cmd_save(session, "")\n'
+            'print("library" in sys.modules or "sqlite3" in sys.modules)\n')
+        env = dict(os.environ, PYTHONPATH=root)
+        out = subprocess.check_output([sys.executable, '-c', script], env=env)
+        self.assertEqual('False', out.strip())
+        self.assertTrue(os.path.exists('lands.deck'))
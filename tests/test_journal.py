@@ -0,0 +1,114 @@
+"""Tests of the deck change journal."""
+
+import os
+
+import deck
+import journal
+from tests.testing import DirTest
+
+
+class TestJournal(DirTest):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        self.deck = self.make_deck('Elves', [(4, 'Llanowar Elves')])
+        deck.save(self.deck)
+        self.path = deck.filename(self.deck.name)
+
+    def lines(self):
+        with open(self.path + journal.JOURNAL_SUFFIX, 'rb') as f:
+            return f.read().splitlines()
+
+    def reload(self):
+        d = deck.load(self.path, self.store)
+        n = journal.Journal(self.path, d.seq).replay(d)
+        return d, n
+
+    def test_append(self):
+        j = journal.Journal(self.path)
+        j.append('add', 'deck', 20, 'forest')
+        j.append('star', 'deck', '*', 'forest')
+        j.close()
+        self.assertEqual(['1\tadd\tdeck\t20\tforest',
+                          '2\tstar\tdeck\t*\tforest'], self.lines())
+        self.assertEqual(2, j.pending)
+
+    def test_replay(self):
+        j = journal.Journal(self.path)
+        j.append('add', 'deck', 20, 'forest')
+        j.append('rm', 'deck', 1, 'llanowar elves')
+        j.append('add', 'side', 2, 'lightning bolt')
+        j.append('star', 'side', '+', 'lightning bolt')
+        j.close()
+        d, n = self.reload()
+        self.assertEqual(4, n)
+        self.assertEqual({'forest': 20, 'llanowar elves': 3}, d.deck.cards)
+        self.assertEqual({'lightning bolt': 2}, d.sideboard.cards)
+        self.assertEqual('+', d.sideboard.getStar('lightning bolt'))
+
+    def test_replay_skips_entries_in_the_snapshot(self):
+        j = journal.Journal(self.path)
+        j.append('add', 'deck', 20, 'forest')
+        j.append('add', 'deck', 1, 'llanowar elves')
+        j.close()
+        # A crash after writing the snapshot but before emptying the
+        # journal leaves entries the snapshot already includes.
+        self.deck.deck.add('forest', 20)
+        self.deck.seq = 1
+        deck.save(self.deck)
+        d, n = self.reload()
+        self.assertEqual(1, n)
+        self.assertEqual({'forest': 20, 'llanowar elves': 5}, d.deck.cards)
+
+    def test_compact(self):
+        d, n = self.reload()
+        j = journal.Journal(self.path, d.seq)
+        d.deck.add('forest', 20)
+        j.append('add', 'deck', 20, 'forest')
+        j.compact(d)
+        self.assertFalse(os.path.exists(self.path + journal.JOURNAL_SUFFIX))
+        self.assertEqual(0, j.pending)
+        loaded, n = self.reload()
+        self.assertEqual(0, n)
+        self.assertEqual(1, loaded.seq)
+        self.assertEqual({'forest': 20, 'llanowar elves': 4},
+                         loaded.deck.cards)
+        # Numbering carries on after the snapshot.
+        j.append('rm', 'deck', 1, 'forest')
+        j.close()
+        self.assertEqual(['2\trm\tdeck\t1\tforest'], self.lines())
+        loaded, n = self.reload()
+        self.assertEqual(1, n)
+        self.assertEqual(19, loaded.deck.cards['forest'])
+
+    def test_compact_to_new_path(self):
+        j = journal.Journal(self.path)
+        j.append('add', 'deck', 20, 'forest')
+        j.compact(self.deck, 'green.deck')
+        self.assertEqual('green.deck', j.deckpath)
+        self.assertEqual('green.deck' + journal.JOURNAL_SUFFIX, j.path)
+        self.assertEqual(1, deck.load('green.deck', self.store).seq)
+
+    def test_torn_last_line(self):
+        j = journal.Journal(self.path)
+        j.append('add', 'deck', 20, 'forest')
+        j.close()
+        with open(self.path + journal.JOURNAL_SUFFIX, 'ab') as f:
+            f.write('2\tadd\tdeck\t3')
+        d, n = self.reload()
+        self.assertEqual(1, n)
+        self.assertEqual({'forest': 20, 'llanowar elves': 4}, d.deck.cards)
+
+    def test_needs_compaction(self):
+        j = journal.Journal(self.path)
+        for i in range(journal.COMPACT_EVERY):
+            self.assertFalse(j.needs_compaction())
+            j.append('add', 'deck', 1, 'forest')
+        j.close()
+        self.assertTrue(j.needs_compaction())
+
+    def test_bad_entries(self):
+        self.assertRaises(journal.JournalError, journal.apply, self.deck,
+                          'burn', ['deck'])
+        self.assertRaises(journal.JournalError, journal.apply, self.deck,
+                          'add', ['graveyard', '1', 'forest'])
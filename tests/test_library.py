@@ -0,0 +1,86 @@
+"""Tests of the deck library."""
+
+import deck
+import library
+from tests.testing import DirTest
+
+
+class TestDeckLibrary(DirTest):
+
+    def setUp(self):
+        super(TestDeckLibrary, self).setUp()
+        self.library = library.DeckLibrary()
+        self.elves = self.make_deck('Elves', [(4, 'Llanowar Elves'),
+                                              (20, 'Forest')],
+                                    [(2, 'Counterspell')])
+        self.burn = self.make_deck('Burn', [(4, 'Lightning Bolt')])
+        self.library.add(self.elves, 'elves.deck', 'standard')
+        self.library.add(self.burn, 'burn.deck', 'modern')
+
+    def tearDown(self):
+        self.library.close()
+        super(TestDeckLibrary, self).tearDown()
+
+    def names(self, **query):
+        return [d.name for d in self.library.find(**query)]
+
+    def modified(self, name):
+        return [d.modified for d in self.library.find()
+                if d.name == name][0]
+
+    def test_add(self):
+        self.assertTrue(self.library.contains('elves.deck'))
+        self.assertFalse(self.library.contains('ramp.deck'))
+        decks = self.library.find()
+        self.assertEqual(['Burn', 'Elves'], [d.name for d in decks])
+        self.assertEqual([(4, 'R', 'modern'), (24, 'G', 'standard')],
+                         [(d.size, d.colors, d.format) for d in decks])
+
+    def test_find(self):
+        self.assertEqual(['Elves'], self.names(cards=[(4, 'Llanowar Elves')]))
+        self.assertEqual(['Elves'], self.names(
+            cards=[(4, 'llanowar elves'), (20, 'forest')]))
+        self.assertEqual([], self.names(cards=[(21, 'Forest')]))
+        # Only the main deck counts.
+        self.assertEqual([], self.names(cards=[(1, 'Counterspell')]))
+        self.assertEqual(['Burn'], self.names(colors='R'))
+        self.assertEqual([], self.names(colors='RG'))
+        self.assertEqual(['Burn'], self.names(fmt='modern'))
+        self.assertEqual(['Burn', 'Elves'], self.names(since=0))
+
+    def test_update(self):
+        modified = self.modified('Elves')
+        self.elves.deck.add('lightning bolt', 4)
+        self.library.add(self.elves, 'elves.deck')
+        self.assertEqual(['Elves'], self.names(colors='RG', fmt='standard'))
+        self.assertEqual(['Burn', 'Elves'],
+                         self.names(cards=[(4, 'Lightning Bolt')]))
+        self.assertTrue(self.modified('Elves') >= modified)
+        self.assertEqual(['Elves'], self.names(since=self.modified('Elves')))
+
+    def test_unchanged_list_keeps_modified(self):
+        modified = self.modified('Burn')
+        self.burn.name = 'Bolts'
+        self.burn.seq = 12
+        self.burn.deck.star('lightning bolt')
+        self.library.add(self.burn, 'burn.deck')
+        self.assertEqual(['Bolts', 'Elves'], self.names())
+        self.assertEqual(modified, self.modified('Bolts'))
+
+    def test_remove(self):
+        self.assertEqual(1, self.library.remove('Burn'))
+        self.assertEqual(0, self.library.remove('Burn'))
+        self.assertEqual(['Elves'], self.names())
+        self.assertEqual([], self.names(cards=[(1, 'Lightning Bolt')]))
+
+    def test_sync(self):
+        deck.save(self.elves)
+        deck.save(self.make_deck('Blue', [(4, 'Counterspell')]))
+        # Elves is already in the library with the same deck list.
+        self.assertEqual(1, self.library.sync())
+        self.assertEqual(['Blue', 'Burn', 'Elves'], self.names())
+        self.assertEqual(0, self.library.sync())
+        self.elves.name = 'Green'
+        deck.save(self.elves, 'elves.deck')
+        self.assertEqual(1, self.library.sync())
+        self.assertEqual(['Blue', 'Burn', 'Green'], self.names())
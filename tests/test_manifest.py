@@ -0,0 +1,48 @@
+"""Tests of the deck manifest."""
+
+import os
+
+import deck
+import manifest
+from tests.testing import DirTest
+
+
+class TestManifest(DirTest):
+
+    def entry(self, fn):
+        return dict(manifest.current().decks())[fn]
+
+    def test_lists_decks(self):
+        deck.save(self.make_deck('Elves', [(4, 'Llanowar Elves'),
+                                           (20, 'Forest')]))
+        deck.save(self.make_deck('Burn', [(4, 'Lightning Bolt')]))
+        self.assertEqual(
+            [('burn.deck', 'Burn', 4, 'R'), ('elves.deck', 'Elves', 24, 'G')],
+            [(fn, e['name'], e['size'], e['colors'])
+             for fn, e in manifest.current().decks()])
+
+    def test_added_and_removed_files(self):
+        deck.save(self.make_deck('Elves', [(4, 'Llanowar Elves')]))
+        manifest.current()
+        deck.save(self.make_deck('Burn', [(4, 'Lightning Bolt')]))
+        self.assertEqual(['burn.deck', 'elves.deck'],
+                         sorted(dict(manifest.current().decks())))
+        os.remove('elves.deck')
+        self.assertEqual(['burn.deck'],
+                         sorted(dict(manifest.current().decks())))
+
+    def test_file_changed_in_place(self):
+        deck.save(self.make_deck('Elves', [(4, 'Llanowar Elves')]))
+        self.assertEqual(4, self.entry('elves.deck')['size'])
+        # The manifest records the directory's mtime once it exists.
+        self.assertEqual(4, self.entry('elves.deck')['size'])
+        # Rewrite the file without replacing it, as an editor might.
+        with open('elves.deck', 'r+b') as f:
+            f.write(deck.dumps(self.make_deck(
+                'Elves', [(4, 'Llanowar Elves'), (12, 'Forest')])))
+        self.assertEqual(16, self.entry('elves.deck')['size'])
+
+    def test_legacy_file(self):
+        with open('old.deck', 'wb') as f:
+            f.write('(ideck\nDeck\n')
+        self.assertEqual(None, self.entry('old.deck')['name'])
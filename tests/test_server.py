@@ -0,0 +1,85 @@
+"""Tests of the JSON over HTTP server."""
+
+import httplib
+import json
+import os
+import threading
+
+import deck
+import server
+from tests.testing import DirTest
+
+
+class TestServer(DirTest):
+
+    def setUp(self):
+        super(TestServer, self).setUp()
+        self.httpd = server.Server(0, quiet=True)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        super(TestServer, self).tearDown()
+
+    def request(self, method, path, body=None):
+        """Returns the response status and decoded JSON body."""
+        conn = httplib.HTTPConnection(*self.httpd.server_address)
+        try:
+            conn.request(method, path,
+                         json.dumps(body) if body is not None else None)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_deck(self):
+        status, r = self.request('PUT', '/decks/Burn',
+                                 {'deck': {'Lightning Bolt': 4}})
+        self.assertEqual(200, status)
+        self.assertTrue(os.path.exists('burn.deck'))
+        status, r = self.request('GET', '/decks/Burn')
+        self.assertEqual(200, status)
+        self.assertEqual([('deck', 'Lightning Bolt', 4)],
+                         [(x['pile'], x['name'], x['count'])
+                          for x in r['records']])
+        self.assertEqual((200, {'records': []}),
+                         self.request('DELETE', '/decks/Burn'))
+        self.assertFalse(os.path.exists('burn.deck'))
+        self.assertEqual(404, self.request('GET', '/decks/Burn')[0])
+
+    def test_names_outside_the_directory(self):
+        os.mkdir('decks')
+        os.chdir('decks')
+        deck.save(self.make_deck('Outside', [(4, 'Forest')]), '../x.deck')
+        for name in ('..%2F..%2Fx', '..%2Fx', '..', '.hidden',
+                     '..%5Cx', 'a%2Fb', 'x%00'):
+            self.assertEqual(400, self.request('GET', '/decks/' + name)[0])
+            self.assertEqual(400, self.request(
+                'PUT', '/decks/' + name, {'deck': {'Forest': 1}})[0])
+            self.assertEqual(400, self.request('DELETE', '/decks/' + name)[0])
+            self.assertEqual(400, self.request(
+                'POST', '/decks/' + name + '/cards', {'card': 'Forest'})[0])
+        self.assertEqual([], os.listdir('.'))
+        self.assertTrue(os.path.exists('../x.deck'))
+        os.chdir('..')
+
+    def test_bad_requests(self):
+        self.assertEqual(404, self.request('GET', '/nothing')[0])
+        self.assertEqual(405, self.request('POST', '/decks/Burn')[0])
+        self.assertEqual(400, self.request('PUT', '/decks/Burn', [])[0])
+        self.assertEqual(404, self.request('GET', '/decks/Missing')[0])
+
+    def test_local_only(self):
+        self.assertEqual('127.0.0.1', self.httpd.server_address[0])
+
+    def test_unexpected_error(self):
+        deck.save(self.make_deck('Lands', [(4, 'Forest')]))
+        with open('lands.deck.journal', 'wb') as f:
+            f.write('1\tadd\tdeck\tmany\tforest\n')
+        status, r = self.request('GET', '/decks/Lands')
+        self.assertEqual(500, status)
+        self.assertTrue(r['error'].startswith('Internal error: '))
@@ -0,0 +1,51 @@
+"""Helper classes for tests."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import cards
+import deck
+
+
+def make_card(name, cost='', cmc='0', types=('Instant',)):
+    """A loaded Card built without scraping."""
+    c = cards.Card(name)
+    c.cost = cost
+    c.convertedCost = cmc
+    c.setTypes(types)
+    c.loaded = True
+    return c
+
+
+class DirTest(unittest.TestCase):
+    """A test run in an empty temporary directory, with an empty shared
+    card store holding a few cards."""
+
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+        deck._card_store = None
+        self.store = deck.card_store()
+        for c in (make_card('Forest', types=('Land',)),
+                  make_card('Llanowar Elves', 'G', '1', ('Creature',)),
+                  make_card('Lightning Bolt', 'R', '1'),
+                  make_card('Counterspell', 'UU', '2')):
+            self.store.put(c.name.lower(), c)
+        self.store.dirty = False
+
+    def tearDown(self):
+        deck._card_store = None
+        os.chdir(self.olddir)
+        shutil.rmtree(self.dir)
+
+    def make_deck(self, name='Test Deck', cards=(), side=()):
+        """A Deck holding (num, card) cards and sideboard cards."""
+        d = deck.Deck(name, self.store)
+        for num, card in cards:
+            d.deck.add(card, num)
+        for num, card in side:
+            d.sideboard.add(card, num)
+        return d
@@ -1,8 +1,21 @@
 """Utility functions."""
 
 import re
+import sys
 import unicodedata
 
+
+class LazyModule(object):
+    """A module that is only imported when one of its attributes is used."""
+    def __init__(self, name):
+        self.__name = name
+
+    def __getattr__(self, attr):
+        __import__(self.__name)
+        module = sys.modules[self.__name]
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
 ASCII_APPROX = {
     u'\u00c6': 'Ae',
     u'\u00e6': 'ae',
@@ -23,3 +36,18 @@ def asciify_encode(text):
 def asciify_unicode(text):
     return asciify_utf8(unicodedata.normalize('NFKD', text)).encode(
         'ascii', 'ignore').strip()
+
+def terminal_height(stream=None):
+    """Number of rows of the terminal stream is on, or None if not a tty."""
+    stream = stream or sys.stdout
+    try:
+        if not stream.isatty():
+            return None
+        import fcntl
+        import struct
+        import termios
+        rows = struct.unpack('hh', fcntl.ioctl(stream.fileno(),
+                                               termios.TIOCGWINSZ, '1234'))[0]
+    except (AttributeError, IOError, ImportError):
+        return None
+    return rows or None